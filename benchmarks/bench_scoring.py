@@ -0,0 +1,201 @@
+"""
+Times the scoring code behind pages/Workout_Scores.py on synthetic ledgers.
+
+    python -m benchmarks.bench_scoring                       # all preset sizes
+    python -m benchmarks.bench_scoring --sizes small medium --output bench.json
+    python -m benchmarks.bench_scoring --baseline bench.json  # exit 1 on regressions
+
+Results are written as JSON (one entry per size x benchmark, times in seconds
+per call) so runs can be compared across commits.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import timeit
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from benchmarks.synthetic_ledger import (
+    DEFAULT_END_DATE,
+    DEFAULT_HALF_LIVES,
+    synthetic_ledger,
+    synthetic_workout_types,
+)
+from scoring.score_engine import (
+    compact_ledger,
+    compute_current_scores,
+    daily_totals,
+    daily_totals_from_batches,
+    predict_score_grid,
+    score_series,
+)
+
+# Preset ledger sizes: number of workout types, years of history, average logs per type per day
+SIZES = {
+    "small": {"n_types": 3, "years": 1, "logs_per_day": 1.0},
+    "medium": {"n_types": 10, "years": 5, "logs_per_day": 2.0},
+    "large": {"n_types": 25, "years": 10, "logs_per_day": 3.0},
+}
+
+# Same grid and chart settings as pages/Workout_Scores.py
+PREDICTOR_INTERVALS = [0, 1, 3, 7, 14, 30, 45]
+PREDICTOR_MULTIPLIERS = [0.0, 0.25, 0.5, 0.6667, 1.0, 1.5, 2.0]
+CHART_FUTURE_DAYS = 30
+
+# A benchmark is a regression if its median is this many times the baseline's
+DEFAULT_TOLERANCE = 1.25
+
+
+def scoring_benchmarks(ledger: pd.DataFrame, workout_types: list) -> dict:
+    """
+    {name: zero-argument callable} for one ledger. Each callable does what the
+    Workout_Scores page does for all workout types.
+    """
+    grouped = daily_totals(ledger)
+    subsets = {wtype: sub[["date", "amount"]] for wtype, sub in grouped.groupby("workout_type")}
+    empty_subset = grouped.iloc[0:0][["date", "amount"]]
+    batches = pa.Table.from_pandas(ledger, preserve_index=False).to_batches(max_chunksize=65_536)
+    compact = compact_ledger(ledger)
+    end = pd.Timestamp(DEFAULT_END_DATE)
+
+    def predictor_grid() -> None:
+        for wt in workout_types:
+            predict_score_grid(
+                subsets.get(wt["workout_type"], empty_subset), wt["half_life_days"], wt["daily_target"],
+                PREDICTOR_MULTIPLIERS, PREDICTOR_INTERVALS,
+            )
+
+    def chart_series(days_back: Optional[int]) -> Callable[[], None]:
+        def run() -> None:
+            for wt in workout_types:
+                subset = subsets.get(wt["workout_type"], empty_subset)
+                start = end - pd.Timedelta(days=days_back) if days_back is not None else subset["date"].min()
+                score_series(
+                    subset, wt["half_life_days"], wt["daily_target"],
+                    start, end + pd.Timedelta(days=CHART_FUTURE_DAYS), future_amt=wt["daily_target"],
+                )
+        return run
+
+    return {
+        "daily_totals": lambda: daily_totals(ledger),
+        "daily_totals_from_batches": lambda: daily_totals_from_batches(batches),
+        "compact_from_batches": lambda: compact_ledger(batches),
+        "daily_totals_compact": lambda: daily_totals(compact),
+        "current_scores": lambda: compute_current_scores(grouped, workout_types),
+        "current_scores_compact": lambda: compute_current_scores(compact, workout_types),
+        "predictor_grid": predictor_grid,
+        "chart_series_year": chart_series(365),
+        "chart_series_all": chart_series(None),
+    }
+
+
+def time_call(fn: Callable[[], object], repeat: int) -> dict:
+    """
+    Per-call wall times over `repeat` samples; each sample loops the call
+    enough times (timeit's autorange) to last at least 0.2 s.
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    samples = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "repeat": repeat,
+        "number": number,
+        "min_seconds": min(samples),
+        "median_seconds": statistics.median(samples),
+        "mean_seconds": statistics.fmean(samples),
+    }
+
+
+def run(sizes: dict, repeat: int, half_lives=DEFAULT_HALF_LIVES, only: Optional[list] = None) -> dict:
+    results = []
+    for size, params in sizes.items():
+        workout_types = synthetic_workout_types(params["n_types"], half_lives)
+        ledger = synthetic_ledger(workout_types, params["years"], params["logs_per_day"])
+        for name, fn in scoring_benchmarks(ledger, workout_types).items():
+            if only and name not in only:
+                continue
+            timing = time_call(fn, repeat)
+            results.append({
+                "size": size,
+                "benchmark": name,
+                **params,
+                "half_lives": list(half_lives),
+                "ledger_rows": len(ledger),
+                **timing,
+            })
+            print(f"{size:>8} {name:<26} {timing['median_seconds'] * 1000:10.3f} ms  ({len(ledger)} rows)")
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "pyarrow": pa.__version__,
+        },
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns the (size, benchmark, ratio) entries whose median got slower than
+    tolerance x the baseline's; benchmarks missing from either side are skipped.
+    """
+    base = {(r["size"], r["benchmark"]): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        before = base.get((result["size"], result["benchmark"]))
+        if before is None:
+            continue
+        ratio = result["median_seconds"] / before["median_seconds"]
+        print(f"{result['size']:>8} {result['benchmark']:<26} {ratio:6.2f}x baseline")
+        if ratio > tolerance:
+            regressions.append((result["size"], result["benchmark"], ratio))
+    return regressions
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--types", type=int, help="custom size: number of workout types")
+    parser.add_argument("--years", type=float, help="custom size: years of history")
+    parser.add_argument("--logs-per-day", type=float, help="custom size: average logs per type per day")
+    parser.add_argument("--half-lives", type=float, nargs="+", default=list(DEFAULT_HALF_LIVES),
+                        help="half-lives (days) the workout types cycle through")
+    parser.add_argument("--benchmarks", nargs="+", help="only run these benchmarks")
+    parser.add_argument("--repeat", type=int, default=5, help="timing samples per benchmark")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    custom = (args.types, args.years, args.logs_per_day)
+    if any(value is not None for value in custom):
+        if None in custom:
+            parser.error("--types, --years and --logs-per-day must be given together")
+        sizes = {"custom": {"n_types": args.types, "years": args.years, "logs_per_day": args.logs_per_day}}
+    else:
+        sizes = {size: SIZES[size] for size in args.sizes}
+
+    report = run(sizes, args.repeat, args.half_lives, args.benchmarks)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for size, name, ratio in regressions:
+            print(f"REGRESSION: {size} {name} is {ratio:.2f}x slower than the baseline", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+from datetime import date
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+# Half-lives (days) the generated workout types cycle through
+DEFAULT_HALF_LIVES = (3.0, 7.0, 14.0, 30.0)
+# Last day of every generated ledger, so results do not depend on today's date
+DEFAULT_END_DATE = date(2025, 1, 1)
+
+UNITS = ("reps", "miles", "minutes")
+
+
+def synthetic_workout_types(n_types: int, half_lives: Sequence[float] = DEFAULT_HALF_LIVES) -> list:
+    """
+    Returns n_types workout type dicts [workout_type, unit, is_int, daily_target, half_life_days],
+    named type_00, type_01, ..., with half-lives taken in turn from half_lives.
+    """
+    return [
+        {
+            "workout_type": f"type_{i:02d}",
+            "unit": UNITS[i % len(UNITS)],
+            "is_int": UNITS[i % len(UNITS)] != "miles",
+            "daily_target": 2.0 if UNITS[i % len(UNITS)] == "miles" else 10.0 * (i % 5 + 1),
+            "half_life_days": float(half_lives[i % len(half_lives)]),
+        }
+        for i in range(n_types)
+    ]
+
+
+def synthetic_ledger(
+    workout_types: Sequence[dict],
+    years: float,
+    logs_per_day: float,
+    end: date = DEFAULT_END_DATE,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Deterministic ledger for the given workout types covering `years` of history up to `end`.
+
+    Each type gets a Poisson(logs_per_day) number of log entries per day (so some days
+    are rest days), with amounts drawn so a day's total averages the type's daily target.
+    Returns a DataFrame [workout_type, date, amount, unit] like read_workouts, with
+    datetime64 dates, in date order within each type.
+    """
+    rng = np.random.default_rng(seed)
+    n_days = max(int(round(years * 365)), 1)
+    days = pd.date_range(end=pd.Timestamp(end), periods=n_days, freq="D").to_numpy()
+    frames = []
+    for wt in workout_types:
+        counts = rng.poisson(logs_per_day, n_days)
+        n_logs = int(counts.sum())
+        mean_amount = wt["daily_target"] / max(logs_per_day, 1e-9)
+        amounts = rng.gamma(shape=4.0, scale=mean_amount / 4.0, size=n_logs)
+        amounts = np.maximum(np.round(amounts), 1.0) if wt["is_int"] else np.round(amounts, 2)
+        frames.append(pd.DataFrame({
+            "workout_type": wt["workout_type"],
+            "date": np.repeat(days, counts),
+            "amount": amounts,
+            "unit": wt["unit"],
+        }))
+    if not frames:
+        return pd.DataFrame(columns=["workout_type", "date", "amount", "unit"])
+    return pd.concat(frames, ignore_index=True)
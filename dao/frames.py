@@ -0,0 +1,57 @@
+from datetime import date
+from typing import Sequence
+
+import pandas as pd
+
+
+def reorder_workout_types(all_wtypes: list, preferred_order: Sequence[str] = ("running", "pushups")) -> list:
+    """
+    all_wtypes: list of workout type dicts, e.g. [{"workout_type": "pushups", ...}, {"workout_type": "running", ...}, {"workout_type": "yoga", ...}]
+    preferred_order: e.g. ["running", "pushups"]
+
+    Returns a new list with the preferred_order items first (ordered as in preferred_order),
+    then the remaining dicts sorted alphabetically by workout_type.
+    """
+    # Get the preferred workout types in the specified order.
+    preferred_items = [wt for key in preferred_order for wt in all_wtypes if wt["workout_type"] == key]
+    # Get those that are not in the preferred set.
+    preferred_set = set(preferred_order)
+    not_preferred_items = [wt for wt in all_wtypes if wt["workout_type"] not in preferred_set]
+    not_preferred_items.sort(key=lambda wt: wt["workout_type"])
+    return preferred_items + not_preferred_items
+
+
+def ledger_row(row: dict) -> dict:
+    """Validates one ledger row and converts it to its JSON form."""
+    workout_type = row["workout_type"]
+    unit = row["unit"]
+    if not isinstance(workout_type, str) or not workout_type:
+        raise ValueError(f"workout_type must be a non-empty string, got {workout_type!r}")
+    if not isinstance(unit, str):
+        raise ValueError(f"unit must be a string, got {unit!r}")
+    return {
+        "workout_type": workout_type,
+        "date": date.fromisoformat(str(row["date"])).isoformat(),  # BigQuery DATE in YYYY-MM-DD format
+        "amount": float(row["amount"]),
+        "unit": unit,
+    }
+
+
+def daily_totals_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalizes a [workout_type, date, amount] frame to object/datetime64/float64 columns."""
+    return pd.DataFrame({
+        "workout_type": df["workout_type"].astype(object),
+        "date": pd.to_datetime(df["date"]).astype("datetime64[ns]"),
+        "amount": df["amount"].astype("float64"),
+    })
+
+
+def score_history_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalizes a [workout_type, date, ewa, score, grade] frame to object/datetime64/float64 columns."""
+    return pd.DataFrame({
+        "workout_type": df["workout_type"].astype(object),
+        "date": pd.to_datetime(df["date"]).astype("datetime64[ns]"),
+        "ewa": df["ewa"].astype("float64"),
+        "score": df["score"].astype("float64"),
+        "grade": df["grade"].astype(object),
+    })
@@ -0,0 +1,282 @@
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Union
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Set up a logger
+logger = logging.getLogger(__name__)
+
+# Column layout of ledger reads (types by name, with their unit).
+LEDGER_ARROW_SCHEMA = pa.schema([
+    pa.field("workout_type", pa.string()),
+    pa.field("date", pa.date32()),
+    pa.field("amount", pa.float64()),
+    pa.field("unit", pa.string()),
+])
+
+# Column layout of the BigQuery ledger table itself: types by workout_type_id
+# (names and units live in workout_types, so renames never touch ledger rows).
+LEDGER_TABLE_ARROW_SCHEMA = pa.schema([
+    pa.field("workout_type_id", pa.int64()),
+    pa.field("date", pa.date32()),
+    pa.field("amount", pa.float64()),
+])
+
+# Parquet key-value metadata entries of each segment file: the latest ledger date it
+# holds, the date its fetch started from (absent for a full download), and the ledger
+# generation it was fetched under (see LedgerMirror.sync).
+WATERMARK_KEY = b"fitness.watermark"
+SINCE_KEY = b"fitness.since"
+GENERATION_KEY = b"fitness.generation"
+
+# Segment files of the mirror directory, numbered in the order they were written
+SEGMENT_PATTERN = re.compile(r"^segment-(\d{8})\.parquet$")
+
+# Rows per record batch when streaming the mirror
+READ_BATCH_SIZE = 65_536
+
+# A sync that would leave more segments than this first merges them into one
+MAX_SEGMENTS = 8
+
+# fetch(since) returns every ledger row with date >= since (all rows if since is None),
+# as a table or as a stream of record batches.
+FetchFn = Callable[[Optional[date]], Union[pa.Table, Iterable[pa.RecordBatch]]]
+
+
+class LedgerMirror:
+    """
+    On-disk Parquet copy of the append-only ledger table.
+
+    The mirror is a directory of segment files. The first sync downloads the
+    whole ledger into one segment; later syncs re-fetch only rows dated on or
+    after the watermark (the latest date held; that day itself is re-read,
+    since more logs may have been appended to it) and write them as a new,
+    small segment. A segment's rows dated on or after a later segment's start
+    date are superseded and skipped on read, so a sync never rewrites the rows
+    it keeps. Once there are more than MAX_SEGMENTS, they are merged.
+
+    With ttl_seconds, a sync within ttl_seconds of the last one does nothing,
+    and after that, an unchanged fingerprint (see sync) skips the fetch too.
+
+    The ledger has no ingestion timestamp, so a log dated before the watermark
+    is only picked up if the writer calls note_write() (the DAO does this for
+    its own writes) or after a full resync: with several writer processes, use
+    the mirror only if occasional full resyncs are acceptable.
+
+    schema is the column layout of the segments; a mirror written with another
+    layout (e.g. by an older version) is replaced by a full resync. So is one
+    fetched under another ledger generation: a marker the ledger's owner changes
+    whenever it rewrites rows in place (e.g. a backfill), see sync.
+    """
+
+    def __init__(self, path: str, schema: pa.Schema = LEDGER_ARROW_SCHEMA, ttl_seconds: float = 0.0):
+        self.path = path
+        self.schema = schema
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()  # one sync at a time
+        self._files_lock = threading.Lock()  # segments are not deleted while a read opens them
+        self._resync_from: Optional[date] = None
+        self._synced_at: Optional[float] = None
+        self._synced_fingerprint: Any = None
+
+    def exists(self) -> bool:
+        return bool(self._segments())
+
+    def read(self) -> pa.Table:
+        """
+        Returns the mirrored rows, or an empty table if never synced.
+        """
+        return pa.Table.from_batches(list(self.iter_batches()), schema=self.schema)
+
+    def iter_batches(self, batch_size: int = READ_BATCH_SIZE) -> Iterator[pa.RecordBatch]:
+        """
+        Streams the mirrored rows as record batches (nothing if never synced).
+        """
+        with self._files_lock:
+            # opened up front: a concurrent sync may delete superseded segments
+            opened = [(pq.ParquetFile(path, memory_map=True), cutoff) for path, cutoff in self._live_segments()]
+        for parquet_file, cutoff in opened:
+            with parquet_file:
+                for batch in parquet_file.iter_batches(batch_size=batch_size):
+                    if cutoff is not None:
+                        batch = batch.filter(pc.less(batch["date"], pa.scalar(cutoff, pa.date32())))
+                    if batch.num_rows:
+                        yield batch
+
+    def watermark(self, generation: Optional[str] = None) -> Optional[date]:
+        """
+        The latest mirrored date, or None if a full resync is needed (a segment
+        of another layout or, if generation is given, of another generation).
+        """
+        newest = None
+        for path in self._segments():
+            file_metadata = pq.read_metadata(path)
+            if not file_metadata.schema.to_arrow_schema().remove_metadata().equals(self.schema):
+                return None  # another layout: resync everything
+            metadata = file_metadata.metadata or {}
+            if generation is not None and metadata.get(GENERATION_KEY) != generation.encode():
+                return None  # rows may have been rewritten since: resync everything
+            value = metadata.get(WATERMARK_KEY)
+            if value:
+                segment_newest = date.fromisoformat(value.decode())
+                newest = segment_newest if newest is None else max(newest, segment_newest)
+        return newest
+
+    def note_write(self, date_value: date) -> None:
+        """
+        Records that a row dated date_value was written, so the next sync re-reads from there.
+        """
+        with self._lock:
+            if self._resync_from is None or date_value < self._resync_from:
+                self._resync_from = date_value
+
+    def sync(
+        self,
+        fetch: FetchFn,
+        full: bool = False,
+        fingerprint: Optional[Callable[[], Any]] = None,
+        generation: Optional[Callable[[], str]] = None,
+    ) -> bool:
+        """
+        Brings the mirror up to date; returns whether any rows were fetched.
+        Cold start (or full=True) downloads the whole ledger once, and so does
+        a sync for which generation() (the ledger's current generation, checked
+        after ttl_seconds like the fingerprint) differs from the mirror's.
+        Otherwise, unless a write was noted: within ttl_seconds of the last sync
+        nothing is done, and after that nothing is fetched while fingerprint() (a
+        cheap change marker of the ledger table) returns what it did at the last
+        sync. Fetched batches are written to the new segment as they arrive; an
+        empty fetch writes nothing.
+        """
+        with self._lock:
+            incremental = not full and self._resync_from is None
+            if incremental and self._synced_at is not None and time.monotonic() - self._synced_at < self.ttl_seconds:
+                return False
+            current_generation = generation() if generation is not None else None
+            since = None if full else self.watermark(current_generation)
+            # taken before the fetch: a write landing during it shows up as a change next time
+            current = fingerprint() if fingerprint is not None else None
+            if incremental and since is not None and current is not None and current == self._synced_fingerprint:
+                self._synced_at = time.monotonic()
+                return False
+            if since is not None and self._resync_from is not None:
+                since = min(since, self._resync_from)
+            if since is None and os.path.isfile(self.path):
+                os.remove(self.path)  # single-file mirror of an older version
+
+            fetched = fetch(since)
+            if isinstance(fetched, pa.Table):
+                fetched = fetched.to_batches()
+            segment, fetched_rows = self._write_segment(fetched, since, current_generation)
+            with self._files_lock:
+                if since is None:
+                    for path in self._segments():
+                        if path != segment:
+                            os.remove(path)
+                else:
+                    self._drop_superseded()
+            if len(self._segments()) > MAX_SEGMENTS:
+                self._compact(current_generation)
+            self._resync_from = None
+            self._synced_at = time.monotonic()
+            self._synced_fingerprint = current
+            logger.info(
+                f"Synced ledger mirror '{self.path}': fetched {fetched_rows} rows"
+                + (f" since {since}." if since else " (full).")
+            )
+            return fetched_rows > 0
+
+    def _segments(self) -> List[str]:
+        """The segment files, oldest first."""
+        if not os.path.isdir(self.path):
+            return []
+        names = sorted(name for name in os.listdir(self.path) if SEGMENT_PATTERN.match(name))
+        return [os.path.join(self.path, name) for name in names]
+
+    def _live_segments(self) -> list:
+        """
+        [(segment path, cutoff)]: rows of a segment dated on or after its cutoff
+        (the earliest start date of the segments written after it) are superseded.
+        """
+        segments = []
+        cutoff = None
+        for path in reversed(self._segments()):
+            segments.append((path, cutoff))
+            value = (pq.read_metadata(path).metadata or {}).get(SINCE_KEY)
+            since = date.fromisoformat(value.decode()) if value else date.min
+            cutoff = since if cutoff is None else min(cutoff, since)
+        return segments[::-1]
+
+    def _write_segment(
+        self, batches: Iterable[pa.RecordBatch], since: Optional[date], generation: Optional[str] = None
+    ) -> tuple:
+        """
+        Streams batches into a new segment (atomically renamed into place once
+        complete); returns (segment path, row count). Nothing is written for no
+        rows (the path is then None).
+        """
+        segments = self._segments()
+        number = int(SEGMENT_PATTERN.match(os.path.basename(segments[-1])).group(1)) + 1 if segments else 0
+        segment_path = os.path.join(self.path, f"segment-{number:08d}.parquet")
+        tmp_path = segment_path + ".tmp"
+        writer = None
+        newest = None
+        rows = 0
+        try:
+            for batch in batches:
+                batch = batch.select(self.schema.names).cast(self.schema)
+                if not batch.num_rows:
+                    continue
+                if writer is None:
+                    os.makedirs(self.path, exist_ok=True)
+                    writer = pq.ParquetWriter(tmp_path, self.schema)
+                writer.write_batch(batch)
+                batch_newest = pc.max(batch["date"]).as_py()
+                newest = batch_newest if newest is None else max(newest, batch_newest)
+                rows += batch.num_rows
+            if writer is None:
+                return None, 0
+            metadata = {WATERMARK_KEY: newest.isoformat().encode()}
+            if since is not None:
+                metadata[SINCE_KEY] = since.isoformat().encode()
+            if generation is not None:
+                metadata[GENERATION_KEY] = generation.encode()
+            writer.add_key_value_metadata(metadata)
+        finally:
+            if writer is not None:
+                writer.close()
+        os.replace(tmp_path, segment_path)
+        return segment_path, rows
+
+    def _drop_superseded(self) -> None:
+        """Deletes the segments all of whose rows are superseded by later ones."""
+        for path, cutoff in self._live_segments():
+            value = (pq.read_metadata(path).metadata or {}).get(SINCE_KEY)
+            if cutoff is not None and value and date.fromisoformat(value.decode()) >= cutoff:
+                os.remove(path)
+
+    def _compact(self, generation: Optional[str] = None) -> None:
+        """Merges the live rows of every segment into one."""
+        segments = self._segments()
+        live = self._live_segments()
+
+        def batches() -> Iterator[pa.RecordBatch]:
+            for path, cutoff in live:
+                with pq.ParquetFile(path, memory_map=True) as parquet_file:
+                    for batch in parquet_file.iter_batches(batch_size=READ_BATCH_SIZE):
+                        if cutoff is not None:
+                            batch = batch.filter(pc.less(batch["date"], pa.scalar(cutoff, pa.date32())))
+                        yield batch
+
+        self._write_segment(batches(), None, generation)  # supersedes all the old ones
+        with self._files_lock:
+            for path in segments:
+                os.remove(path)
+        logger.info(f"Compacted {len(segments)} ledger mirror segments in '{self.path}'.")
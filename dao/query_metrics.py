@@ -0,0 +1,192 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+# Set up a logger
+logger = logging.getLogger(__name__)
+
+# Records kept by the default in-memory sink
+DEFAULT_RING_BUFFER_SIZE = 1000
+
+# Attributed to calls made outside any page (e.g. the write-journal flush worker)
+NO_PAGE = "background"
+
+_page = contextvars.ContextVar("fitness_page", default=NO_PAGE)
+
+
+class MetricsSink(ABC):
+    """Receives one record per instrumented DAO call."""
+
+    @abstractmethod
+    def record(self, metric: dict) -> None:
+        """
+        metric: {operation, page, started_at, wall_seconds, rows, bytes_processed,
+                 slot_millis, cache_hit, job_id, error}; job fields are None when unknown.
+        """
+
+
+class RingBufferSink(MetricsSink):
+    """
+    Keeps the most recent records in memory, plus running totals per
+    (operation, page) since the process started. Thread-safe.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_RING_BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=capacity)
+        self._totals = {}
+
+    def record(self, metric: dict) -> None:
+        with self._lock:
+            self._records.append(metric)
+            totals = self._totals.setdefault((metric["operation"], metric["page"]), {
+                "calls": 0, "errors": 0, "wall_seconds": 0.0, "rows": 0,
+                "bytes_processed": 0, "slot_millis": 0, "cache_hits": 0,
+            })
+            totals["calls"] += 1
+            totals["errors"] += metric["error"] is not None
+            totals["wall_seconds"] += metric["wall_seconds"]
+            totals["rows"] += metric["rows"] or 0
+            totals["bytes_processed"] += metric["bytes_processed"] or 0
+            totals["slot_millis"] += metric["slot_millis"] or 0
+            totals["cache_hits"] += bool(metric["cache_hit"])
+
+    def records(self) -> list:
+        """The buffered records, oldest first."""
+        with self._lock:
+            return list(self._records)
+
+    def totals(self) -> dict:
+        """{(operation, page): {calls, errors, wall_seconds, rows, bytes_processed, slot_millis, cache_hits}}"""
+        with self._lock:
+            return {key: dict(value) for key, value in self._totals.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+            self._totals.clear()
+
+    def to_json(self) -> str:
+        """The buffered records as a JSON array."""
+        return json.dumps(self.records(), default=str)
+
+    def to_prometheus(self) -> str:
+        """The running totals in the Prometheus text exposition format."""
+        totals = self.totals()
+        lines = []
+        for field, help_text in (
+            ("calls", "Instrumented DAO calls."),
+            ("errors", "Instrumented DAO calls that raised."),
+            ("wall_seconds", "Wall time spent in DAO calls."),
+            ("rows", "Rows read or written."),
+            ("bytes_processed", "BigQuery bytes processed (billed queries)."),
+            ("slot_millis", "BigQuery slot milliseconds consumed."),
+            ("cache_hits", "Queries answered from the BigQuery results cache."),
+        ):
+            name = f"fitness_dao_{field}_total"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (operation, page), values in sorted(totals.items()):
+                lines.append(f'{name}{{operation="{_escape(operation)}",page="{_escape(page)}"}} {values[field]}')
+        return "\n".join(lines) + "\n"
+
+
+_sink: MetricsSink = RingBufferSink()
+
+
+def get_metrics_sink() -> MetricsSink:
+    return _sink
+
+
+def set_metrics_sink(sink: MetricsSink) -> None:
+    """Replaces the process-wide sink (e.g. with one that forwards to a metrics backend)."""
+    global _sink
+    _sink = sink
+
+
+@contextmanager
+def page_label(page: str) -> Iterator[None]:
+    """Attributes the DAO calls made inside the block (and in threads started via fetch_concurrently) to a page."""
+    token = _page.set(page)
+    try:
+        yield
+    finally:
+        _page.reset(token)
+
+
+class Measurement:
+    """What an instrumented block reports about its call; see instrumented()."""
+
+    def __init__(self):
+        self.rows: Optional[int] = None
+        self.job = None
+
+    def record_job(self, job, rows: Optional[int] = None) -> None:
+        """Takes bytes processed, slot time and cache hit from a finished BigQuery job."""
+        self.job = job
+        if rows is not None:
+            self.rows = rows
+
+
+@contextmanager
+def instrumented(operation: str) -> Iterator[Measurement]:
+    """
+    Times the block and sends one record to the metrics sink, also when the block raises.
+    In a generator the block spans the whole iteration, consumer time included.
+    e.g.
+        with instrumented("read_daily_totals") as measurement:
+            job = client.query(query)
+            df = job.to_dataframe()
+            measurement.record_job(job, rows=len(df))
+    """
+    measurement = Measurement()
+    started_at = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield measurement
+    except Exception as e:
+        error = repr(e)
+        raise
+    finally:
+        job = measurement.job
+        metric = {
+            "operation": operation,
+            "page": _page.get(),
+            "started_at": started_at,
+            "wall_seconds": time.perf_counter() - started,
+            "rows": _as_int(measurement.rows),
+            "bytes_processed": _as_int(getattr(job, "total_bytes_processed", None)),
+            "slot_millis": _as_int(getattr(job, "slot_millis", None)),
+            "cache_hit": _job_flag(job, "cache_hit"),
+            "job_id": _job_string(job, "job_id"),
+            "error": error,
+        }
+        try:
+            _sink.record(metric)
+        except Exception:
+            logger.exception(f"Recording metrics for '{operation}' failed.")
+
+
+def _as_int(value) -> Optional[int]:
+    return int(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _job_flag(job, attribute: str) -> Optional[bool]:
+    value = getattr(job, attribute, None)
+    return value if isinstance(value, bool) else None
+
+
+def _job_string(job, attribute: str) -> Optional[str]:
+    value = getattr(job, attribute, None)
+    return value if isinstance(value, str) else None
+
+
+def _escape(label: str) -> str:
+    return str(label).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from datetime import date
+from typing import Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+# Set up a logger
+logger = logging.getLogger(__name__)
+
+# refresh(ranges) brings the derived rows of each key up to date for its inclusive
+# (start, end) date range, e.g. {workout_type_id: (start, end)}.
+RefreshFn = Callable[[Dict[Hashable, Tuple[date, date]]], None]
+
+# catch_up() returns the ranges found stale in storage itself, in the same form.
+CatchUpFn = Callable[[], Dict[Hashable, Tuple[date, date]]]
+
+
+class RefreshQueue:
+    """
+    Date ranges of derived data (e.g. the daily_totals and score_history rows
+    of a workout type) that writes have made stale, and a background worker
+    that refreshes them.
+
+    mark() only records a range, so a write never waits for its refresh and
+    never fails because of it. flush() hands everything marked so far to the
+    refresh function in one call, so a burst of writes costs one refresh. A
+    refresh that raises leaves its ranges marked; the worker retries it with
+    exponential backoff. stale_since() tells readers what is not refreshed yet.
+    Marks live in memory, so a range still marked when its process exits (e.g.
+    a Cloud Run scale-down) is lost with it; the worker's catch_up function
+    finds such ranges in storage when the worker starts and then periodically,
+    and marks them again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[Hashable, Tuple[date, date]] = {}
+        self._in_flight: Dict[Hashable, Tuple[date, date]] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    def mark(self, keys: Iterable[Hashable], start: date, end: date) -> None:
+        """Records that the derived rows of keys from start through end are stale."""
+        with self._lock:
+            for key in keys:
+                self._pending[key] = _union(self._pending.get(key), (start, end))
+        self._wake.set()
+
+    def stale_since(self) -> dict:
+        """{key: earliest stale date} for the keys marked and not refreshed yet."""
+        with self._lock:
+            ranges = dict(self._in_flight)
+            for key, date_range in self._pending.items():
+                ranges[key] = _union(ranges.get(key), date_range)
+        return {key: start for key, (start, _) in ranges.items()}
+
+    def flush(self, refresh: RefreshFn) -> int:
+        """
+        Refreshes everything marked so far in one call; returns how many keys it covered.
+        If refresh raises, its ranges stay marked and the exception is re-raised.
+        """
+        with self._flush_lock:
+            with self._lock:
+                ranges, self._pending = self._pending, {}
+                self._in_flight = dict(ranges)
+            if not ranges:
+                return 0
+            try:
+                refresh(ranges)
+            except Exception:
+                with self._lock:
+                    for key, date_range in ranges.items():
+                        self._pending[key] = _union(self._pending.get(key), date_range)
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight = {}
+            return len(ranges)
+
+    def start_worker(
+        self,
+        refresh: RefreshFn,
+        interval_seconds: float = 2.0,
+        max_backoff_seconds: float = 60.0,
+        catch_up: Optional[CatchUpFn] = None,
+        catch_up_interval_seconds: float = 900.0,
+    ) -> None:
+        """
+        Starts a daemon thread that flushes interval_seconds after a mark (so the
+        marks of that interval share one refresh), backing off exponentially (up
+        to max_backoff_seconds) while refreshes fail. With catch_up, the thread
+        also marks the ranges catch_up() returns, right away and then every
+        catch_up_interval_seconds.
+        """
+        if self._worker is not None and self._worker.is_alive():
+            return
+
+        def run() -> None:
+            delay = interval_seconds
+            next_catch_up = time.monotonic()
+            while True:
+                if catch_up is None:
+                    self._wake.wait()
+                else:
+                    self._wake.wait(max(0.0, next_catch_up - time.monotonic()))
+                if self._stop.is_set():
+                    return
+                if catch_up is not None and time.monotonic() >= next_catch_up:
+                    next_catch_up = time.monotonic() + catch_up_interval_seconds
+                    self._catch_up(catch_up)
+                    if not self._wake.is_set():
+                        continue
+                if self._stop.wait(delay):
+                    return
+                self._wake.clear()
+                try:
+                    self.flush(refresh)
+                    delay = interval_seconds
+                except Exception:
+                    logger.exception("Refreshing stale derived rows failed; will retry.")
+                    self._wake.set()  # still marked
+                    delay = min(delay * 2, max_backoff_seconds)
+
+        self._stop.clear()
+        self._worker = threading.Thread(target=run, name="derived-refresh", daemon=True)
+        self._worker.start()
+
+    def _catch_up(self, catch_up: CatchUpFn) -> None:
+        try:
+            ranges = catch_up()
+        except Exception:
+            logger.exception("Looking for stale derived rows failed; will retry at the next catch-up.")
+            return
+        for key, (start, end) in ranges.items():
+            self.mark([key], start, end)
+
+    def stop_worker(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+
+def _union(current: Optional[Tuple[date, date]], date_range: Tuple[date, date]) -> Tuple[date, date]:
+    """The smallest date range covering both (current may be None)."""
+    if current is None:
+        return date_range
+    return min(current[0], date_range[0]), max(current[1], date_range[1])
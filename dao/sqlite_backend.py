@@ -0,0 +1,511 @@
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from typing import Iterator, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+
+from dao.frames import daily_totals_dtypes, ledger_row, reorder_workout_types, score_history_dtypes
+from dao.ledger_mirror import LEDGER_ARROW_SCHEMA
+from dao.storage import StorageBackend
+from scoring.score_engine import daily_score_history, window_days
+from scoring.score_state import ScoreState
+
+# Set up a logger
+logger = logging.getLogger(__name__)
+
+# Workout types are keyed by workout_type_id (AUTOINCREMENT: ids of deleted types are
+# never reused), so a rename only touches workout_types. The ledger's workout_type_id
+# is NULL only for logs of types deleted before the ids existed.
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS workout_types (
+        workout_type_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        workout_type TEXT NOT NULL,
+        unit TEXT NOT NULL,
+        is_int INTEGER NOT NULL,
+        daily_target REAL NOT NULL,
+        half_life_days REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS ledger (
+        workout_type_id INTEGER,
+        date TEXT NOT NULL,
+        amount REAL NOT NULL,
+        insert_id TEXT UNIQUE
+    );
+    CREATE INDEX IF NOT EXISTS ledger_type_date ON ledger (workout_type_id, date);
+    CREATE INDEX IF NOT EXISTS ledger_date ON ledger (date);
+    CREATE TABLE IF NOT EXISTS score_history (
+        workout_type_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        ewa REAL NOT NULL,
+        score REAL NOT NULL,
+        grade TEXT NOT NULL,
+        PRIMARY KEY (workout_type_id, date)
+    );
+    CREATE TABLE IF NOT EXISTS score_state (
+        workout_type_id INTEGER PRIMARY KEY,
+        state TEXT NOT NULL
+    );
+"""
+
+# Moves a database from before workout_type_id (types, ledger and derived tables keyed
+# by name) to SCHEMA_SQL in one transaction: readers keep seeing the old tables (WAL)
+# until it commits. Existing types keep their rowid as id; the derived tables are
+# recreated empty and bootstrap backfills them.
+MIGRATE_TO_WORKOUT_TYPE_IDS_SQL = f"""
+    BEGIN IMMEDIATE;
+    ALTER TABLE workout_types RENAME TO workout_types_by_name;
+    ALTER TABLE ledger RENAME TO ledger_by_name;
+    DROP INDEX IF EXISTS ledger_type_date;
+    DROP INDEX IF EXISTS ledger_date;
+    DROP TABLE IF EXISTS score_history;
+    DROP TABLE IF EXISTS score_state;
+    {SCHEMA_SQL}
+    INSERT INTO workout_types (workout_type_id, workout_type, unit, is_int, daily_target, half_life_days)
+        SELECT rowid, workout_type, unit, is_int, daily_target, half_life_days FROM workout_types_by_name;
+    INSERT INTO ledger (workout_type_id, date, amount, insert_id)
+        SELECT w.workout_type_id, l.date, l.amount, l.insert_id
+        FROM ledger_by_name l
+        LEFT JOIN (
+            SELECT workout_type, MIN(workout_type_id) AS workout_type_id FROM workout_types GROUP BY workout_type
+        ) w USING (workout_type);
+    DROP TABLE workout_types_by_name;
+    DROP TABLE ledger_by_name;
+    COMMIT;
+"""
+
+# Tables derived from the ledger and workout_types; backfilled when bootstrap creates them
+DERIVED_TABLES = ("score_history", "score_state")
+
+_EPOCH = date(1970, 1, 1)
+
+# Rows per record batch yielded by iter_ledger_batches
+STREAM_BATCH_SIZE = 50_000
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Embedded storage in a single SQLite file (WAL mode), for single-user or
+    offline deployments, tests and benchmarks. Daily totals are aggregated
+    at query time over the (workout_type_id, date) index; daily scores are
+    stored in score_history and recomputed in Python on every write, and
+    each type's current score is kept in score_state (see ScoreState).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def bootstrap(self) -> dict:
+        started = time.monotonic()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        migrated = self._migrate_to_workout_type_ids()
+        with closing(self._connect()) as conn, conn:
+            existing = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            conn.executescript(SCHEMA_SQL)
+        created = [table for table in DERIVED_TABLES if migrated or table not in existing]
+        if "score_history" in created:
+            self.refresh_score_history()
+        if "score_state" in created:
+            self._rebuild_score_states()
+        logger.info(f"SQLite database '{self.path}' is ready.")
+        return {
+            "ready": True,
+            "schema_version": None,
+            "error": None,
+            "checked_at": time.time(),
+            "duration_seconds": round(time.monotonic() - started, 3),
+        }
+
+    def _migrate_to_workout_type_ids(self) -> bool:
+        """Runs MIGRATE_TO_WORKOUT_TYPE_IDS_SQL if the ledger is still keyed by name; True if it did."""
+        with closing(self._connect()) as conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(ledger)")}
+            if "workout_type" not in columns:
+                return False
+            try:
+                conn.executescript(MIGRATE_TO_WORKOUT_TYPE_IDS_SQL)
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+        logger.info(f"Migrated SQLite database '{self.path}' to workout_type_id.")
+        return True
+
+    def create_workout_type(self, workout_type, unit, is_int, daily_target, half_life_days) -> None:
+        self.create_workout_types([{
+            "workout_type": workout_type,
+            "unit": unit,
+            "is_int": is_int,
+            "daily_target": daily_target,
+            "half_life_days": half_life_days,
+        }])
+        logger.info(
+            f"Created workout type '{workout_type}': "
+            f"unit={unit}, is_int={is_int}, daily_target={daily_target}, half_life_days={half_life_days}"
+        )
+
+    def create_workout_types(self, workout_types) -> list:
+        type_ids = []
+        with closing(self._connect()) as conn, conn:
+            for wt in workout_types:
+                cursor = conn.execute(
+                    "INSERT INTO workout_types (workout_type, unit, is_int, daily_target, half_life_days)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (wt["workout_type"], wt["unit"], bool(wt["is_int"]),
+                     float(wt["daily_target"]), float(wt["half_life_days"])),
+                )
+                type_ids.append(cursor.lastrowid)
+        # new ids have no logs, so no score history yet; only an empty score_state
+        self._rebuild_score_states(type_ids=type_ids)
+        return []
+
+    def read_workout_types(self) -> list:
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "SELECT workout_type_id, workout_type, unit, is_int, daily_target, half_life_days"
+                " FROM workout_types ORDER BY workout_type"
+            )
+            results = [
+                {"workout_type_id": k, "workout_type": t, "unit": u, "is_int": bool(i),
+                 "daily_target": d, "half_life_days": h}
+                for k, t, u, i, d, h in cursor.fetchall()
+            ]
+        logger.info(f"Read {len(results)} workout types.")
+        return reorder_workout_types(results)
+
+    def update_workout_type(self, old_workout_type, new_workout_type, new_unit,
+                            new_is_int, new_daily_target, new_half_life_days) -> None:
+        """A rename only touches workout_types; scores are recomputed if the target or half-life changed."""
+        with closing(self._connect()) as conn, conn:
+            rescored = [
+                type_id for type_id, target, half_life in conn.execute(
+                    "SELECT workout_type_id, daily_target, half_life_days FROM workout_types WHERE workout_type = ?",
+                    (old_workout_type,),
+                )
+                if target != float(new_daily_target) or half_life != float(new_half_life_days)
+            ]
+            conn.execute(
+                "UPDATE workout_types SET workout_type = ?, unit = ?, is_int = ?, daily_target = ?,"
+                " half_life_days = ? WHERE workout_type = ?",
+                (new_workout_type, new_unit, bool(new_is_int), float(new_daily_target),
+                 float(new_half_life_days), old_workout_type),
+            )
+        if rescored:
+            self._refresh_score_history(type_ids=rescored)
+            self._rebuild_score_states(type_ids=rescored)
+        logger.info(f"Updated workout type '{old_workout_type}' to '{new_workout_type}'.")
+
+    def delete_workout_type(self, workout_type) -> None:
+        """Deletes the type and its stored scores; its ledger rows are kept but no longer read."""
+        with closing(self._connect()) as conn, conn:
+            type_ids = [
+                type_id for (type_id,) in
+                conn.execute("SELECT workout_type_id FROM workout_types WHERE workout_type = ?", (workout_type,))
+            ]
+            conditions, params = _filters(type_ids, None, None, type_column="workout_type_id")
+            for table in ("workout_types", "score_history", "score_state"):
+                conn.execute(f"DELETE FROM {table} WHERE {conditions[0]}", params)
+        logger.info(f"Deleted workout type '{workout_type}'.")
+
+    def log_workout(self, workout_type, date_value, amount, unit) -> None:
+        errors = self.log_workouts([
+            {"workout_type": workout_type, "date": date_value, "amount": amount, "unit": unit}
+        ])
+        if errors:
+            raise Exception(f"Error inserting ledger entry: {errors}")
+        logger.info(f"Logged workout: {workout_type}, {amount} {unit} on {date_value}.")
+
+    def log_workouts(self, rows, row_ids=None) -> list:
+        """
+        Inserts all valid rows in one transaction, under their type's
+        workout_type_id (rows of unknown types are rejected). Rows whose row_id
+        was already inserted are skipped, like BigQuery's insertId deduplication.
+        The inserted rows update their types' score_state in the same transaction.
+        """
+        row_errors = []
+        valid = []
+        for index, row in enumerate(rows):
+            try:
+                valid.append((index, ledger_row(row)))
+            except (KeyError, TypeError, ValueError) as e:
+                row_errors.append({"index": index, "errors": [{"reason": "invalid", "message": str(e)}]})
+        inserted = []
+        with closing(self._connect()) as conn, conn:
+            ids_by_name = dict(conn.execute("SELECT workout_type, workout_type_id FROM workout_types"))
+            for index, r in valid:
+                type_id = ids_by_name.get(r["workout_type"])
+                if type_id is None:
+                    message = f"unknown workout type {r['workout_type']!r}"
+                    row_errors.append({"index": index, "errors": [{"reason": "invalid", "message": message}]})
+                    continue
+                value = (type_id, r["date"], r["amount"], row_ids[index] if row_ids is not None else None)
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO ledger (workout_type_id, date, amount, insert_id) VALUES (?, ?, ?, ?)",
+                    value,
+                )
+                if cursor.rowcount:
+                    inserted.append(value)
+            self._apply_to_score_states(conn, inserted)
+        if inserted:
+            self._refresh_score_history(
+                type_ids=sorted({v[0] for v in inserted}), start=date.fromisoformat(min(v[1] for v in inserted))
+            )
+        logger.info(
+            f"Logged {len(rows) - len(row_errors)} of {len(rows)} workouts ({len(row_errors)} rows with errors)."
+        )
+        return sorted(row_errors, key=lambda error: error["index"])
+
+    def read_workouts(self, filter_type=None, start=None, end=None) -> pd.DataFrame:
+        conditions, params = _filters([filter_type] if filter_type else None, start, end)
+        query = "SELECT workout_type, date, amount, unit FROM ledger JOIN workout_types USING (workout_type_id)"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY date DESC"
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(query, conn, params=params)
+        df["date"] = [date.fromisoformat(d) for d in df["date"]]
+        logger.info(
+            f"Read {len(df)} workouts from ledger."
+            + (f" (Filtered by '{filter_type}')" if filter_type else "")
+        )
+        return df
+
+    def iter_ledger_batches(self, types=None, start=None, end=None) -> Iterator[pa.RecordBatch]:
+        conditions, params = _filters(types, start, end)
+        query = "SELECT workout_type, date, amount, unit FROM ledger JOIN workout_types USING (workout_type_id)"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    return
+                workout_types, dates, amounts, units = zip(*rows)
+                yield pa.RecordBatch.from_arrays([
+                    pa.array(workout_types, pa.string()),
+                    pa.array([date.fromisoformat(d) for d in dates], pa.date32()),
+                    pa.array(amounts, pa.float64()),
+                    pa.array(units, pa.string()),
+                ], schema=LEDGER_ARROW_SCHEMA)
+
+    def read_daily_totals(self, types=None, start=None, end=None, before_key=None, limit=None) -> pd.DataFrame:
+        conditions, params = _filters(types, start, end)
+        if before_key is not None:
+            before_date = _iso_date(pd.Timestamp(before_key[0]))
+            conditions.append("(date < ? OR (date = ? AND workout_type > ?))")
+            params += [before_date, before_date, before_key[1]]
+        query = (
+            "SELECT workout_type, date, SUM(amount) AS amount"
+            " FROM ledger JOIN workout_types USING (workout_type_id)"
+        )
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " GROUP BY workout_type_id, date ORDER BY date DESC, workout_type"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(query, conn, params=params)
+        logger.info(f"Read {len(df)} daily totals.")
+        return daily_totals_dtypes(df)
+
+    def refresh_score_history(self, types=None, start=None) -> None:
+        self._refresh_score_history(self._type_ids(types), start)
+
+    def _refresh_score_history(self, type_ids: Optional[Sequence[int]] = None, start: Optional[date] = None) -> None:
+        """
+        refresh_score_history for some workout_type_ids (all if None). A day's score
+        only depends on the window_days before it, so from start on only the ledger
+        from start - window_days (of the longest half-life) is read.
+        """
+        wtypes = self._workout_types_by_id(type_ids)
+        since = None
+        first_days = {}
+        if start is not None and wtypes:
+            lookback = int(window_days(max(wt["half_life_days"] for wt in wtypes.values())))
+            since = start - timedelta(days=lookback)
+            first_days = self._first_logged_days(type_ids)
+        rows = []
+        for type_id, subset in self._daily_totals_by_id(type_ids, since).groupby("workout_type_id"):
+            wt = wtypes.get(type_id)
+            if wt is None:
+                continue
+            first_day = subset["date"].min()
+            if start is not None:
+                # scores start at the first log, which may be before since
+                first_day = max(first_days.get(type_id, first_day), pd.Timestamp(start))
+            history = daily_score_history(
+                subset, wt["half_life_days"], wt["daily_target"], first_day, subset["date"].max()
+            )
+            rows.extend(zip(
+                [type_id] * len(history), [_iso_date(d) for d in history["date"]],
+                history["ewa"].tolist(), history["score"].tolist(), history["grade"].tolist(),
+            ))
+        conditions, params = _filters(type_ids, start, None, type_column="workout_type_id")
+        query = "DELETE FROM score_history"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(query, params)
+            conn.executemany(
+                "INSERT INTO score_history (workout_type_id, date, ewa, score, grade) VALUES (?, ?, ?, ?, ?)", rows
+            )
+        logger.info(f"Refreshed score history ({len(rows)} rows).")
+
+    def write_score_history(self, history) -> int:
+        ids_by_name = {wt["workout_type"]: wt["workout_type_id"] for wt in self.read_workout_types()}
+        known = history[history["workout_type"].isin(list(ids_by_name))]
+        rows = list(zip(
+            [ids_by_name[t] for t in known["workout_type"]], [_iso_date(d) for d in known["date"]],
+            known["ewa"].astype(float).tolist(), known["score"].astype(float).tolist(), known["grade"].tolist(),
+        ))
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO score_history (workout_type_id, date, ewa, score, grade)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        logger.info(f"Wrote {len(rows)} score history rows ({len(history) - len(rows)} of unknown types skipped).")
+        return len(rows)
+
+    def read_current_scores(self) -> pd.DataFrame:
+        wtypes = self.read_workout_types()
+        with closing(self._connect()) as conn:
+            states = dict(conn.execute("SELECT workout_type_id, state FROM score_state").fetchall())
+        rows = []
+        for wt in wtypes:
+            text = states.get(wt["workout_type_id"])
+            state = ScoreState.from_json(text) if text else ScoreState(wt["half_life_days"], wt["daily_target"])
+            rows.append((wt["workout_type"], state.ewa, state.score_pct, state.grade))
+        return pd.DataFrame(rows, columns=["workout_type", "ewa", "score_pct", "grade"])
+
+    def _apply_to_score_states(self, conn: sqlite3.Connection, rows: list) -> None:
+        """Adds newly inserted ledger rows (workout_type_id, date, amount, ...) to their types' score_state."""
+        type_ids = sorted({row[0] for row in rows})
+        if not type_ids:
+            return
+        conditions, params = _filters(type_ids, None, None, type_column="workout_type_id")
+        states = {
+            type_id: ScoreState.from_json(text)
+            for type_id, text in conn.execute(f"SELECT workout_type_id, state FROM score_state WHERE {conditions[0]}", params)
+        }
+        for type_id, date_value, amount, *_ in rows:
+            state = states.get(type_id)
+            if state is not None:
+                state.add((date.fromisoformat(date_value) - _EPOCH).days, amount)
+        conn.executemany(
+            "UPDATE score_state SET state = ? WHERE workout_type_id = ?",
+            [(state.to_json(), type_id) for type_id, state in states.items()],
+        )
+
+    def _rebuild_score_states(self, type_ids: Optional[Sequence[int]] = None) -> None:
+        """Recomputes score_state from the ledger, for new or changed workout types (all if None)."""
+        wtypes = self._workout_types_by_id(type_ids)
+        daily = self._daily_totals_by_id(type_ids)
+        subsets = {type_id: sub for type_id, sub in daily.groupby("workout_type_id")}
+        rows = [
+            (type_id, ScoreState.from_daily_totals(
+                subsets.get(type_id, daily.iloc[0:0]), wt["half_life_days"], wt["daily_target"]
+            ).to_json())
+            for type_id, wt in wtypes.items()
+        ]
+        conditions, params = _filters(type_ids, None, None, type_column="workout_type_id")
+        query = "DELETE FROM score_state"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(query, params)
+            conn.executemany("INSERT INTO score_state (workout_type_id, state) VALUES (?, ?)", rows)
+        logger.info(f"Rebuilt score state for {len(rows)} workout types.")
+
+    def read_score_history(self, types=None, start=None, end=None) -> pd.DataFrame:
+        conditions, params = _filters(types, start, end)
+        query = (
+            "SELECT workout_type, date, ewa, score, grade"
+            " FROM score_history JOIN workout_types USING (workout_type_id)"
+        )
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY workout_type, date"
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(query, conn, params=params)
+        logger.info(f"Read {len(df)} score history rows.")
+        return score_history_dtypes(df)
+
+    def _type_ids(self, types: Optional[Sequence[str]]) -> Optional[list]:
+        """The workout_type_ids of some workout type names (None stays None: all types)."""
+        if types is None:
+            return None
+        wanted = set(types)
+        return [wt["workout_type_id"] for wt in self.read_workout_types() if wt["workout_type"] in wanted]
+
+    def _workout_types_by_id(self, type_ids: Optional[Sequence[int]]) -> dict:
+        """workout_type_id -> workout type dict, for some ids (all if None)."""
+        return {
+            wt["workout_type_id"]: wt for wt in self.read_workout_types()
+            if type_ids is None or wt["workout_type_id"] in type_ids
+        }
+
+    def _first_logged_days(self, type_ids: Optional[Sequence[int]]) -> dict:
+        """workout_type_id -> first logged day (Timestamp), for some ids (all if None)."""
+        conditions, params = _filters(type_ids, None, None, type_column="workout_type_id")
+        query = "SELECT workout_type_id, MIN(date) FROM ledger"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " GROUP BY workout_type_id"
+        with closing(self._connect()) as conn:
+            return {type_id: pd.Timestamp(day) for type_id, day in conn.execute(query, params).fetchall()}
+
+    def _daily_totals_by_id(self, type_ids: Optional[Sequence[int]], start: Optional[date] = None) -> pd.DataFrame:
+        """
+        Daily sums [workout_type_id, date, amount] (datetime64 dates) for some ids
+        (all if None), from start on (all days if None).
+        """
+        conditions, params = _filters(type_ids, start, None, type_column="workout_type_id")
+        query = "SELECT workout_type_id, date, SUM(amount) AS amount FROM ledger"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " GROUP BY workout_type_id, date"
+        with closing(self._connect()) as conn:
+            df = pd.read_sql_query(query, conn, params=params)
+        df["date"] = pd.to_datetime(df["date"]).astype("datetime64[ns]")
+        df["amount"] = df["amount"].astype("float64")
+        return df
+
+
+def _filters(
+    types: Optional[Sequence],
+    start: Optional[date],
+    end: Optional[date],
+    type_column: str = "workout_type",
+) -> tuple:
+    """WHERE conditions and parameters for a type list (names, or ids with type_column="workout_type_id") and inclusive date range."""
+    conditions = []
+    params = []
+    if types is not None:
+        types = list(types)
+        conditions.append(f"{type_column} IN ({', '.join('?' * len(types))})" if types else "0")
+        params.extend(types)
+    if start is not None:
+        conditions.append("date >= ?")
+        params.append(_iso_date(start))
+    if end is not None:
+        conditions.append("date <= ?")
+        params.append(_iso_date(end))
+    return conditions, params
+
+
+def _iso_date(value: date) -> str:
+    """'YYYY-MM-DD' for a date, datetime or pd.Timestamp (dates are stored as ISO text)."""
+    return (value.date() if isinstance(value, datetime) else value).isoformat()
@@ -0,0 +1,225 @@
+import contextvars
+import functools
+import logging
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Any, Callable, Iterator, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+
+from scoring.score_engine import compact_ledger
+
+# Set up a logger
+logger = logging.getLogger(__name__)
+
+# Which backend get_storage_backend() returns: "bigquery" (default) or "sqlite"
+STORAGE_BACKEND_ENV = "FITNESS_STORAGE_BACKEND"
+# Database file for the sqlite backend
+SQLITE_PATH_ENV = "FITNESS_SQLITE_PATH"
+DEFAULT_SQLITE_PATH = "fitness.sqlite"
+
+# Shared pool for fetch_concurrently (reads mostly wait on BigQuery jobs, so threads are enough)
+FETCH_POOL_SIZE = 8
+_fetch_pool = ThreadPoolExecutor(max_workers=FETCH_POOL_SIZE, thread_name_prefix="dao-fetch")
+
+
+class StorageBackend(ABC):
+    """
+    Every data operation the app needs, independent of where the data lives.
+    Return shapes follow the BigQuery DAO in dao/workout_dao.py.
+    """
+
+    @abstractmethod
+    def bootstrap(self) -> dict:
+        """Create whatever tables are missing; returns a readiness status dict."""
+
+    @abstractmethod
+    def create_workout_type(self, workout_type: str, unit: str, is_int: bool,
+                            daily_target: float, half_life_days: float) -> None:
+        ...
+
+    @abstractmethod
+    def create_workout_types(self, workout_types: Sequence[dict]) -> list:
+        """Returns per-row errors as [{"index": i, "errors": [...]}]."""
+
+    @abstractmethod
+    def read_workout_types(self) -> list:
+        """List of dicts [workout_type, unit, is_int, daily_target, half_life_days], preferred types first."""
+
+    @abstractmethod
+    def update_workout_type(self, old_workout_type: str, new_workout_type: str, new_unit: str,
+                            new_is_int: bool, new_daily_target: float, new_half_life_days: float) -> None:
+        ...
+
+    @abstractmethod
+    def delete_workout_type(self, workout_type: str) -> None:
+        ...
+
+    @abstractmethod
+    def log_workout(self, workout_type: str, date_value: date, amount: float, unit: str) -> None:
+        ...
+
+    @abstractmethod
+    def log_workouts(self, rows: Sequence[dict], row_ids: Optional[Sequence[str]] = None) -> list:
+        """Returns per-row errors as [{"index": i, "errors": [...]}]."""
+
+    @abstractmethod
+    def read_workouts(self, filter_type: str = None, start: Optional[date] = None,
+                      end: Optional[date] = None) -> pd.DataFrame:
+        """Ledger rows [workout_type, date, amount, unit], most recent first."""
+
+    @abstractmethod
+    def iter_ledger_batches(self, types: Optional[Sequence[str]] = None, start: Optional[date] = None,
+                            end: Optional[date] = None) -> Iterator[pa.RecordBatch]:
+        """
+        Ledger rows [workout_type, date, amount, unit] streamed as Arrow record
+        batches in no particular order, for reads that must not materialize the ledger.
+        """
+
+    def read_ledger_compact(self, types: Optional[Sequence[str]] = None, start: Optional[date] = None,
+                            end: Optional[date] = None) -> pd.DataFrame:
+        """
+        Ledger rows as a compact frame [workout_type (categorical), day (int32 days
+        since epoch), amount (float32)] (see scoring.score_engine.compact_ledger),
+        built batch by batch from iter_ledger_batches. The scoring functions take it as is.
+        """
+        return compact_ledger(self.iter_ledger_batches(types=types, start=start, end=end))
+
+    @abstractmethod
+    def read_daily_totals(self, types: Optional[Sequence[str]] = None, start: Optional[date] = None,
+                          end: Optional[date] = None, before_key: Optional[tuple] = None,
+                          limit: Optional[int] = None) -> pd.DataFrame:
+        """
+        Daily sums [workout_type, date (datetime64), amount (float64)], ordered by
+        date DESC then workout_type. Keyset pagination: at most limit rows, starting
+        after before_key = (date, workout_type).
+        """
+
+    @abstractmethod
+    def read_current_scores(self) -> pd.DataFrame:
+        """
+        Current Scores [workout_type, ewa, score_pct, grade] (as compute_current_scores)
+        for every workout type, from state the writes keep up to date rather than
+        from the ledger.
+        """
+
+    @abstractmethod
+    def refresh_score_history(self, types: Optional[Sequence[str]] = None, start: Optional[date] = None) -> None:
+        """
+        Recomputes the stored daily scores of the given types from start on (everything
+        if no arguments). The write methods above keep it current; call it to repair.
+        """
+
+    @abstractmethod
+    def read_score_history(self, types: Optional[Sequence[str]] = None, start: Optional[date] = None,
+                           end: Optional[date] = None) -> pd.DataFrame:
+        """
+        Stored daily scores [workout_type, date (datetime64), ewa, score, grade] from each
+        type's first through last logged day, ordered by workout_type then date.
+        """
+
+    @abstractmethod
+    def write_score_history(self, history: pd.DataFrame) -> int:
+        """
+        Stores precomputed daily scores [workout_type, date, ewa, score, grade] in bulk
+        (see scoring.batch_scoring), replacing the stored rows of the same (type, date).
+        Rows of unknown workout types are skipped. Returns how many rows were written.
+        """
+
+    def stale_score_dates(self) -> dict:
+        """
+        {workout_type: date} for the types whose stored daily scores from that date
+        on may not reflect their logs yet (recompute those days from read_daily_totals).
+        Empty for backends whose writes update the scores before returning.
+        """
+        return {}
+
+
+class BigQueryBackend(StorageBackend):
+    """The BigQuery DAO (dao/workout_dao.py) behind the StorageBackend interface."""
+
+    def bootstrap(self) -> dict:
+        return self._dao.bootstrap_schema()
+
+    def create_workout_type(self, workout_type, unit, is_int, daily_target, half_life_days) -> None:
+        self._dao.create_workout_type(workout_type, unit, is_int, daily_target, half_life_days)
+
+    def create_workout_types(self, workout_types) -> list:
+        return self._dao.create_workout_types(workout_types)
+
+    def read_workout_types(self) -> list:
+        return self._dao.read_workout_types()
+
+    def update_workout_type(self, old_workout_type, new_workout_type, new_unit,
+                            new_is_int, new_daily_target, new_half_life_days) -> None:
+        self._dao.update_workout_type(
+            old_workout_type, new_workout_type, new_unit, new_is_int, new_daily_target, new_half_life_days
+        )
+
+    def delete_workout_type(self, workout_type) -> None:
+        self._dao.delete_workout_type(workout_type)
+
+    def log_workout(self, workout_type, date_value, amount, unit) -> None:
+        self._dao.log_workout(workout_type, date_value, amount, unit)
+
+    def log_workouts(self, rows, row_ids=None) -> list:
+        return self._dao.log_workouts(rows, row_ids=row_ids)
+
+    def read_workouts(self, filter_type=None, start=None, end=None) -> pd.DataFrame:
+        return self._dao.read_workouts(filter_type, start=start, end=end)
+
+    def iter_ledger_batches(self, types=None, start=None, end=None) -> Iterator[pa.RecordBatch]:
+        return self._dao.iter_ledger_batches(types=types, start=start, end=end)
+
+    def read_daily_totals(self, types=None, start=None, end=None, before_key=None, limit=None) -> pd.DataFrame:
+        return self._dao.read_daily_totals(
+            types=types, start=start, end=end, before_key=before_key, limit=limit
+        )
+
+    def read_current_scores(self) -> pd.DataFrame:
+        return self._dao.read_current_scores()
+
+    def refresh_score_history(self, types=None, start=None) -> None:
+        self._dao.refresh_score_history(types=types, start=start)
+
+    def read_score_history(self, types=None, start=None, end=None) -> pd.DataFrame:
+        return self._dao.read_score_history(types=types, start=start, end=end)
+
+    def write_score_history(self, history) -> int:
+        return self._dao.write_score_history(history)
+
+    def stale_score_dates(self) -> dict:
+        return self._dao.stale_score_dates()
+
+
+@functools.lru_cache(maxsize=1)
+def get_storage_backend() -> StorageBackend:
+    """
+    Return the process-wide storage backend selected by FITNESS_STORAGE_BACKEND
+    ("bigquery" by default, or "sqlite" for a local database at FITNESS_SQLITE_PATH).
+    """
+    name = os.environ.get(STORAGE_BACKEND_ENV, "bigquery").lower()
+    if name == "bigquery":
+        backend = BigQueryBackend()
+    elif name == "sqlite":
+        from dao.sqlite_backend import SQLiteBackend
+        backend = SQLiteBackend(os.environ.get(SQLITE_PATH_ENV, DEFAULT_SQLITE_PATH))
+    else:
+        raise ValueError(f"Unknown {STORAGE_BACKEND_ENV} '{name}' (expected 'bigquery' or 'sqlite').")
+    logger.info(f"Using {type(backend).__name__} for storage.")
+    return backend
+
+
+def fetch_concurrently(**calls: Callable[[], Any]) -> dict:
+    """
+    Runs independent DAO reads at the same time and gathers their results,
+    so a page waits for the slowest query instead of the sum of all of them.
+    e.g. fetch_concurrently(totals=storage.read_daily_totals, types=storage.read_workout_types)
+    Returns {name: result}; if any call fails, its exception is raised.
+    Each call runs in a copy of the caller's context, so query metrics keep the page label.
+    """
+    futures = {name: _fetch_pool.submit(contextvars.copy_context().run, call) for name, call in calls.items()}
+    return {name: future.result() for name, future in futures.items()}
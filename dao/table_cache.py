@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+import pandas as pd
+
+# Set up a logger
+logger = logging.getLogger(__name__)
+
+
+class TableCache:
+    """
+    Process-wide cache of one table read.
+
+    A cached value is served as-is for ttl_seconds. After that it is
+    revalidated with a cheap fingerprint of the table (e.g. its `modified`
+    timestamp from get_table) and only reloaded if the fingerprint changed.
+    Writers call invalidate() to force a reload on the next read.
+    Thread-safe; concurrent readers of a stale entry share a single reload.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self._fingerprint: Hashable = None
+        self._checked_at = 0.0
+        self._valid = False
+
+    def get(self, load: Callable[[], Any], fingerprint: Callable[[], Hashable]) -> Any:
+        with self._lock:
+            now = time.monotonic()
+            if self._valid and now - self._checked_at < self.ttl_seconds:
+                return self._value
+
+            current = fingerprint()
+            if self._valid and current == self._fingerprint:
+                logger.info(f"Cache '{self.name}' revalidated (table unchanged).")
+                self._checked_at = now
+                return self._value
+
+            self._value = load()
+            self._fingerprint = current
+            self._checked_at = now
+            self._valid = True
+            return self._value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._valid = False
+            self._value = None
+
+
+def frame_nbytes(value: Any) -> int:
+    """In-memory size of a cached DataFrame (object/string columns included)."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    return 0
+
+
+class LRUTableCache:
+    """
+    Process-wide cache of many reads of the same table(s), one entry per key
+    (e.g. per filter combination), shared by every session and thread.
+
+    Each entry follows TableCache's rules: served as-is for ttl_seconds, then
+    revalidated with the table fingerprint and only reloaded if it changed.
+    Once the entries' total size (see sizeof) exceeds max_bytes, the least
+    recently used ones are evicted. invalidate() drops every entry.
+    Thread-safe; concurrent readers of the same stale key share a single
+    reload, while reads of other keys proceed.
+    """
+
+    # loads are serialized per stripe of keys, not per cache
+    _LOAD_LOCK_STRIPES = 16
+
+    def __init__(
+        self,
+        name: str,
+        ttl_seconds: float,
+        max_bytes: int,
+        sizeof: Callable[[Any], int] = frame_nbytes,
+    ):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._lock = threading.Lock()
+        self._load_locks = [threading.Lock() for _ in range(self._LOAD_LOCK_STRIPES)]
+        # key -> [value, fingerprint, checked_at, size], least recently used first
+        self._entries: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._bytes = 0
+        # bumped by invalidate(), so a load racing a write is not stored
+        self._generation = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, load: Callable[[], Any], fingerprint: Callable[[], Hashable]) -> Any:
+        with self._load_locks[hash(key) % self._LOAD_LOCK_STRIPES]:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and time.monotonic() - entry[2] < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    return entry[0]
+                generation = self._generation
+
+            current = fingerprint()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and current == entry[1]:
+                    logger.info(f"Cache '{self.name}' revalidated {key!r} (table unchanged).")
+                    entry[2] = time.monotonic()
+                    self._entries.move_to_end(key)
+                    return entry[0]
+
+            value = load()
+            with self._lock:
+                if generation == self._generation:
+                    self._store(key, value, current)
+            return value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._generation += 1
+
+    def _store(self, key: Hashable, value: Any, fingerprint: Hashable) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[3]
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            logger.info(f"Cache '{self.name}': {key!r} ({size} bytes) exceeds the cap; not cached.")
+            return
+        self._entries[key] = [value, fingerprint, time.monotonic(), size]
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted[3]
+            logger.info(f"Cache '{self.name}' evicted {evicted_key!r} ({evicted[3]} bytes).")
@@ -1,11 +1,34 @@
 import functools
+import io
+import json
 import logging
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
-from typing import Sequence
+from typing import Iterator, Optional, Sequence
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from google.cloud import bigquery
-from google.api_core.exceptions import NotFound
+from google.api_core.exceptions import BadRequest, NotFound
+
+from dao.frames import daily_totals_dtypes, ledger_row, reorder_workout_types, score_history_dtypes
+from dao.ledger_mirror import LEDGER_ARROW_SCHEMA, LEDGER_TABLE_ARROW_SCHEMA, LedgerMirror
+from dao.query_metrics import instrumented
+from dao.refresh_queue import RefreshQueue
+from dao.table_cache import LRUTableCache, TableCache
+from dao.write_journal import WriteJournal
+from scoring.score_engine import (
+    FAILING_GRADE,
+    GRADE_THRESHOLDS,
+    compute_current_scores,
+    daily_totals_from_batches,
+    get_grades,
+)
 
 # Set up a logger
 logger = logging.getLogger(__name__)
@@ -14,27 +37,88 @@ PROJECT_ID = "linux-instance-228201"
 DATASET_ID = "fitness"
 WORKOUT_TYPES_TABLE = "workout_types"
 LEDGER_TABLE = "ledger"
+DAILY_TOTALS_TABLE = "daily_totals"
+SCORE_HISTORY_TABLE = "score_history"
 
 # Fully qualified table IDs
 WORKOUT_TYPES_TABLE_ID = f"{PROJECT_ID}.{DATASET_ID}.{WORKOUT_TYPES_TABLE}"
 LEDGER_TABLE_ID = f"{PROJECT_ID}.{DATASET_ID}.{LEDGER_TABLE}"
+DAILY_TOTALS_TABLE_ID = f"{PROJECT_ID}.{DATASET_ID}.{DAILY_TOTALS_TABLE}"
+SCORE_HISTORY_TABLE_ID = f"{PROJECT_ID}.{DATASET_ID}.{SCORE_HISTORY_TABLE}"
+# Scratch table write_score_history loads precomputed scores into before merging them
+SCORE_HISTORY_STAGING_TABLE_ID = f"{PROJECT_ID}.{DATASET_ID}.{SCORE_HISTORY_TABLE}_staging"
 
+# Bump when tables or schemas change; bootstrap_schema() records it as a dataset label
+SCHEMA_VERSION = "3"
+SCHEMA_VERSION_LABEL = "schema_version"
 
-def reorder_workout_types(all_wtypes: list, preferred_order: Sequence[str] = ("running", "pushups")) -> list:
-    """
-    all_wtypes: list of workout type dicts, e.g. [{"workout_type": "pushups", ...}, {"workout_type": "running", ...}, {"workout_type": "yoga", ...}]
-    preferred_order: e.g. ["running", "pushups"]
+# Dataset label counting in-place rewrites of ledger rows (workout_type_id backfills);
+# ledger mirrors fetched under another value resync in full (see LedgerMirror.sync)
+LEDGER_GENERATION_LABEL = "ledger_generation"
+_bootstrap_lock = threading.Lock()
+_bootstrap_state = {
+    "ready": False,
+    "schema_version": None,
+    "migration_pending": False,
+    "error": None,
+    "checked_at": None,
+    "duration_seconds": None,
+}
+
+# Ledger-shaped tables are partitioned by month of `date` (daily partitions would hit
+# BigQuery's 4000-partition limit after ~11 years) and clustered by workout_type_id.
+LEDGER_PARTITIONING = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.MONTH, field="date")
+LEDGER_CLUSTERING_FIELDS = ["workout_type_id"]
+
+# DML fails (changing nothing) while rows it would change are still in the streaming buffer
+# (up to ~90 minutes after a streaming insert); migrate_to_workout_type_ids() then defers its step
+STREAMING_BUFFER_ERROR = "streaming buffer"
+
+# How long bootstrap_schema() waits before retrying a migration that was deferred
+MIGRATION_RETRY_SECONDS = 600
+
+# Name-keyed columns of tables created before workout_type_id; migrate_to_workout_type_ids()
+# makes them NULLABLE and new rows leave them empty
+LEGACY_TYPE_COLUMNS = ("workout_type", "unit")
+
+# workout_types changes rarely: reads are cached for this long, then revalidated against
+# the table's metadata (get_table) instead of re-running the query
+WORKOUT_TYPES_CACHE_TTL_SECONDS = 300
+_workout_types_cache = TableCache("workout_types", WORKOUT_TYPES_CACHE_TTL_SECONDS)
+
+# Ledger and daily_totals reads are shared by every session: each result is served as-is
+# for this long, then revalidated against the table's metadata. Our own writes invalidate them.
+LEDGER_CACHE_TTL_SECONDS = 30
+# Memory cap for those cached frames; the least recently used ones are evicted first
+LEDGER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+_ledger_cache = LRUTableCache("ledger_reads", LEDGER_CACHE_TTL_SECONDS, LEDGER_CACHE_MAX_BYTES)
+
+# Bulk ingestion: streaming-insert batch size, and the row count above which a load job is used
+STREAMING_BATCH_SIZE = 500
+LOAD_JOB_THRESHOLD = 5000
+
+# Rows per page when streaming ledger results over the REST API (the Storage Read API,
+# used when google-cloud-bigquery-storage is installed, picks its own batch sizes)
+LEDGER_STREAM_PAGE_SIZE = 50_000
+
+# Set to a local directory (e.g. /tmp/fitness/ledger) to serve ledger reads from a Parquet mirror.
+# It syncs at most once per LEDGER_CACHE_TTL_SECONDS, and only fetches if the ledger table changed.
+# Off by default: the mirror only sees backdated logs written by this process (see LedgerMirror),
+# so use it with a single app instance.
+LEDGER_MIRROR_PATH_ENV = "LEDGER_MIRROR_PATH"
+
+# daily_totals and score_history catch up with ledger writes on a background thread, this long
+# after a write, so the writes of that interval share one MERGE per table (see get_refresh_queue)
+DERIVED_REFRESH_DELAY_SECONDS = 2.0
+
+# The refresh worker also compares daily_totals with the ledger (one ledger scan) when it starts
+# and this often, and refreshes what differs: ranges whose refresh was lost with its process
+DERIVED_CATCH_UP_SECONDS = 900
+
+# Set to a local file path (e.g. /tmp/fitness/journal.sqlite) to make log_workout write-behind:
+# rows are journaled locally and flushed to BigQuery by a background worker
+WRITE_JOURNAL_PATH_ENV = "WRITE_JOURNAL_PATH"
 
-    Returns a new list with the preferred_order items first (ordered as in preferred_order),
-    then the remaining dicts sorted alphabetically by workout_type.
-    """
-    # Get the preferred workout types in the specified order.
-    preferred_items = [wt for key in preferred_order for wt in all_wtypes if wt["workout_type"] == key]
-    # Get those that are not in the preferred set.
-    preferred_set = set(preferred_order)
-    not_preferred_items = [wt for wt in all_wtypes if wt["workout_type"] not in preferred_set]
-    not_preferred_items.sort(key=lambda wt: wt["workout_type"])
-    return preferred_items + not_preferred_items
 
 @functools.lru_cache(maxsize=1)
 def get_bq_client() -> bigquery.Client:
@@ -42,10 +126,66 @@ def get_bq_client() -> bigquery.Client:
     return bigquery.Client(project=PROJECT_ID)
 
 
-def ensure_dataset_and_tables() -> None:
+@functools.lru_cache(maxsize=1)
+def get_bqstorage_client():
+    """
+    Return a cached BigQuery Storage Read API client, or None if the optional
+    google-cloud-bigquery-storage package is not installed (results are then paged over REST).
+    """
+    try:
+        from google.cloud import bigquery_storage
+    except ImportError:
+        logger.info("google-cloud-bigquery-storage is not installed; streaming query results over REST.")
+        return None
+    return bigquery_storage.BigQueryReadClient(credentials=get_bq_client()._credentials)
+
+
+@functools.lru_cache(maxsize=1)
+def get_ledger_mirror() -> Optional[LedgerMirror]:
+    """Return the process-wide ledger mirror, or None if LEDGER_MIRROR_PATH is not set."""
+    path = os.environ.get(LEDGER_MIRROR_PATH_ENV)
+    return LedgerMirror(path, schema=LEDGER_TABLE_ARROW_SCHEMA, ttl_seconds=LEDGER_CACHE_TTL_SECONDS) if path else None
+
+
+@functools.lru_cache(maxsize=1)
+def get_write_journal() -> Optional[WriteJournal]:
+    """
+    Return the process-wide write-behind journal (with its flush worker running),
+    or None if WRITE_JOURNAL_PATH is not set.
+    """
+    path = os.environ.get(WRITE_JOURNAL_PATH_ENV)
+    if not path:
+        return None
+    journal = WriteJournal(path, batch_size=STREAMING_BATCH_SIZE)
+    journal.start_worker(lambda rows, row_ids: log_workouts(rows, row_ids=row_ids))
+    return journal
+
+
+@functools.lru_cache(maxsize=1)
+def get_refresh_queue() -> RefreshQueue:
+    """
+    Return the process-wide queue of daily_totals/score_history ranges made stale
+    by ledger writes (keyed by workout_type_id), with its refresh worker running.
+    Marks live in memory, so the worker also catches up on ranges any process
+    left stale (see _stale_derived_ranges and DERIVED_CATCH_UP_SECONDS).
+    """
+    queue = RefreshQueue()
+    queue.start_worker(
+        _refresh_derived_tables,
+        interval_seconds=DERIVED_REFRESH_DELAY_SECONDS,
+        catch_up=_stale_derived_ranges,
+        catch_up_interval_seconds=DERIVED_CATCH_UP_SECONDS,
+    )
+    return queue
+
+
+def ensure_dataset_and_tables() -> bool:
     """
     Checks if the dataset 'fitness' exists. If not, creates it.
-    Then checks for the workout_types and ledger tables, creating if needed.
+    Then checks for the workout_types, ledger, daily_totals and score_history tables,
+    creating if needed. Newly created derived tables are backfilled, and tables
+    that already existed are migrated to workout_type_id (see migrate_to_workout_type_ids).
+    Returns whether that migration is complete.
     """
     client = get_bq_client()
 
@@ -59,38 +199,412 @@ def ensure_dataset_and_tables() -> None:
         dataset = client.create_dataset(dataset_ref)
         logger.info(f"Created dataset '{dataset.dataset_id}'.")
 
-    # Ensure workout_types Table Exists
+    # Ensure workout_types Table Exists (workout_type_id is the key; the name can change)
     schema_workout_types = [
+        bigquery.SchemaField("workout_type_id", "INT64", mode="REQUIRED"),
         bigquery.SchemaField("workout_type", "STRING", mode="REQUIRED"),
         bigquery.SchemaField("unit", "STRING", mode="REQUIRED"),
         bigquery.SchemaField("is_int", "BOOL", mode="REQUIRED"),
         bigquery.SchemaField("daily_target", "FLOAT", mode="REQUIRED"),
         bigquery.SchemaField("half_life_days", "FLOAT", mode="REQUIRED"),
     ]
-    create_table_if_not_exists(WORKOUT_TYPES_TABLE_ID, schema_workout_types)
 
-    # Ensure ledger Table Exists
+    # Ensure ledger Table Exists (the unit is the workout type's)
     schema_ledger = [
-        bigquery.SchemaField("workout_type", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("workout_type_id", "INT64", mode="REQUIRED"),
         bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
         bigquery.SchemaField("amount", "FLOAT", mode="REQUIRED"),
-        bigquery.SchemaField("unit", "STRING", mode="REQUIRED"),
     ]
-    create_table_if_not_exists(LEDGER_TABLE_ID, schema_ledger)
+
+    # Ensure daily_totals Table Exists (one row per workout type and date)
+    schema_daily_totals = [
+        bigquery.SchemaField("workout_type_id", "INT64", mode="REQUIRED"),
+        bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
+        bigquery.SchemaField("amount", "FLOAT", mode="REQUIRED"),
+    ]
+
+    # Ensure score_history Table Exists (one row per workout type and logged-through day)
+    schema_score_history = [
+        bigquery.SchemaField("workout_type_id", "INT64", mode="REQUIRED"),
+        bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
+        bigquery.SchemaField("ewa", "FLOAT", mode="REQUIRED"),
+        bigquery.SchemaField("score", "FLOAT", mode="REQUIRED"),
+        bigquery.SchemaField("grade", "STRING", mode="REQUIRED"),
+    ]
+
+    # The table checks are independent metadata calls, so issue them concurrently
+    table_specs = [
+        (WORKOUT_TYPES_TABLE_ID, schema_workout_types, None, None),
+        (LEDGER_TABLE_ID, schema_ledger, LEDGER_PARTITIONING, LEDGER_CLUSTERING_FIELDS),
+        (DAILY_TOTALS_TABLE_ID, schema_daily_totals, LEDGER_PARTITIONING, LEDGER_CLUSTERING_FIELDS),
+        (SCORE_HISTORY_TABLE_ID, schema_score_history, LEDGER_PARTITIONING, LEDGER_CLUSTERING_FIELDS),
+    ]
+    with ThreadPoolExecutor(max_workers=len(table_specs)) as pool:
+        created = dict(zip(
+            [spec[0] for spec in table_specs],
+            pool.map(lambda spec: create_table_if_not_exists(*spec), table_specs),
+        ))
+    complete = True
+    if not all(created.values()):
+        complete = migrate_to_workout_type_ids()
+    if created[DAILY_TOTALS_TABLE_ID]:
+        refresh_daily_totals()
+    if created[SCORE_HISTORY_TABLE_ID]:
+        refresh_score_history()
+    return complete
+
+
+def bootstrap_schema() -> dict:
+    """
+    Makes sure the dataset and tables exist, at most once per process and
+    once per deployment: the dataset carries a schema-version label, and the
+    table checks only run when it differs from SCHEMA_VERSION. Safe to call on
+    every Streamlit rerun. The label is only set once the tables are fully
+    migrated; until then (a deferred migration step, see migrate_to_workout_type_ids)
+    the app runs and the migration is retried every MIGRATION_RETRY_SECONDS.
+    Returns the bootstrap status (see bootstrap_status).
+    """
+    with _bootstrap_lock:
+        retry_due = (
+            _bootstrap_state["migration_pending"]
+            and time.time() - (_bootstrap_state["checked_at"] or 0) >= MIGRATION_RETRY_SECONDS
+        )
+        if _bootstrap_state["ready"] and not retry_due:
+            return dict(_bootstrap_state)
+        started = time.monotonic()
+        try:
+            client = get_bq_client()
+            try:
+                dataset = client.get_dataset(f"{PROJECT_ID}.{DATASET_ID}")
+                deployed_version = (dataset.labels or {}).get(SCHEMA_VERSION_LABEL)
+            except NotFound:
+                deployed_version = None
+
+            complete = True
+            if deployed_version != SCHEMA_VERSION:
+                complete = ensure_dataset_and_tables()
+                if complete:
+                    dataset = client.get_dataset(f"{PROJECT_ID}.{DATASET_ID}")
+                    dataset.labels = {**(dataset.labels or {}), SCHEMA_VERSION_LABEL: SCHEMA_VERSION}
+                    client.update_dataset(dataset, ["labels"])
+                    logger.info(f"Schema bootstrapped to version {SCHEMA_VERSION} (was {deployed_version}).")
+                else:
+                    logger.warning(
+                        f"Schema migration to version {SCHEMA_VERSION} is not complete yet; "
+                        f"retrying in {MIGRATION_RETRY_SECONDS}s."
+                    )
+            else:
+                logger.info(f"Schema already at version {SCHEMA_VERSION}.")
+
+            _bootstrap_state.update(
+                ready=True,
+                schema_version=SCHEMA_VERSION if complete else deployed_version,
+                migration_pending=not complete,
+                error=None,
+            )
+        except Exception as e:
+            _bootstrap_state.update(ready=False, error=repr(e))
+            logger.exception("Schema bootstrap failed.")
+            raise
+        finally:
+            _bootstrap_state.update(
+                checked_at=time.time(), duration_seconds=round(time.monotonic() - started, 3)
+            )
+        return dict(_bootstrap_state)
+
+
+def bootstrap_status() -> dict:
+    """
+    Health/readiness hook: the result of the last bootstrap_schema() in this
+    process, as {ready, schema_version, migration_pending, error, checked_at,
+    duration_seconds} (migration_pending: ready, but a migration step was deferred).
+    """
+    with _bootstrap_lock:
+        return dict(_bootstrap_state)
 
 
-def create_table_if_not_exists(table_id: str, schema: list) -> None:
+def create_table_if_not_exists(
+    table_id: str,
+    schema: list,
+    partitioning: Optional[bigquery.TimePartitioning] = None,
+    clustering_fields: Optional[list] = None,
+) -> bool:
     """
-    Checks if a table exists; if not, creates it with the given schema.
+    Checks if a table exists; if not, creates it with the given schema
+    (and optional time partitioning / clustering).
+    Returns True if the table was created.
     """
     client = get_bq_client()
     try:
         client.get_table(table_id)
         logger.info(f"Table '{table_id}' already exists.")
+        return False
     except NotFound:
         table = bigquery.Table(table_id, schema=schema)
+        table.time_partitioning = partitioning
+        table.clustering_fields = clustering_fields
         client.create_table(table)
         logger.info(f"Created table '{table_id}'.")
+        return True
+
+
+def migrate_to_partitioned_tables() -> list:
+    """
+    One-shot migration of an existing unpartitioned ledger (and daily_totals)
+    into the partitioned + clustered layout. For each table that is not yet
+    partitioned: snapshot it to '<table>_unpartitioned_backup', build
+    '<table>_partitioned' from the snapshot with partitioning and clustering,
+    and only then swap it in (drop the table, copy the new one to its name).
+    The source is never dropped before its replacement is built, and a run
+    that failed during the swap is finished by the next one.
+    Tables created before workout_type_id are clustered by workout_type;
+    migrate_to_workout_type_ids() re-clusters them by id.
+    BigQuery cannot change a table's partitioning in place, so run this while
+    nobody is logging workouts. The backups are kept; delete them once verified.
+    Returns the IDs of the migrated tables.
+    """
+    client = get_bq_client()
+    partition_sql = f"DATE_TRUNC(date, {LEDGER_PARTITIONING.type_})"
+    migrated = []
+    for table_id in (LEDGER_TABLE_ID, DAILY_TOTALS_TABLE_ID):
+        backup_id = f"{table_id}_unpartitioned_backup"
+        partitioned_id = f"{table_id}_partitioned"
+        try:
+            table = client.get_table(table_id)
+        except NotFound:
+            if _table_exists(client, partitioned_id):
+                # an earlier run dropped the table but failed to copy its replacement
+                _swap_in_partitioned_table(client, partitioned_id, table_id)
+                migrated.append(table_id)
+            else:
+                logger.info(f"Table '{table_id}' does not exist; nothing to migrate.")
+            continue
+        if table.time_partitioning is not None:
+            logger.info(f"Table '{table_id}' is already partitioned.")
+            continue
+
+        columns = {field.name for field in table.schema}
+        clustering_fields = [name for name in LEDGER_CLUSTERING_FIELDS if name in columns]
+        if not clustering_fields:
+            clustering_fields = [name for name in LEGACY_TYPE_COLUMNS[:1] if name in columns]
+        cluster_sql = f"CLUSTER BY {', '.join(clustering_fields)}" if clustering_fields else ""
+        for query in (
+            f"CREATE OR REPLACE TABLE `{backup_id}` AS SELECT * FROM `{table_id}`",
+            f"""
+                CREATE OR REPLACE TABLE `{partitioned_id}`
+                PARTITION BY {partition_sql}
+                {cluster_sql}
+                AS SELECT * FROM `{backup_id}`
+            """,
+        ):
+            with instrumented("migrate_to_partitioned_tables") as measurement:
+                job = client.query(query)
+                job.result()
+                measurement.record_job(job)
+        _swap_in_partitioned_table(client, partitioned_id, table_id)
+        migrated.append(table_id)
+        logger.info(f"Migrated '{table_id}' to a partitioned table (backup in '{backup_id}').")
+    return migrated
+
+
+def _table_exists(client: bigquery.Client, table_id: str) -> bool:
+    try:
+        client.get_table(table_id)
+    except NotFound:
+        return False
+    return True
+
+
+def _swap_in_partitioned_table(client: bigquery.Client, partitioned_id: str, table_id: str) -> None:
+    """
+    Replaces table_id with partitioned_id. A copy keeps the partitioning and
+    clustering; partitioned_id is dropped only once the copy succeeded.
+    """
+    client.delete_table(table_id, not_found_ok=True)
+    client.copy_table(partitioned_id, table_id).result()
+    client.delete_table(partitioned_id)
+    _ledger_cache.invalidate()
+
+
+def migrate_to_workout_type_ids() -> bool:
+    """
+    Online migration of tables created before workout_type_id. Everything is
+    done in place (schema updates and DML, no table copies), so the app keeps
+    reading and writing while it runs:
+    1. adds a NULLABLE workout_type_id column to each table that lacks it
+       (BigQuery cannot add REQUIRED columns), relaxes the ledger-shaped tables'
+       LEGACY_TYPE_COLUMNS to NULLABLE and re-clusters them by workout_type_id;
+    2. gives workout types without an id FARM_FINGERPRINT(workout_type), so
+       reruns and duplicate rows of one name agree;
+    3. backfills the ledger's ids by name (logs of types deleted before the
+       migration keep a NULL id; they were never scored and stay out of reads);
+    4. rebuilds daily_totals and score_history by id and drops their name-keyed rows.
+    Steps 2-4 are gated on the data: they run only while rows they would fix
+    are left (see _rows_missing_type_ids), so a run that stopped part-way
+    resumes where it left off and a finished one costs one COUNTIF query.
+    Step 3 cannot touch rows still in the streaming buffer (recent streaming
+    inserts, e.g. from processes still on the old version); it is then
+    deferred and the migration reports itself incomplete, so bootstrap_schema
+    retries it (see MIGRATION_RETRY_SECONDS) before recording SCHEMA_VERSION.
+    A backfill bumps the ledger generation, so ledger mirrors resync in full
+    and pick up the rows it made visible.
+    Processes still on the old version keep writing rows without an id until
+    the deploy finishes; run repair_workout_type_ids() once it has.
+    Returns whether the migration is complete.
+    """
+    client = get_bq_client()
+    nullable = _add_workout_type_id_columns(client)
+    if not nullable:
+        logger.info("Tables were created with workout_type_id; nothing to migrate.")
+        return True
+    missing = _rows_missing_type_ids(client, nullable)
+
+    if missing.get(WORKOUT_TYPES_TABLE_ID):
+        _run_migration_dml(client, f"""
+            UPDATE `{WORKOUT_TYPES_TABLE_ID}`
+            SET workout_type_id = FARM_FINGERPRINT(workout_type)
+            WHERE workout_type_id IS NULL
+        """)
+        _workout_types_cache.invalidate()
+    backfilled = 0
+    if missing.get(LEDGER_TABLE_ID):
+        backfilled = _backfill_ledger_type_ids(client)
+
+    if backfilled or missing.get(DAILY_TOTALS_TABLE_ID) or missing.get(SCORE_HISTORY_TABLE_ID):
+        # id-keyed rows first, so readers never see the derived tables empty
+        refresh_daily_totals()
+        refresh_score_history()  # also deletes its rows without an id (not matched by source)
+        if DAILY_TOTALS_TABLE_ID in nullable:
+            _run_migration_dml(client, f"DELETE FROM `{DAILY_TOTALS_TABLE_ID}` WHERE workout_type_id IS NULL")
+
+    complete = backfilled is not None
+    logger.info(f"Migration to workout_type_id {'complete' if complete else 'deferred'} (rows missing ids: {missing}).")
+    return complete
+
+
+def _add_workout_type_id_columns(client: bigquery.Client) -> list:
+    """
+    Step 1 of migrate_to_workout_type_ids. Returns the IDs of the tables whose
+    workout_type_id may be NULL (added by this migration, now or in an earlier run).
+    """
+    nullable = []
+    for table_id in (WORKOUT_TYPES_TABLE_ID, LEDGER_TABLE_ID, DAILY_TOTALS_TABLE_ID, SCORE_HISTORY_TABLE_ID):
+        table = client.get_table(table_id)
+        modes = {field.name: field.mode for field in table.schema}
+        if "workout_type_id" in modes:
+            if modes["workout_type_id"] != "REQUIRED":
+                nullable.append(table_id)
+            continue
+        fields = ["schema"]
+        schema = list(table.schema)
+        if table_id != WORKOUT_TYPES_TABLE_ID:
+            schema = [
+                bigquery.SchemaField(field.name, field.field_type, mode="NULLABLE")
+                if field.name in LEGACY_TYPE_COLUMNS else field
+                for field in schema
+            ]
+            if table.clustering_fields:
+                table.clustering_fields = LEDGER_CLUSTERING_FIELDS
+                fields.append("clustering_fields")
+        table.schema = schema + [bigquery.SchemaField("workout_type_id", "INT64", mode="NULLABLE")]
+        client.update_table(table, fields)
+        nullable.append(table_id)
+        logger.info(f"Added workout_type_id to '{table_id}'.")
+    return nullable
+
+
+def _rows_missing_type_ids(client: bigquery.Client, table_ids: Sequence[str]) -> dict:
+    """
+    {table_id: rows the migration still has to give an id} for tables whose id
+    may be NULL, in one query. Ledger rows of names no workout type has (logs
+    of types deleted before the migration) are not counted: they keep NULL.
+    """
+    counts = []
+    for table_id in table_ids:
+        condition = "workout_type_id IS NULL"
+        if table_id == LEDGER_TABLE_ID:
+            condition += f" AND workout_type IN (SELECT workout_type FROM `{WORKOUT_TYPES_TABLE_ID}`)"
+        counts.append(f"(SELECT COUNTIF({condition}) FROM `{table_id}`) AS {table_id.rsplit('.', 1)[-1]}")
+    with instrumented("migrate_to_workout_type_ids") as measurement:
+        job = client.query("SELECT " + ", ".join(counts))
+        [row] = list(job.result())
+        measurement.record_job(job, rows=1)
+    return {table_id: row[table_id.rsplit(".", 1)[-1]] for table_id in table_ids}
+
+
+def repair_workout_type_ids() -> int:
+    """
+    Gives ledger rows written without a workout_type_id (by processes still on
+    the version before it during a rolling deploy) the id of their type by name,
+    then refreshes daily_totals and score_history. Run it once after a deploy
+    that migrated the tables, when the last old-version process has stopped:
+        python -c "from dao.workout_dao import repair_workout_type_ids; repair_workout_type_ids()"
+    Cheap to rerun. Returns how many rows it repaired; raises if some of them are
+    still in the streaming buffer (run it again later).
+    """
+    client = get_bq_client()
+    modes = {field.name: field.mode for field in client.get_table(LEDGER_TABLE_ID).schema}
+    if modes.get("workout_type_id") == "REQUIRED":  # created with ids: nothing could lack one
+        return 0
+    if not _rows_missing_type_ids(client, [LEDGER_TABLE_ID])[LEDGER_TABLE_ID]:
+        logger.info("No ledger rows without a workout_type_id to repair.")
+        return 0
+    repaired = _backfill_ledger_type_ids(client)
+    if repaired is None:
+        raise RuntimeError("Ledger rows without a workout_type_id are still in the streaming buffer; retry later.")
+    if repaired:
+        refresh_daily_totals()
+        refresh_score_history()
+    logger.info(f"Repaired workout_type_id of {repaired} ledger rows.")
+    return repaired
+
+
+def _backfill_ledger_type_ids(client: bigquery.Client) -> Optional[int]:
+    """
+    Gives ledger rows without a workout_type_id the id of their type by name,
+    and bumps the ledger generation if it changed any. Returns how many rows it
+    changed, or None if it has to wait for rows still in the streaming buffer
+    (the UPDATE then changes nothing).
+    """
+    try:
+        backfilled = _run_migration_dml(client, f"""
+            UPDATE `{LEDGER_TABLE_ID}` l
+            SET workout_type_id = w.workout_type_id
+            FROM (
+                SELECT workout_type, ANY_VALUE(workout_type_id) AS workout_type_id
+                FROM `{WORKOUT_TYPES_TABLE_ID}`
+                GROUP BY workout_type
+            ) w
+            WHERE l.workout_type_id IS NULL AND l.workout_type = w.workout_type
+        """)
+    except BadRequest as e:
+        if STREAMING_BUFFER_ERROR not in str(e):
+            raise
+        logger.warning(f"Deferred the ledger's workout_type_id backfill: rows are still in the streaming buffer ({e}).")
+        return None
+    if backfilled:
+        # rows dated before a mirror's watermark became visible: mirrors must resync in full
+        dataset = client.get_dataset(f"{PROJECT_ID}.{DATASET_ID}")
+        labels = dataset.labels or {}
+        dataset.labels = {**labels, LEDGER_GENERATION_LABEL: str(int(labels.get(LEDGER_GENERATION_LABEL, "0")) + 1)}
+        client.update_dataset(dataset, ["labels"])
+        _ledger_cache.invalidate()
+    return backfilled
+
+
+def _ledger_generation() -> str:
+    """The ledger generation (see LEDGER_GENERATION_LABEL) ledger mirrors sync under."""
+    dataset = get_bq_client().get_dataset(f"{PROJECT_ID}.{DATASET_ID}")
+    return str((dataset.labels or {}).get(LEDGER_GENERATION_LABEL, "0"))
+
+
+def _run_migration_dml(client: bigquery.Client, statement: str) -> int:
+    """Runs one DML statement of a migration; returns how many rows it changed."""
+    with instrumented("migrate_to_workout_type_ids") as measurement:
+        job = client.query(statement)
+        job.result()
+        measurement.record_job(job, rows=job.num_dml_affected_rows)
+    return job.num_dml_affected_rows or 0
 
 
 def create_workout_type(
@@ -103,6 +617,7 @@ def create_workout_type(
     client = get_bq_client()
     rows_to_insert = [
         {
+            "workout_type_id": _new_workout_type_id(),
             "workout_type": workout_type,
             "unit": unit,
             "is_int": is_int,
@@ -110,7 +625,10 @@ def create_workout_type(
             "half_life_days": half_life_days
         }
     ]
-    errors = client.insert_rows_json(WORKOUT_TYPES_TABLE_ID, rows_to_insert)
+    with instrumented("create_workout_type") as measurement:
+        errors = client.insert_rows_json(WORKOUT_TYPES_TABLE_ID, rows_to_insert)
+        measurement.rows = len(rows_to_insert) - len(errors)
+    _workout_types_cache.invalidate()
     if errors:
         raise Exception(f"Error inserting workout type: {errors}")
     logger.info(
@@ -120,14 +638,76 @@ def create_workout_type(
 
 
 
+def create_workout_types(workout_types: Sequence[dict]) -> list:
+    """
+    Bulk-creates workout types with a single streaming insert; each gets a new workout_type_id.
+    workout_types: dicts with [workout_type, unit, is_int, daily_target, half_life_days].
+    Returns per-row errors as [{"index": i, "errors": [...]}] (empty if all were created).
+    """
+    if not workout_types:
+        return []
+    client = get_bq_client()
+    rows_to_insert = [
+        {
+            "workout_type_id": _new_workout_type_id(),
+            "workout_type": wt["workout_type"],
+            "unit": wt["unit"],
+            "is_int": bool(wt["is_int"]),
+            "daily_target": float(wt["daily_target"]),
+            "half_life_days": float(wt["half_life_days"]),
+        }
+        for wt in workout_types
+    ]
+    with instrumented("create_workout_types") as measurement:
+        errors = client.insert_rows_json(WORKOUT_TYPES_TABLE_ID, rows_to_insert)
+        measurement.rows = len(rows_to_insert) - len(errors)
+    _workout_types_cache.invalidate()
+    logger.info(f"Created {len(rows_to_insert) - len(errors)} of {len(rows_to_insert)} workout types.")
+    return errors
+
+
+
+def _new_workout_type_id() -> int:
+    """
+    A new workout_type_id: random 63-bit, so concurrent creators need no
+    sequence or coordination (BigQuery has none) and collisions are negligible.
+    """
+    return secrets.randbits(63)
+
+
 def read_workout_types() -> list:
     """
     Returns a list of dicts with
-    [workout_type, unit, is_int, daily_target, half_life_days].
+    [workout_type_id, workout_type, unit, is_int, daily_target, half_life_days].
+    Served from a process-wide cache (see WORKOUT_TYPES_CACHE_TTL_SECONDS),
+    which the create/update/delete functions invalidate.
+    """
+    cached = _workout_types_cache.get(
+        _query_workout_types, lambda: table_fingerprint(WORKOUT_TYPES_TABLE_ID)
+    )
+    return [dict(wt) for wt in cached]
+
+
+def table_fingerprint(table_id: str) -> tuple:
     """
+    Cheap change marker for a table, from its metadata only (no query job):
+    last modified time, row count and streaming buffer state.
+    """
+    table = get_bq_client().get_table(table_id)
+    streaming_buffer = table.streaming_buffer
+    return (
+        table.modified,
+        table.num_rows,
+        streaming_buffer.estimated_rows if streaming_buffer else None,
+        streaming_buffer.oldest_entry_time if streaming_buffer else None,
+    )
+
+
+def _query_workout_types() -> list:
     client = get_bq_client()
     query = f"""
         SELECT
+            workout_type_id,
             workout_type,
             unit,
             is_int,
@@ -136,8 +716,10 @@ def read_workout_types() -> list:
         FROM `{WORKOUT_TYPES_TABLE_ID}`
         ORDER BY workout_type
     """
-    job = client.query(query)
-    results = [dict(row) for row in job.result()]
+    with instrumented("read_workout_types") as measurement:
+        job = client.query(query)
+        results = [dict(row) for row in job.result()]
+        measurement.record_job(job, rows=len(results))
     logger.info(f"Read {len(results)} workout types.")
     return reorder_workout_types(results)
 
@@ -151,6 +733,12 @@ def update_workout_type(
     new_daily_target: float,
     new_half_life_days: float
 ) -> None:
+    """
+    Updates one workout type in place. Ledger rows refer to it by
+    workout_type_id, so a rename (or a new unit) only touches workout_types;
+    score_history is recomputed only if the target or half-life changed.
+    """
+    previous = [wt for wt in read_workout_types() if wt["workout_type"] == old_workout_type]
     client = get_bq_client()
     query = f"""
         UPDATE `{WORKOUT_TYPES_TABLE_ID}`
@@ -171,7 +759,18 @@ def update_workout_type(
             bigquery.ScalarQueryParameter("old_workout_type", "STRING", old_workout_type),
         ]
     )
-    client.query(query, job_config=job_config).result()
+    with instrumented("update_workout_type") as measurement:
+        job = client.query(query, job_config=job_config)
+        job.result()
+        measurement.record_job(job, rows=job.num_dml_affected_rows)
+    _workout_types_cache.invalidate()
+    _ledger_cache.invalidate()  # cached reads carry the old name and unit
+    rescored = not previous or any(
+        wt["daily_target"] != new_daily_target or wt["half_life_days"] != new_half_life_days for wt in previous
+    )
+    if rescored:
+        # every stored day of the type is stale
+        refresh_score_history(types=[new_workout_type])
     logger.info(
         f"Updated workout type '{old_workout_type}' to '{new_workout_type}': "
         f"unit={new_unit}, is_int={new_is_int}, "
@@ -180,6 +779,11 @@ def update_workout_type(
 
 
 def delete_workout_type(workout_type: str) -> None:
+    """
+    Deletes a workout type and its stored scores. Its ledger rows are kept
+    but no longer read (a type created later under the same name gets a new id).
+    """
+    type_ids = _type_ids([workout_type])
     client = get_bq_client()
     query = f"""
         DELETE FROM `{WORKOUT_TYPES_TABLE_ID}`
@@ -188,60 +792,902 @@ def delete_workout_type(workout_type: str) -> None:
     job_config = bigquery.QueryJobConfig(
         query_parameters=[bigquery.ScalarQueryParameter("workout_type", "STRING", workout_type)]
     )
-    client.query(query, job_config=job_config).result()
+    with instrumented("delete_workout_type") as measurement:
+        job = client.query(query, job_config=job_config)
+        job.result()
+        measurement.record_job(job, rows=job.num_dml_affected_rows)
+    _workout_types_cache.invalidate()
+    _ledger_cache.invalidate()
+    # the ids no longer have a target or half-life, so the refresh drops their rows
+    _refresh_score_history(type_ids)
     logger.info(f"Deleted workout type '{workout_type}'.")
 
 def log_workout(workout_type: str, date_value: date, amount: float, unit: str) -> None:
     """
     Logs a new workout in the ledger table.
+    In write-behind mode the row is journaled locally and written by the flush worker
+    (a row of an unknown workout type raises ValueError instead of being journaled).
     """
-    client = get_bq_client()
-    rows_to_insert = [
-        {
-            "workout_type": workout_type,
-            "date": str(date_value),  # BigQuery DATE in YYYY-MM-DD format
-            "amount": amount,
-            "unit": unit
-        }
-    ]
-    errors = client.insert_rows_json(LEDGER_TABLE_ID, rows_to_insert)
+    row = {
+        "workout_type": workout_type,
+        "date": date_value,
+        "amount": amount,
+        "unit": unit
+    }
+    journal = get_write_journal()
+    if journal is not None:
+        journal.append(ledger_row(row), known_types={wt["workout_type"] for wt in read_workout_types()})
+        logger.info(f"Journaled workout: {workout_type}, {amount} {unit} on {date_value}.")
+        return
+    errors = log_workouts([row])
     if errors:
         raise Exception(f"Error inserting ledger entry: {errors}")
     logger.info(f"Logged workout: {workout_type}, {amount} {unit} on {date_value}.")
 
 
-def read_workouts(filter_type: str = None) -> pd.DataFrame:
+def log_workouts(rows: Sequence[dict], row_ids: Optional[Sequence[str]] = None) -> list:
     """
-    Reads workouts from the ledger, optionally filtered by workout_type.
-    Returns a pd.DataFrame, ordered by most recent date first.
+    Bulk-logs workouts in the ledger table.
+    rows: dicts with [workout_type, date, amount, unit]; date may be a date or 'YYYY-MM-DD'.
+    The ledger stores the type's workout_type_id instead of its name and unit;
+    rows of unknown workout types are rejected. daily_totals and score_history
+    are refreshed in the background (see get_refresh_queue): a failed refresh is
+    retried, and never fails the write.
+    row_ids: optional insertIds (one per row) so BigQuery can drop retried duplicates
+    of streaming inserts.
+
+    Up to LOAD_JOB_THRESHOLD rows are sent as streaming inserts in batches of
+    STREAMING_BATCH_SIZE; larger backfills go through a single load job from an
+    in-memory newline-delimited JSON buffer (free, and no streaming buffer).
+    Rows that fail validation are skipped, the rest are written.
+
+    Returns per-row errors as [{"index": i, "errors": [...]}], i indexing into rows
+    (the same shape insert_rows_json reports). An empty list means every row was written.
+    """
+    row_errors = []
+    valid_rows = []
+    valid_indexes = []
+    ids_by_name = _workout_type_ids_by_name()
+    reloaded = False
+    for index, row in enumerate(rows):
+        try:
+            valid_row = ledger_row(row)
+            if valid_row["workout_type"] not in ids_by_name and not reloaded:
+                # maybe created by another process since workout_types was cached
+                _workout_types_cache.invalidate()
+                ids_by_name = _workout_type_ids_by_name()
+                reloaded = True
+            if valid_row["workout_type"] not in ids_by_name:
+                raise ValueError(f"unknown workout type {valid_row['workout_type']!r}")
+            valid_rows.append(valid_row)
+            valid_indexes.append(index)
+        except (KeyError, TypeError, ValueError) as e:
+            row_errors.append({"index": index, "errors": [{"reason": "invalid", "message": str(e)}]})
+
+    if valid_rows:
+        # Marked before the insert too, so readers re-sum these days from the ledger
+        # from the moment the rows may land (e.g. once the write journal stops
+        # overlaying them); a range marked for rows that then fail is only re-summed.
+        valid_dates = [date.fromisoformat(row["date"]) for row in valid_rows]
+        valid_ids = sorted({ids_by_name[row["workout_type"]] for row in valid_rows})
+        get_refresh_queue().mark(valid_ids, min(valid_dates), max(valid_dates))
+        client = get_bq_client()
+        table_rows = [
+            {"workout_type_id": ids_by_name[r["workout_type"]], "date": r["date"], "amount": r["amount"]}
+            for r in valid_rows
+        ]
+        if len(table_rows) > LOAD_JOB_THRESHOLD:
+            buffer = io.BytesIO("\n".join(json.dumps(r) for r in table_rows).encode("utf-8"))
+            job_config = bigquery.LoadJobConfig(
+                source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+                write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+            )
+            with instrumented("log_workouts") as measurement:
+                job = client.load_table_from_file(buffer, LEDGER_TABLE_ID, job_config=job_config)
+                job.result()  # raises if the load job fails (it is all-or-nothing)
+                measurement.record_job(job, rows=len(table_rows))
+        else:
+            valid_row_ids = [row_ids[index] for index in valid_indexes] if row_ids is not None else None
+            for offset in range(0, len(table_rows), STREAMING_BATCH_SIZE):
+                batch = table_rows[offset:offset + STREAMING_BATCH_SIZE]
+                batch_ids = valid_row_ids[offset:offset + STREAMING_BATCH_SIZE] if valid_row_ids is not None else None
+                with instrumented("log_workouts") as measurement:
+                    errors = client.insert_rows_json(LEDGER_TABLE_ID, batch, row_ids=batch_ids)
+                    measurement.rows = len(batch) - len(errors)
+                for error in errors:
+                    if isinstance(error, dict) and "index" in error:
+                        row_errors.append({
+                            "index": valid_indexes[offset + error["index"]],
+                            "errors": error["errors"],
+                        })
+                    else:
+                        # Not attributable to a single row: count the whole batch as failed
+                        row_errors.extend(
+                            {"index": index, "errors": [error]}
+                            for index in valid_indexes[offset:offset + len(batch)]
+                        )
+
+    failed = {error["index"] for error in row_errors}
+    written = [row for row, index in zip(valid_rows, valid_indexes) if index not in failed]
+    if written:
+        _ledger_cache.invalidate()
+        dates = [date.fromisoformat(row["date"]) for row in written]
+        mirror = get_ledger_mirror()
+        if mirror is not None:
+            mirror.note_write(min(dates))
+        # again: a refresh that ran while the insert was in flight may have missed these rows
+        written_ids = sorted({ids_by_name[row["workout_type"]] for row in written})
+        get_refresh_queue().mark(written_ids, min(dates), max(dates))
+    logger.info(f"Logged {len(written)} of {len(rows)} workouts ({len(row_errors)} rows with errors).")
+    return sorted(row_errors, key=lambda error: error["index"])
+
+
+def _workout_type_ids_by_name() -> dict:
+    """workout_type -> workout_type_id for the current workout types (from the cache)."""
+    return {wt["workout_type"]: wt["workout_type_id"] for wt in read_workout_types()}
+
+
+def _type_ids(types: Optional[Sequence[str]]) -> Optional[list]:
+    """
+    The workout_type_ids of some workout type names, for filtering the id-keyed
+    tables (unknown names have none). None stays None (no type filter).
+    """
+    if types is None:
+        return None
+    wanted = set(types)
+    return sorted({wt["workout_type_id"] for wt in read_workout_types() if wt["workout_type"] in wanted})
+
+
+def refresh_daily_totals(
+    types: Optional[Sequence[str]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> None:
+    """
+    Recomputes daily_totals from the ledger for the given types/date range
+    (everything if no arguments) with a MERGE. Idempotent, so it can be re-run
+    after failures or periodically to pick up rows written by other clients
+    (or whose background refresh was lost with its process).
+    """
+    _refresh_daily_totals(_type_ids(types), start, end)
+
+
+def _refresh_daily_totals(
+    type_ids: Optional[Sequence[int]],
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> None:
+    """refresh_daily_totals for some workout_type_ids (all if None)."""
+    client = get_bq_client()
+    query, query_parameters = _daily_totals_merge(type_ids, start, end)
+    with instrumented("refresh_daily_totals") as measurement:
+        job = client.query(query, job_config=bigquery.QueryJobConfig(query_parameters=query_parameters))
+        job.result()
+        measurement.record_job(job, rows=job.num_dml_affected_rows)
+    _ledger_cache.invalidate()
+    logger.info(f"Refreshed daily totals ({job.num_dml_affected_rows} rows affected).")
+
+
+def _daily_totals_merge(
+    type_ids: Optional[Sequence[int]],
+    start: Optional[date],
+    end: Optional[date],
+) -> tuple:
+    """The MERGE statement of _refresh_daily_totals and its query parameters."""
+    conditions, query_parameters = _ledger_filters(type_ids, start, end)
+    # rows of tables migrated from names may lack an id (logs of types deleted before the migration)
+    source = f"""
+        SELECT workout_type_id, date, SUM(amount) AS amount
+        FROM `{LEDGER_TABLE_ID}`
+        WHERE {" AND ".join(["workout_type_id IS NOT NULL"] + conditions)}
+        GROUP BY workout_type_id, date
+    """
+    # Restrict the target side too, so only the affected partitions/clusters are scanned
+    target_conditions = "".join(f" AND T.{c}" for c in conditions)
+    query = f"""
+        MERGE `{DAILY_TOTALS_TABLE_ID}` T
+        USING ({source}) S
+        ON T.workout_type_id = S.workout_type_id AND T.date = S.date{target_conditions}
+        WHEN MATCHED THEN
+            UPDATE SET amount = S.amount
+        WHEN NOT MATCHED THEN
+            INSERT (workout_type_id, date, amount) VALUES (S.workout_type_id, S.date, S.amount)
+    """
+    return query, query_parameters
+
+
+def _refresh_derived_tables(ranges: dict) -> None:
+    """
+    The refresh queue's refresh: brings daily_totals, then score_history, up to
+    date for {workout_type_id: (start, end)} with one MERGE each, in a single
+    transaction: score_history is never left behind an updated daily_totals,
+    so _stale_derived_ranges (which compares daily_totals with the ledger)
+    finds every range a lost refresh left stale.
+    """
+    type_ids = sorted(ranges)
+    start = min(date_range[0] for date_range in ranges.values())
+    end = max(date_range[1] for date_range in ranges.values())
+    totals_merge, query_parameters = _daily_totals_merge(type_ids, start, end)
+    # a day's score depends on the days before it, so everything from the earliest write on
+    history_merge, _ = _score_history_merge(type_ids, start)  # a subset of the same parameters
+    script = f"""
+        BEGIN TRANSACTION;
+        {totals_merge};
+        {history_merge};
+        COMMIT TRANSACTION;
+    """
+    client = get_bq_client()
+    with instrumented("refresh_derived_tables") as measurement:
+        job = client.query(script, job_config=bigquery.QueryJobConfig(query_parameters=query_parameters))
+        job.result()
+        measurement.record_job(job, rows=0)
+    _ledger_cache.invalidate()
+    logger.info(f"Refreshed daily totals and score history of {len(type_ids)} workout types from {start}.")
+
+
+def _stale_derived_ranges() -> dict:
+    """
+    {workout_type_id: (start, end)} of the days whose daily_totals row is missing
+    or differs from the ledger's sum, e.g. because the process that wrote the
+    logs stopped before its background refresh ran. One scan of the ledger.
+    """
+    client = get_bq_client()
+    query = f"""
+        SELECT l.workout_type_id, MIN(l.date) AS start, MAX(l.date) AS `end`
+        FROM (
+            SELECT workout_type_id, date, SUM(amount) AS amount
+            FROM `{LEDGER_TABLE_ID}`
+            WHERE workout_type_id IS NOT NULL
+            GROUP BY workout_type_id, date
+        ) l
+        LEFT JOIN `{DAILY_TOTALS_TABLE_ID}` d USING (workout_type_id, date)
+        WHERE d.amount IS NULL OR ABS(d.amount - l.amount) > 1e-9
+        GROUP BY l.workout_type_id
+    """
+    with instrumented("stale_derived_ranges") as measurement:
+        job = client.query(query)
+        ranges = {row["workout_type_id"]: (row["start"], row["end"]) for row in job.result()}
+        measurement.record_job(job, rows=len(ranges))
+    if ranges:
+        logger.warning(f"Found daily totals of {len(ranges)} workout types behind the ledger; refreshing them.")
+    return ranges
+
+
+def stale_score_dates() -> dict:
+    """
+    {workout_type: date} for the types whose daily_totals and score_history rows
+    from that date on may not reflect their logs yet: rows still in the write
+    journal, or written but not refreshed yet (or whose refresh keeps failing).
+    read_daily_totals already includes those logs; read_score_history does not.
+    """
+    stale = {}
+    stale_ids = get_refresh_queue().stale_since()
+    if stale_ids:
+        names = {wt["workout_type_id"]: wt["workout_type"] for wt in read_workout_types()}
+        stale = {names[type_id]: since for type_id, since in stale_ids.items() if type_id in names}
+    pending = _pending_frame(None, None, None)
+    if pending is not None:
+        for workout_type, since in pending.groupby("workout_type")["date"].min().items():
+            stale[workout_type] = min(since, stale.get(workout_type, since))
+    return stale
+
+
+def refresh_score_history(
+    types: Optional[Sequence[str]] = None,
+    start: Optional[date] = None,
+) -> None:
+    """
+    Recomputes score_history (daily EWA, Score (%) and grade per workout type)
+    from daily_totals and the current workout_types with a MERGE, for the given
+    types and the days from start on (everything if no arguments).
+
+    Each type's history runs from its first to its last logged day, scored
+    like score_series (extra credit, half-life weights over the truncated
+    window). Stored rows in the refreshed range that are no longer produced
+    (deleted types) are removed. Idempotent, like refresh_daily_totals.
+    """
+    _refresh_score_history(_type_ids(types), start)
+
+
+def _refresh_score_history(type_ids: Optional[Sequence[int]], start: Optional[date] = None) -> None:
+    """refresh_score_history for some workout_type_ids (all if None)."""
+    client = get_bq_client()
+    query, query_parameters = _score_history_merge(type_ids, start)
+    with instrumented("refresh_score_history") as measurement:
+        job = client.query(query, job_config=bigquery.QueryJobConfig(query_parameters=query_parameters))
+        job.result()
+        measurement.record_job(job, rows=job.num_dml_affected_rows)
+    logger.info(f"Refreshed score history ({job.num_dml_affected_rows} rows affected).")
+
+
+def _score_history_merge(type_ids: Optional[Sequence[int]], start: Optional[date]) -> tuple:
+    """The MERGE statement of _refresh_score_history and its query parameters."""
+    conditions, query_parameters = _ledger_filters(type_ids, start, None)
+    type_filter = " WHERE workout_type_id IN UNNEST(@type_ids)" if type_ids is not None else ""
+    first_day = "GREATEST(b.first_day, @start)" if start is not None else "b.first_day"
+    grade = " ".join(f"WHEN score >= {minimum} THEN '{letter}'" for letter, minimum in GRADE_THRESHOLDS)
+    source = f"""
+        WITH params AS (
+            SELECT
+                workout_type_id,
+                daily_target,
+                half_life_days,
+                CAST(CEIL(2 * half_life_days) AS INT64) AS window_days,
+                -- sum of 2^(-k / half_life) for k = 0..window_days (see window_total_weight)
+                (1 - POW(2, -(CEIL(2 * half_life_days) + 1) / half_life_days))
+                    / (1 - POW(2, -1 / half_life_days)) AS total_weight
+            FROM (
+                SELECT workout_type_id, ANY_VALUE(daily_target) AS daily_target, ANY_VALUE(half_life_days) AS half_life_days
+                FROM `{WORKOUT_TYPES_TABLE_ID}`{type_filter}
+                GROUP BY workout_type_id
+            )
+        ),
+        days AS (
+            SELECT p.*, day
+            FROM params p
+            JOIN (
+                SELECT workout_type_id, MIN(date) AS first_day, MAX(date) AS last_day
+                FROM `{DAILY_TOTALS_TABLE_ID}`{type_filter}
+                GROUP BY workout_type_id
+            ) b USING (workout_type_id),
+            UNNEST(GENERATE_DATE_ARRAY({first_day}, b.last_day)) AS day
+        ),
+        ewas AS (
+            SELECT
+                days.workout_type_id,
+                days.day AS date,
+                ANY_VALUE(days.daily_target) AS daily_target,
+                IFNULL(SUM(
+                    IF(days.daily_target <= 0, d.amount,
+                       LEAST(d.amount, days.daily_target) + 0.5 * GREATEST(d.amount - days.daily_target, 0))
+                    * POW(2, -DATE_DIFF(days.day, d.date, DAY) / days.half_life_days)
+                ), 0) / ANY_VALUE(days.total_weight) AS ewa
+            FROM days
+            LEFT JOIN `{DAILY_TOTALS_TABLE_ID}` d
+                ON d.workout_type_id = days.workout_type_id
+                AND d.date BETWEEN DATE_SUB(days.day, INTERVAL days.window_days DAY) AND days.day
+            GROUP BY days.workout_type_id, days.day
+        ),
+        scores AS (
+            SELECT workout_type_id, date, ewa, IF(daily_target > 0, ewa * 100 / daily_target, 0) AS score
+            FROM ewas
+        )
+        SELECT workout_type_id, date, ewa, score, CASE {grade} ELSE '{FAILING_GRADE}' END AS grade
+        FROM scores
+    """
+    target_conditions = "".join(f" AND T.{c}" for c in conditions)
+    query = f"""
+        MERGE `{SCORE_HISTORY_TABLE_ID}` T
+        USING ({source}) S
+        ON T.workout_type_id = S.workout_type_id AND T.date = S.date{target_conditions}
+        WHEN MATCHED THEN
+            UPDATE SET ewa = S.ewa, score = S.score, grade = S.grade
+        WHEN NOT MATCHED THEN
+            INSERT (workout_type_id, date, ewa, score, grade) VALUES (S.workout_type_id, S.date, S.ewa, S.score, S.grade)
+        WHEN NOT MATCHED BY SOURCE{target_conditions} THEN
+            DELETE
+    """
+    return query, query_parameters
+
+
+def read_score_history(
+    types: Optional[Sequence[str]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> pd.DataFrame:
+    """
+    Reads the stored daily scores (see refresh_score_history), optionally
+    restricted to some workout types and/or an inclusive date range.
+    Returns a pd.DataFrame [workout_type, date, ewa, score, grade] with
+    datetime64 dates, ordered by workout_type, then date.
+    Logs still in the write journal or not refreshed yet are not reflected
+    (see stale_score_dates).
     """
     client = get_bq_client()
-    base_query = f"""
+    conditions, query_parameters = _ledger_filters(_type_ids(types), start, end)
+    query = f"""
         SELECT
-            workout_type,
+            w.workout_type,
+            s.date,
+            s.ewa,
+            s.score,
+            s.grade
+        FROM `{SCORE_HISTORY_TABLE_ID}` s
+        JOIN `{WORKOUT_TYPES_TABLE_ID}` w USING (workout_type_id)
+    """
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY workout_type, date"
+
+    with instrumented("read_score_history") as measurement:
+        job = client.query(query, job_config=bigquery.QueryJobConfig(query_parameters=query_parameters))
+        df = job.to_dataframe()
+        measurement.record_job(job, rows=len(df))
+    logger.info(f"Read {len(df)} score history rows.")
+    return score_history_dtypes(df)
+
+
+def write_score_history(history: pd.DataFrame) -> int:
+    """
+    Stores precomputed daily scores [workout_type, date, ewa, score, grade] (e.g.
+    from scoring.batch_scoring) in bulk: one load job into a staging table, then
+    one MERGE replacing the score_history rows of the same (type, date). Rows of
+    unknown workout types are skipped. Returns how many rows were written.
+    """
+    ids_by_name = _workout_type_ids_by_name()
+    known = history[history["workout_type"].isin(list(ids_by_name))]
+    if known.empty:
+        return 0
+    table_rows = [
+        {"workout_type_id": ids_by_name[t], "date": pd.Timestamp(d).date().isoformat(),
+         "ewa": float(e), "score": float(s), "grade": g}
+        for t, d, e, s, g in zip(known["workout_type"], known["date"], known["ewa"], known["score"], known["grade"])
+    ]
+    client = get_bq_client()
+    buffer = io.BytesIO("\n".join(json.dumps(r) for r in table_rows).encode("utf-8"))
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        schema=[
+            bigquery.SchemaField("workout_type_id", "INT64", mode="REQUIRED"),
+            bigquery.SchemaField("date", "DATE", mode="REQUIRED"),
+            bigquery.SchemaField("ewa", "FLOAT", mode="REQUIRED"),
+            bigquery.SchemaField("score", "FLOAT", mode="REQUIRED"),
+            bigquery.SchemaField("grade", "STRING", mode="REQUIRED"),
+        ],
+    )
+    query = f"""
+        MERGE `{SCORE_HISTORY_TABLE_ID}` T
+        USING `{SCORE_HISTORY_STAGING_TABLE_ID}` S
+        ON T.workout_type_id = S.workout_type_id AND T.date = S.date
+        WHEN MATCHED THEN
+            UPDATE SET ewa = S.ewa, score = S.score, grade = S.grade
+        WHEN NOT MATCHED THEN
+            INSERT (workout_type_id, date, ewa, score, grade) VALUES (S.workout_type_id, S.date, S.ewa, S.score, S.grade)
+    """
+    with instrumented("write_score_history") as measurement:
+        job = client.load_table_from_file(buffer, SCORE_HISTORY_STAGING_TABLE_ID, job_config=job_config)
+        job.result()  # raises if the load job fails (it is all-or-nothing)
+        job = client.query(query)
+        job.result()
+        measurement.record_job(job, rows=len(table_rows))
+    client.delete_table(SCORE_HISTORY_STAGING_TABLE_ID, not_found_ok=True)
+    logger.info(f"Wrote {len(table_rows)} score history rows ({len(history) - len(table_rows)} of unknown types skipped).")
+    return len(table_rows)
+
+
+def read_current_scores() -> pd.DataFrame:
+    """
+    Current Scores without touching the ledger: each type's score_history row on
+    its last logged day, which the background refresh keeps current after writes.
+    Types with logs not reflected there yet (see stale_score_dates) are scored
+    from their daily totals instead, so new logs show up right away.
+    Returns a pd.DataFrame [workout_type, ewa, score_pct, grade] for every workout
+    type, in read_workout_types order (ewa 0 and grade F for types without logs).
+    """
+    client = get_bq_client()
+    query = f"""
+        SELECT
+            workout_type_id,
+            ewa,
+            score
+        FROM `{SCORE_HISTORY_TABLE_ID}`
+        WHERE TRUE
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY workout_type_id ORDER BY date DESC) = 1
+    """
+    with instrumented("read_current_scores") as measurement:
+        job = client.query(query)
+        latest = {row["workout_type_id"]: (row["ewa"], row["score"]) for row in job.result()}
+        measurement.record_job(job, rows=len(latest))
+    wtypes = read_workout_types()
+
+    stale_types = set(stale_score_dates())
+    if stale_types:
+        stale_wtypes = [wt for wt in wtypes if wt["workout_type"] in stale_types]
+        rescored = compute_current_scores(read_daily_totals(types=sorted(stale_types)), stale_wtypes)
+        rescored = dict(zip(rescored["workout_type"], zip(rescored["ewa"], rescored["score_pct"])))
+        latest.update((wt["workout_type_id"], rescored[wt["workout_type"]]) for wt in stale_wtypes)
+
+    names = [wt["workout_type"] for wt in wtypes]
+    ewa = [float(latest.get(wt["workout_type_id"], (0.0, 0.0))[0]) for wt in wtypes]
+    score_pct = [float(latest.get(wt["workout_type_id"], (0.0, 0.0))[1]) for wt in wtypes]
+    logger.info(f"Read current scores for {len(names)} workout types.")
+    return pd.DataFrame({
+        "workout_type": names,
+        "ewa": ewa,
+        "score_pct": score_pct,
+        "grade": get_grades(score_pct),
+    })
+
+
+def iter_ledger_batches(
+    types: Optional[Sequence[str]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> Iterator[pa.RecordBatch]:
+    """
+    Streams ledger rows [workout_type, date, amount, unit] as Arrow record
+    batches, optionally restricted to some workout types and/or an inclusive
+    date range. Unlike read_workouts, the result is never materialized, so
+    consumers that aggregate batch by batch (e.g. daily_totals_from_batches)
+    run in memory that does not grow with the ledger. Rows come in no
+    particular order; journaled (write-behind) rows come last.
+    """
+    mirror = get_ledger_mirror()
+    if mirror is not None:
+        yield from _mirror_ledger_batches(mirror, types, start, end)
+    else:
+        wtypes = read_workout_types()
+        for batch in _query_ledger_batches(start, type_ids=_type_ids(types), end=end):
+            yield _named_ledger_batch(batch, wtypes)
+
+    pending = _pending_frame(types, start, end)
+    if pending is not None:
+        yield pa.RecordBatch.from_pandas(pending, schema=LEDGER_ARROW_SCHEMA, preserve_index=False)
+
+
+def _mirror_ledger_batches(
+    mirror: LedgerMirror,
+    types: Optional[Sequence[str]],
+    start: Optional[date],
+    end: Optional[date],
+) -> Iterator[pa.RecordBatch]:
+    """
+    Syncs the ledger mirror (skipping the query while the ledger table is
+    unchanged) and streams its rows as ledger read batches, filtered like the read.
+    """
+    mirror.sync(
+        _query_ledger_batches, fingerprint=lambda: table_fingerprint(LEDGER_TABLE_ID), generation=_ledger_generation
+    )
+    wtypes = read_workout_types()
+    for batch in mirror.iter_batches():
+        yield _filter_ledger_batch(_named_ledger_batch(batch, wtypes), types, start, end)
+
+
+def _query_ledger_batches(
+    since: Optional[date] = None,
+    type_ids: Optional[Sequence[int]] = None,
+    end: Optional[date] = None,
+) -> Iterator[pa.RecordBatch]:
+    """
+    Runs the ledger query in BigQuery and streams its result page by page
+    as [workout_type_id, date, amount] (rows dated on or after 'since'; all
+    rows if None). Also the fetch function the ledger mirror syncs with.
+    """
+    client = get_bq_client()
+    query = f"""
+        SELECT
+            workout_type_id,
             date,
-            amount,
-            unit
+            amount
         FROM `{LEDGER_TABLE_ID}`
     """
-    if filter_type:
-        base_query += " WHERE workout_type = @filter_type"
-    base_query += " ORDER BY date DESC"
+    conditions, query_parameters = _ledger_filters(type_ids, since, end)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    fetched = 0
+    with instrumented("iter_ledger_batches") as measurement:
+        job = client.query(query, job_config=bigquery.QueryJobConfig(query_parameters=query_parameters))
+        rows = job.result(page_size=LEDGER_STREAM_PAGE_SIZE)
+        for batch in rows.to_arrow_iterable(bqstorage_client=get_bqstorage_client()):
+            fetched += batch.num_rows
+            yield batch
+        measurement.record_job(job, rows=fetched)
+    logger.info(f"Streamed {fetched} ledger rows" + (f" since {since}." if since else "."))
 
-    if filter_type:
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("filter_type", "STRING", filter_type)
-            ]
-        )
-        job = client.query(base_query, job_config=job_config)
+
+def _named_ledger_batch(batch: pa.RecordBatch, wtypes: list) -> pa.RecordBatch:
+    """
+    Turns a ledger table batch [workout_type_id, date, amount] into a ledger
+    read batch [workout_type, date, amount, unit] with the names and units of
+    wtypes (read_workout_types). Rows of other ids (deleted types) are dropped.
+    """
+    positions = pc.index_in(
+        batch["workout_type_id"], value_set=pa.array([wt["workout_type_id"] for wt in wtypes], pa.int64())
+    )
+    known = pc.is_valid(positions)
+    batch = batch.filter(known)
+    positions = positions.filter(known)
+    return pa.RecordBatch.from_arrays([
+        pa.array([wt["workout_type"] for wt in wtypes], pa.string()).take(positions),
+        batch["date"],
+        batch["amount"],
+        pa.array([wt["unit"] for wt in wtypes], pa.string()).take(positions),
+    ], schema=LEDGER_ARROW_SCHEMA)
+
+
+def _filter_ledger_batch(
+    batch: pa.RecordBatch,
+    types: Optional[Sequence[str]],
+    start: Optional[date],
+    end: Optional[date],
+) -> pa.RecordBatch:
+    """Applies a type list and inclusive date range to one ledger batch."""
+    if types is not None:
+        batch = batch.filter(pc.is_in(batch["workout_type"], pa.array(list(types), pa.string())))
+    if start is not None:
+        batch = batch.filter(pc.greater_equal(batch["date"], pa.scalar(start, pa.date32())))
+    if end is not None:
+        batch = batch.filter(pc.less_equal(batch["date"], pa.scalar(end, pa.date32())))
+    return batch
+
+
+def read_workouts(
+    filter_type: str = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> pd.DataFrame:
+    """
+    Reads workouts from the ledger, optionally filtered by workout_type
+    and/or an inclusive date range (which prunes the ledger's partitions).
+    Returns a pd.DataFrame, ordered by most recent date first.
+    Results are shared through a process-wide cache (see LEDGER_CACHE_TTL_SECONDS);
+    if a ledger mirror is configured, a cache miss syncs it incrementally and reads it locally.
+    """
+    types = [filter_type] if filter_type else None
+    mirror = get_ledger_mirror()
+    if mirror is not None:
+        load = functools.partial(_read_mirror_workouts, mirror, types, start, end)
     else:
-        job = client.query(base_query)
+        client = get_bq_client()
+        base_query = f"""
+            SELECT
+                w.workout_type,
+                l.date,
+                l.amount,
+                w.unit
+            FROM `{LEDGER_TABLE_ID}` l
+            JOIN `{WORKOUT_TYPES_TABLE_ID}` w USING (workout_type_id)
+        """
+        conditions, query_parameters = _ledger_filters(_type_ids(types), start, end)
+        if conditions:
+            base_query += " WHERE " + " AND ".join(conditions)
+        base_query += " ORDER BY date DESC"
 
-    # Directly convert the query results to a DataFrame
-    df = job.to_dataframe()
+        def load() -> pd.DataFrame:
+            with instrumented("read_workouts") as measurement:
+                if query_parameters:
+                    job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
+                    job = client.query(base_query, job_config=job_config)
+                else:
+                    job = client.query(base_query)
+
+                # Directly convert the query results to a DataFrame
+                df = job.to_dataframe()
+                measurement.record_job(job, rows=len(df))
+            return df
+
+    df = _ledger_cache.get(
+        ("read_workouts", filter_type, start, end),
+        load,
+        lambda: (table_fingerprint(LEDGER_TABLE_ID), table_fingerprint(WORKOUT_TYPES_TABLE_ID)),
+    )
+    # shared with other sessions: callers get their own (copy-on-write) frame
+    df = _with_pending_rows(df.copy(deep=False), filter_type and [filter_type], start, end)
     logger.info(
-        f"Read {len(df)} workouts from ledger."
+        f"Read {len(df)} workouts from ledger{' mirror' if mirror is not None else ''}."
         + (f" (Filtered by '{filter_type}')" if filter_type else "")
     )
     return df
+
+
+def read_daily_totals(
+    types: Optional[Sequence[str]] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    before_key: Optional[tuple] = None,
+    limit: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Reads daily sums per (workout_type, date) from the daily_totals table
+    (or aggregated from the local ledger mirror, if configured, on cache misses).
+    Optionally restricted to some workout types and/or an inclusive date range.
+    Returns a pd.DataFrame [workout_type, date, amount] with datetime64 dates
+    and float64 amounts, ordered by most recent date first (then workout_type).
+
+    Keyset pagination: limit caps the number of rows, and before_key =
+    (date, workout_type) of the last row already shown returns the rows that
+    come after it in that order (i.e. "load older").
+    Query results are shared through a process-wide cache (see LEDGER_CACHE_TTL_SECONDS).
+    Days not refreshed yet since a write (see get_refresh_queue) are summed from the ledger.
+    """
+    if before_key is not None:
+        before_date = pd.Timestamp(before_key[0]).date()
+        # rows after the key are never newer than its date; lets the scan prune partitions
+        end = before_date if end is None else min(end, before_date)
+
+    key = (
+        "read_daily_totals",
+        tuple(types) if types is not None else None,
+        start,
+        end,
+        tuple(before_key) if before_key is not None else None,
+        limit,
+    )
+    mirror = get_ledger_mirror()
+    if mirror is not None:
+        load = functools.partial(_read_mirror_daily_totals, mirror, types, start, end)
+        # the whole range is cached (the page is cut below), and it changes with the ledger
+        key = key[:4]
+        totals_table_id = LEDGER_TABLE_ID
+    else:
+        client = get_bq_client()
+        conditions, query_parameters = _ledger_filters(_type_ids(types), start, end)
+        if before_key is not None:
+            conditions.append("(date < @before_date OR (date = @before_date AND w.workout_type > @before_type))")
+            query_parameters += [
+                bigquery.ScalarQueryParameter("before_date", "DATE", before_date),
+                bigquery.ScalarQueryParameter("before_type", "STRING", before_key[1]),
+            ]
+        query = f"""
+            SELECT
+                w.workout_type,
+                d.date,
+                d.amount
+            FROM `{DAILY_TOTALS_TABLE_ID}` d
+            JOIN `{WORKOUT_TYPES_TABLE_ID}` w USING (workout_type_id)
+        """
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY date DESC, workout_type"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+
+        def load() -> pd.DataFrame:
+            with instrumented("read_daily_totals") as measurement:
+                job = client.query(query, job_config=bigquery.QueryJobConfig(query_parameters=query_parameters))
+                df = job.to_dataframe()
+                measurement.record_job(job, rows=len(df))
+            return daily_totals_dtypes(df)
+
+        totals_table_id = DAILY_TOTALS_TABLE_ID
+    df = _ledger_cache.get(
+        key, load, lambda: (table_fingerprint(totals_table_id), table_fingerprint(WORKOUT_TYPES_TABLE_ID))
+    )
+    logger.info(f"Read {len(df)} daily totals{' from ledger mirror' if mirror is not None else ''}.")
+    df = df.copy(deep=False)
+    if mirror is None:
+        df = _with_stale_totals(df, types, start, end)
+    df = _with_pending_totals(df, types, start, end)
+    return _keyset_page(df, before_key, limit)
+
+
+def _read_mirror_workouts(
+    mirror: LedgerMirror,
+    types: Optional[Sequence[str]],
+    start: Optional[date],
+    end: Optional[date],
+) -> pd.DataFrame:
+    """read_workouts' rows from the ledger mirror (only the matching rows are materialized)."""
+    batches = list(_mirror_ledger_batches(mirror, types, start, end))
+    table = pa.Table.from_batches(batches, schema=LEDGER_ARROW_SCHEMA)
+    return table.sort_by([("date", "descending")]).to_pandas()
+
+
+def _read_mirror_daily_totals(
+    mirror: LedgerMirror,
+    types: Optional[Sequence[str]],
+    start: Optional[date],
+    end: Optional[date],
+) -> pd.DataFrame:
+    """read_daily_totals' rows from the ledger mirror, summed batch by batch."""
+    df = daily_totals_from_batches(_mirror_ledger_batches(mirror, types, start, end))
+    df = df.sort_values(["date", "workout_type"], ascending=[False, True], ignore_index=True)
+    return daily_totals_dtypes(df)
+
+
+def _keyset_page(df: pd.DataFrame, before_key: Optional[tuple], limit: Optional[int]) -> pd.DataFrame:
+    """Applies before_key/limit to a daily totals frame already ordered by (date DESC, workout_type)."""
+    if before_key is not None:
+        before_date = pd.Timestamp(before_key[0])
+        df = df[(df["date"] < before_date) | ((df["date"] == before_date) & (df["workout_type"] > before_key[1]))]
+    if limit is not None:
+        df = df.head(int(limit))
+    return df.reset_index(drop=True)
+
+
+def _ledger_filters(
+    type_ids: Optional[Sequence[int]],
+    start: Optional[date],
+    end: Optional[date],
+) -> tuple:
+    """
+    Builds WHERE conditions and query parameters for a list of workout_type_ids
+    (see _type_ids) and inclusive date range.
+    """
+    conditions = []
+    query_parameters = []
+    if type_ids is not None:
+        conditions.append("workout_type_id IN UNNEST(@type_ids)")
+        query_parameters.append(bigquery.ArrayQueryParameter("type_ids", "INT64", list(type_ids)))
+    if start is not None:
+        conditions.append("date >= @start")
+        query_parameters.append(bigquery.ScalarQueryParameter("start", "DATE", start))
+    if end is not None:
+        conditions.append("date <= @end")
+        query_parameters.append(bigquery.ScalarQueryParameter("end", "DATE", end))
+    return conditions, query_parameters
+
+
+def _pending_frame(
+    types: Optional[Sequence[str]],
+    start: Optional[date],
+    end: Optional[date],
+) -> Optional[pd.DataFrame]:
+    """Journaled rows not yet flushed to BigQuery (filtered like the read), or None."""
+    journal = get_write_journal()
+    if journal is None:
+        return None
+    pending = pd.DataFrame(journal.pending_rows(), columns=["workout_type", "date", "amount", "unit"])
+    pending["date"] = [date.fromisoformat(d) for d in pending["date"]]
+    if types is not None:
+        pending = pending[pending["workout_type"].isin(list(types))]
+    if start is not None:
+        pending = pending[pending["date"] >= start]
+    if end is not None:
+        pending = pending[pending["date"] <= end]
+    return pending if not pending.empty else None
+
+
+def _with_pending_rows(
+    df: pd.DataFrame,
+    types: Optional[Sequence[str]],
+    start: Optional[date],
+    end: Optional[date],
+) -> pd.DataFrame:
+    """Adds journaled (write-behind) rows to a ledger read, so new logs show up right away."""
+    pending = _pending_frame(types, start, end)
+    if pending is None:
+        return df
+    merged = pd.concat([df.astype({"date": object}), pending], ignore_index=True)
+    return merged.sort_values("date", ascending=False, ignore_index=True)
+
+
+def _with_stale_totals(
+    df: pd.DataFrame,
+    types: Optional[Sequence[str]],
+    start: Optional[date],
+    end: Optional[date],
+) -> pd.DataFrame:
+    """
+    Replaces the rows of a daily totals read that the refresh queue has marked
+    stale with sums straight from the ledger, so written logs show up before
+    daily_totals catches up.
+    """
+    stale = get_refresh_queue().stale_since()
+    if not stale:
+        return df
+    wtypes = [wt for wt in read_workout_types() if wt["workout_type_id"] in stale]
+    if types is not None:
+        wtypes = [wt for wt in wtypes if wt["workout_type"] in set(types)]
+    if not wtypes:
+        return df
+    since = min(stale[wt["workout_type_id"]] for wt in wtypes)
+    if start is not None:
+        since = max(since, start)
+    if end is not None and since > end:
+        return df
+    batches = (
+        _named_ledger_batch(batch, wtypes)
+        for batch in _query_ledger_batches(since, type_ids=[wt["workout_type_id"] for wt in wtypes], end=end)
+    )
+    fresh = daily_totals_dtypes(daily_totals_from_batches(batches))
+    names = [wt["workout_type"] for wt in wtypes]
+    kept = df[~(df["workout_type"].isin(names) & (df["date"] >= pd.Timestamp(since)))]
+    merged = pd.concat([kept, fresh], ignore_index=True)
+    return merged.sort_values(["date", "workout_type"], ascending=[False, True], ignore_index=True)
+
+
+def _with_pending_totals(
+    df: pd.DataFrame,
+    types: Optional[Sequence[str]],
+    start: Optional[date],
+    end: Optional[date],
+) -> pd.DataFrame:
+    """Adds journaled (write-behind) rows into a daily totals read."""
+    pending = _pending_frame(types, start, end)
+    if pending is None:
+        return df
+    merged = pd.concat([df, daily_totals_dtypes(pending)], ignore_index=True)
+    merged = merged.groupby(["workout_type", "date"], as_index=False)["amount"].sum()
+    return merged.sort_values(["date", "workout_type"], ascending=[False, True], ignore_index=True)
@@ -0,0 +1,226 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from typing import Callable, Collection, Optional, Sequence
+
+# Set up a logger
+logger = logging.getLogger(__name__)
+
+# Rows that failed this many flush attempts are parked (kept, but no longer retried or shown;
+# see parked_rows).
+MAX_ATTEMPTS = 10
+
+# A flush claims its batch before writing it, so the rows stop showing as pending while they
+# may already be in BigQuery. A claim older than this (its flush died with its process) is
+# taken over by the next flush, which resends the rows under the same insertIds.
+CLAIM_TIMEOUT_SECONDS = 300.0
+
+# write(rows, row_ids) persists rows and returns per-row errors as [{"index": i, ...}].
+WriteFn = Callable[[Sequence[dict], Sequence[str]], list]
+
+
+class WriteJournal:
+    """
+    Durable local journal for write-behind ledger inserts.
+
+    append() stores a row in a SQLite database (WAL mode) and returns at once.
+    flush() hands pending rows to the write function in batches, together with
+    their journal IDs so the sink can use them as insertIds for deduplication,
+    and removes the rows it accepted. A background worker calls flush()
+    periodically, backing off while writes keep failing.
+
+    Rows being written are claimed first and left out of pending_rows(), so a
+    read that merges pending rows into BigQuery results never counts a row
+    twice. Rows that keep failing are parked after MAX_ATTEMPTS and logged.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500):
+        self.path = path
+        self.batch_size = batch_size
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pending_ledger (
+                    insert_id TEXT PRIMARY KEY,
+                    workout_type TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    amount REAL NOT NULL,
+                    unit TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    claimed_at REAL
+                )
+                """
+            )
+            columns = [info[1] for info in conn.execute("PRAGMA table_info(pending_ledger)")]
+            if "claimed_at" not in columns:  # journal of an older version
+                conn.execute("ALTER TABLE pending_ledger ADD COLUMN claimed_at REAL")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def append(self, row: dict, known_types: Optional[Collection[str]] = None) -> str:
+        """
+        Durably records one ledger row [workout_type, date, amount, unit]; returns its insert ID.
+        Raises ValueError if known_types is given and does not contain the row's workout_type
+        (such a row could never be flushed).
+        """
+        if known_types is not None and row["workout_type"] not in known_types:
+            raise ValueError(f"Unknown workout type: {row['workout_type']!r}")
+        insert_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO pending_ledger (insert_id, workout_type, date, amount, unit, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (insert_id, row["workout_type"], str(row["date"]), float(row["amount"]), row["unit"], time.time()),
+            )
+        return insert_id
+
+    def pending_rows(self) -> list:
+        """
+        Returns the rows not yet flushed (excluding parked ones and those being
+        written), oldest first. Rows being written are not lost to readers:
+        log_workouts marks their days stale before inserting them, so reads
+        re-sum those days from the ledger.
+        """
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "SELECT workout_type, date, amount, unit FROM pending_ledger"
+                " WHERE attempts < ? AND claimed_at IS NULL ORDER BY created_at",
+                (MAX_ATTEMPTS,),
+            )
+            return [
+                {"workout_type": t, "date": d, "amount": a, "unit": u}
+                for t, d, a, u in cursor.fetchall()
+            ]
+
+    def parked_rows(self) -> list:
+        """
+        Returns the rows no longer retried after MAX_ATTEMPTS failed flushes, with
+        their insert_id, attempts and last_error, oldest first.
+        """
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "SELECT insert_id, workout_type, date, amount, unit, attempts, last_error FROM pending_ledger"
+                " WHERE attempts >= ? ORDER BY created_at",
+                (MAX_ATTEMPTS,),
+            )
+            return [
+                {"insert_id": i, "workout_type": t, "date": d, "amount": a, "unit": u,
+                 "attempts": n, "last_error": e}
+                for i, t, d, a, u, n, e in cursor.fetchall()
+            ]
+
+    def flush(self, write: WriteFn) -> int:
+        """
+        Writes pending rows in batches; returns how many were accepted.
+        A batch that raises is left in the journal and the exception re-raised.
+        """
+        flushed = 0
+        with self._flush_lock:
+            while True:
+                batch = self._claim_batch()
+                if not batch:
+                    return flushed
+
+                ids = [r[0] for r in batch]
+                rows = [{"workout_type": t, "date": d, "amount": a, "unit": u} for _, t, d, a, u in batch]
+                try:
+                    errors = write(rows, ids)
+                except Exception as e:
+                    self._record_failures([(i, repr(e)) for i in ids])
+                    raise
+                failed = {error["index"]: repr(error.get("errors")) for error in errors}
+                with closing(self._connect()) as conn, conn:
+                    conn.executemany(
+                        "DELETE FROM pending_ledger WHERE insert_id = ?",
+                        [(insert_id,) for index, insert_id in enumerate(ids) if index not in failed],
+                    )
+                self._record_failures([(ids[index], message) for index, message in failed.items()])
+                flushed += len(ids) - len(failed)
+                if failed:
+                    return flushed
+
+    def _claim_batch(self) -> list:
+        """
+        Claims up to batch_size unclaimed (or abandoned) rows, oldest first, and returns
+        them as [(insert_id, workout_type, date, amount, unit)].
+        """
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")  # no other process claims the same rows
+            batch = conn.execute(
+                "SELECT insert_id, workout_type, date, amount, unit FROM pending_ledger"
+                " WHERE attempts < ? AND (claimed_at IS NULL OR claimed_at < ?) ORDER BY created_at LIMIT ?",
+                (MAX_ATTEMPTS, now - CLAIM_TIMEOUT_SECONDS, self.batch_size),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE pending_ledger SET claimed_at = ? WHERE insert_id = ?",
+                [(now, r[0]) for r in batch],
+            )
+        return batch
+
+    def _record_failures(self, failures: list) -> None:
+        """Counts a failed attempt for [(insert_id, error)] and releases their claims."""
+        if not failures:
+            return
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "UPDATE pending_ledger SET attempts = attempts + 1, last_error = ?, claimed_at = NULL"
+                " WHERE insert_id = ?",
+                [(message, insert_id) for insert_id, message in failures],
+            )
+            parked = conn.execute(
+                f"SELECT insert_id, last_error FROM pending_ledger"
+                f" WHERE attempts >= ? AND insert_id IN ({', '.join('?' * len(failures))})",
+                (MAX_ATTEMPTS, *(insert_id for insert_id, _ in failures)),
+            ).fetchall()
+        if len(failures) > len(parked):
+            logger.warning(f"{len(failures) - len(parked)} journaled ledger rows failed to flush; will retry.")
+        for insert_id, message in parked:
+            logger.error(
+                f"Parked journaled ledger row {insert_id} after {MAX_ATTEMPTS} failed flushes"
+                f" (last error: {message}); see WriteJournal.parked_rows()."
+            )
+
+    def start_worker(self, write: WriteFn, interval_seconds: float = 2.0, max_backoff_seconds: float = 60.0) -> None:
+        """
+        Starts a daemon thread that flushes the journal every interval_seconds,
+        backing off exponentially (up to max_backoff_seconds) while flushes fail.
+        """
+        if self._worker is not None and self._worker.is_alive():
+            return
+
+        def run() -> None:
+            delay = interval_seconds
+            while not self._stop.wait(delay):
+                try:
+                    self.flush(write)
+                    delay = interval_seconds
+                except Exception:
+                    logger.exception("Flushing the ledger write journal failed.")
+                    delay = min(delay * 2, max_backoff_seconds)
+
+        self._stop.clear()
+        self._worker = threading.Thread(target=run, name="ledger-write-journal", daemon=True)
+        self._worker.start()
+
+    def stop_worker(self) -> None:
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
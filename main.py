@@ -1,9 +1,9 @@
 import streamlit as st
-from dao.workout_dao import ensure_dataset_and_tables
+from dao.storage import get_storage_backend
 
 def main():
-    # Make sure BigQuery dataset & tables exist
-    ensure_dataset_and_tables()
+    # Make sure the dataset & tables exist (BigQuery: only does work once per process / schema version)
+    get_storage_backend().bootstrap()
 
     st.title("Fitness Tracker Home")
     st.write("Welcome to the Fitness Tracker App! Use the sidebar to navigate.")
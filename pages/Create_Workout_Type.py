@@ -1,13 +1,10 @@
 import streamlit as st
-from dao.workout_dao import (
-    create_workout_type,
-    read_workout_types,
-    update_workout_type,
-    delete_workout_type
-)
+from dao.query_metrics import page_label
+from dao.storage import get_storage_backend
 
 def app():
     st.title("Create / Manage Workout Types")
+    storage = get_storage_backend()
     st.info("Note: Effective memory is ~= 1.5 * Half Life")
 
     # --- CREATE NEW TYPE ---
@@ -27,7 +24,7 @@ def app():
         submitted = st.form_submit_button("Create Workout Type")
         if submitted:
             if new_type and new_unit:
-                create_workout_type(
+                storage.create_workout_type(
                     workout_type=new_type.lower(),
                     unit=new_unit.lower(),
                     is_int=new_is_int,
@@ -42,7 +39,7 @@ def app():
 
     # --- LIST AND UPDATE / DELETE TYPES ---
     st.subheader("Existing Workout Types")
-    workout_types = read_workout_types()
+    workout_types = storage.read_workout_types()
 
     if workout_types:
         for wt in workout_types:
@@ -70,7 +67,7 @@ def app():
                 )
 
                 if st.button(f"Update {wt['workout_type']}"):
-                    update_workout_type(
+                    storage.update_workout_type(
                         old_workout_type=wt["workout_type"],
                         new_workout_type=updated_type.lower(),
                         new_unit=updated_unit.lower(),
@@ -81,9 +78,10 @@ def app():
                     st.rerun()
 
                 if st.button(f"Delete {wt['workout_type']}"):
-                    delete_workout_type(wt["workout_type"])
+                    storage.delete_workout_type(wt["workout_type"])
                     st.rerun()
     else:
         st.write("No workout types found.")
 
-app()
\ No newline at end of file
+with page_label("Create_Workout_Type"):
+    app()
\ No newline at end of file
@@ -1,21 +1,22 @@
 # pages/Log_Workout.py
 
 import streamlit as st
-from datetime import date
-from typing import Optional
 import pandas as pd
+from datetime import date, timedelta
+from typing import Optional
+
+from dao.query_metrics import page_label
+from dao.storage import get_storage_backend
 
-from dao.workout_dao import (
-    read_workout_types,
-    log_workout,
-    read_workouts,
-)
+# Rows fetched per "Load older" click
+PAGE_SIZE = 100
 
 def app():
     st.title("Log Workout (Append-Only)")
+    storage = get_storage_backend()
 
     # 1) Load available workout types
-    all_types = read_workout_types()
+    all_types = storage.read_workout_types()
     type_options = [wt["workout_type"] for wt in all_types]
 
     if not type_options:
@@ -36,39 +37,65 @@ def app():
 
     # 3) Log new workout row (append-only)
     if st.button("Log Workout"):
-        log_workout(workout_type_sel, workout_date, float(amount), unit)
+        storage.log_workout(workout_type_sel, workout_date, float(amount), unit)
         st.success(f"Appended {amount} {unit} for {workout_type_sel} on {workout_date}.")
+        # reload the view below so it includes the new entry
+        st.session_state.pop("ledger_view_key", None)
 
     st.write("---")
     st.subheader("View Aggregated Workouts")
 
-    # 4) (Optional) Filter
+    # 4) (Optional) Filter, and how far back to look
     filter_type = st.selectbox("Filter by type (optional)", [""] + type_options)
     filtered_type: Optional[str] = filter_type if filter_type else None
-
-    # 5) Read all ledger rows from BQ, convert to a DataFrame
-    raw_workouts = read_workouts()  # This might return a list of dicts or a DataFrame
-    df = pd.DataFrame(raw_workouts) if isinstance(raw_workouts, list) else raw_workouts
+    window_days = {"Last 30 days": 30, "Last 90 days": 90, "Last year": 365, "All": None}
+    window_choice = st.selectbox("Date window", list(window_days), index=1)
+    days = window_days[window_choice]
+    start = date.today() - timedelta(days=days) if days is not None else None
+    types = [filtered_type] if filtered_type else None
+
+    # 5) Read daily totals, aggregated, filtered and paged server-side.
+    #    The newest rows are re-read on every rerun (so other sessions' logs show up);
+    #    only the pages fetched with "Load older" are kept in the session, until the
+    #    filter/window (or the day it starts on) changes.
+    view_key = (filtered_type, window_choice, start)
+    if st.session_state.get("ledger_view_key") != view_key:
+        st.session_state["ledger_view_key"] = view_key
+        st.session_state["ledger_older_rows"] = None
+        st.session_state["ledger_exhausted"] = False
+    older_rows = st.session_state["ledger_older_rows"]
+    if older_rows is None:
+        newest = storage.read_daily_totals(types=types, start=start, limit=PAGE_SIZE)
+        st.session_state["ledger_exhausted"] = len(newest) < PAGE_SIZE
+        grouped_df = newest
+    else:
+        # everything down to the day the kept pages start on, so no row falls between them
+        boundary = older_rows["date"].iloc[0].date()
+        newest = storage.read_daily_totals(types=types, start=boundary)
+        grouped_df = pd.concat(
+            [newest, older_rows[older_rows["date"].dt.date < boundary]], ignore_index=True
+        )
 
     # If the table might be empty, handle that case
-    if df.empty:
+    if grouped_df.empty:
         st.write("No workouts found.")
         return
 
-    # 6) Aggregate by (workout_type, date)
-    #    sum amounts for the day
-    grouped_df = (
-        df.groupby(["workout_type", "date"], as_index=False)["amount"].sum()
-        .sort_values("date", ascending=False)
-    )
-
-    # 7) Optional: Filter the aggregated DataFrame
-    if filtered_type:
-        grouped_df = grouped_df[grouped_df["workout_type"] == filtered_type]
+    # 6) Display aggregated daily totals
+    st.dataframe(grouped_df.assign(date=grouped_df["date"].dt.date))
 
-    # 8) Display aggregated daily totals
-    st.dataframe(grouped_df)
+    if not st.session_state["ledger_exhausted"] and st.button("Load older"):
+        last = grouped_df.iloc[-1]
+        older = storage.read_daily_totals(
+            types=types, start=start, before_key=(last["date"], last["workout_type"]), limit=PAGE_SIZE
+        )
+        if not older.empty:
+            kept = older_rows if older_rows is not None else older.iloc[0:0]
+            st.session_state["ledger_older_rows"] = pd.concat([kept, older], ignore_index=True)
+        st.session_state["ledger_exhausted"] = len(older) < PAGE_SIZE
+        st.rerun()
 
     st.write("Note: We do not update existing rows. Each logging is an append. Daily totals are summed above.")
 
-app()
\ No newline at end of file
+with page_label("Log_Workout"):
+    app()
\ No newline at end of file
@@ -0,0 +1,47 @@
+# pages/Query_Metrics.py
+import pandas as pd
+import streamlit as st
+
+from dao.query_metrics import RingBufferSink, get_metrics_sink
+
+def app():
+    st.title("Query Metrics")
+    st.write("Latency, BigQuery bytes processed, slot time and cache hits of DAO calls in this server process.")
+    sink = get_metrics_sink()
+    if not isinstance(sink, RingBufferSink):
+        st.info(f"Query metrics are sent to {type(sink).__name__}; nothing is kept in memory here.")
+        return
+
+    totals = sink.totals()
+    if not totals:
+        st.write("No DAO calls recorded yet.")
+        return
+
+    # 1) Running totals per (operation, page), most bytes processed first
+    st.subheader("Totals since start")
+    totals_df = pd.DataFrame([
+        {"operation": operation, "page": page, **values} for (operation, page), values in totals.items()
+    ])
+    totals_df["avg_seconds"] = (totals_df["wall_seconds"] / totals_df["calls"]).round(3)
+    totals_df["mb_processed"] = (totals_df["bytes_processed"] / 1e6).round(1)
+    st.dataframe(
+        totals_df.sort_values(["bytes_processed", "wall_seconds"], ascending=False)[[
+            "operation", "page", "calls", "errors", "avg_seconds", "wall_seconds",
+            "rows", "mb_processed", "slot_millis", "cache_hits",
+        ]],
+        hide_index=True,
+    )
+
+    # 2) Most recent calls, newest first
+    records = sink.records()
+    st.subheader(f"Last {len(records)} calls")
+    recent_df = pd.DataFrame(records[::-1])
+    recent_df["started_at"] = pd.to_datetime(recent_df["started_at"], unit="s")
+    st.dataframe(recent_df, hide_index=True)
+
+    st.download_button("Download JSON", sink.to_json(), file_name="query_metrics.json", mime="application/json")
+    st.download_button(
+        "Download Prometheus metrics", sink.to_prometheus(), file_name="query_metrics.prom", mime="text/plain"
+    )
+
+app()
\ No newline at end of file
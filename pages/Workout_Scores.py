@@ -1,31 +1,39 @@
 # pages/Workout_Scores.py
 import streamlit as st
 import pandas as pd
-import numpy as np
 import altair as alt
-from datetime import timedelta
 
-from dao.workout_dao import read_workout_types, read_workouts
+from dao.query_metrics import page_label
+from dao.storage import fetch_concurrently, get_storage_backend
+from scoring.downsample import downsample_series
+from scoring.score_engine import (
+    predict_score_grid,
+    score_series,
+)
 
 def app():
     st.title("Workout Scores")
-
-    # 1) Read & aggregate logs (append-only data).
-    all_workouts = read_workouts()  # Possibly a list of dicts or a DataFrame
-    df = pd.DataFrame(all_workouts) if isinstance(all_workouts, list) else all_workouts
-    if df.empty:
+    storage = get_storage_backend()
+
+    # 1) Read daily totals (aggregated server-side from the append-only ledger),
+    #    workout_types (with 'daily_target' and 'half_life_days') and the current
+    #    scores (kept up to date on every write) at the same time
+    fetched = fetch_concurrently(
+        grouped=storage.read_daily_totals,
+        workout_types=storage.read_workout_types,
+        scores=storage.read_current_scores,
+    )
+    grouped = fetched["grouped"]
+    if grouped.empty:
         st.write("No workout data found.")
         return
 
-    if not pd.api.types.is_datetime64_any_dtype(df["date"]):
-        df["date"] = pd.to_datetime(df["date"])
-
-    # Group by (workout_type, date) => daily sum
-    grouped = df.groupby(["workout_type", "date"], as_index=False)["amount"].sum()
+    # Slice the daily sums per type once, for every section below
+    subsets = {wtype: sub[["date", "amount"]] for wtype, sub in grouped.groupby("workout_type")}
+    empty_subset = grouped.iloc[0:0][["date", "amount"]]
 
-    # 2) Read workout_types, which includes 'daily_target' and 'half_life_days'
-    workout_types = read_workout_types()
-    wtypes_df = pd.DataFrame(workout_types)  # [workout_type, unit, is_int, daily_target, half_life_days]
+    # 2) workout_types as a DataFrame
+    wtypes_df = pd.DataFrame(fetched["workout_types"])  # [workout_type, unit, is_int, daily_target, half_life_days]
 
     # --- Pastel color palette for A/B/C/D/F ---
     grade_colors = {
@@ -36,91 +44,14 @@ def app():
         "F": "#e0e0e0"    # light gray
     }
 
-    def get_grade(score_pct: float) -> str:
-        if score_pct >= 90:
-            return "A"
-        elif score_pct >= 80:
-            return "B"
-        elif score_pct >= 70:
-            return "C"
-        elif score_pct >= 60:
-            return "D"
-        else:
-            return "F"
-
-    def apply_extra_credit(A: float, T: float) -> float:
-        """
-        If daily target = T and actual = A:
-          - Everything up to T is full credit
-          - Above T is half credit
-          => effective = min(A, T) + 0.5 * max(A - T, 0)
-        """
-        if T <= 0:
-            return A  # if T=0, treat all as "normal" or do whatever logic you'd prefer
-        base = min(A, T)
-        above = max(A - T, 0)
-        return base + 0.5 * above
-
-    def ewa_for_type_extra_credit(type_df: pd.DataFrame, half_life_days: float, dtarget: float) -> float:
-        """
-        Compute an EWA of 'effective amounts' over the last 2*HL days.
-        We'll reindex missing days to 0, then transform amounts with extra credit logic,
-        then do half-life weighting, summing from earliest_date to last_date.
-        """
-        if type_df.empty:
-            return 0.0
-
-        last_date = type_df["date"].max()
-        # limit to 2*HL days
-        range_days = int(np.ceil(2.0 * half_life_days))
-        earliest_date = last_date - timedelta(days=range_days)
-
-        # filter out older logs
-        type_df = type_df[type_df["date"] >= earliest_date].copy()
-
-        # reindex so every day from earliest_date..last_date has a row (with amount=0 if missing)
-        all_days = pd.date_range(start=earliest_date, end=last_date, freq="D")
-        type_df = type_df.set_index("date")
-        type_df = type_df.reindex(all_days, fill_value=0.0)
-        type_df = type_df.rename_axis("date").reset_index()  # columns: [date, amount]
-
-        # apply extra credit
-        type_df["eff_amount"] = type_df["amount"].apply(lambda x: apply_extra_credit(x, dtarget))
-
-        # half-life weighting
-        delta_days = (last_date - type_df["date"]).dt.days
-        weights = np.power(2.0, -delta_days / half_life_days)
-
-        weighted_sum = (type_df["eff_amount"] * weights).sum()
-        total_weight = weights.sum()
-        if total_weight == 0:
-            return 0.0
-        return weighted_sum / total_weight
-
-    # 3) Build current score table
-    score_rows = []
-    for _, wt_row in wtypes_df.iterrows():
-        wtype = wt_row["workout_type"]
-        hl = wt_row["half_life_days"]
-        dtarget = wt_row["daily_target"]
-
-        subset = grouped[grouped["workout_type"] == wtype][["date", "amount"]].copy()
-        ewa_val = 0.0
-        if not subset.empty:
-            ewa_val = ewa_for_type_extra_credit(subset, hl, dtarget)
-
-        # final score
-        score_pct = (ewa_val / dtarget * 100) if dtarget > 0 else 0.0
-        letter = get_grade(score_pct)
-
-        score_rows.append({
-            "Workout Type": wtype,
-            "EWA": round(ewa_val, 2),
-            "Score (%)": round(score_pct, 1),
-            "Grade": letter
-        })
-
-    scores_df = pd.DataFrame(score_rows)
+    # 3) Build current score table from the stored per-type score state
+    scores = fetched["scores"]
+    scores_df = pd.DataFrame({
+        "Workout Type": scores["workout_type"],
+        "EWA": scores["ewa"].round(2),
+        "Score (%)": scores["score_pct"].round(1),
+        "Grade": scores["grade"],
+    })
 
     st.subheader("Current Scores")
 
@@ -145,24 +76,6 @@ def app():
     intervals = [0, 1, 3, 7, 14, 30, 45]
     multipliers = [0.0, 0.25, 0.5, 0.6667, 1.0, 1.5, 2.0]
 
-    def compute_future_ewa(subset_df: pd.DataFrame, half_life: float, dtarget: float,
-                           daily_amt: float, days_ahead: int) -> float:
-        # if no logs yet, assume last_date = today
-        if subset_df.empty:
-            last_date = pd.Timestamp.today().normalize()
-        else:
-            last_date = subset_df["date"].max()
-
-        new_data = subset_df.copy()
-
-        new_start_date = last_date + timedelta(days=1)
-        new_dates = [new_start_date + timedelta(days=i) for i in range(days_ahead)]
-        future_rows = pd.DataFrame({"date": new_dates, "amount": [daily_amt]*days_ahead})
-        new_data = pd.concat([new_data, future_rows], ignore_index=True)
-
-        # Then compute EWA with 2*HL day range, but "eff_amount" with extra credit
-        return ewa_for_type_extra_credit(new_data, half_life, dtarget)
-
     for _, wt_row in wtypes_df.iterrows():
         wtype = wt_row["workout_type"]
         hl = wt_row["half_life_days"]
@@ -171,31 +84,14 @@ def app():
         st.write(f"### {wtype} Predictor")
 
         # slice
-        subset = grouped[grouped["workout_type"] == wtype][["date", "amount"]].copy()
+        subset = subsets.get(wtype, empty_subset)
 
         if subset.empty:
             st.write("No logs yet for this type (using 0 as baseline).")
 
-        pred_data = []
-        row_labels = []
-
-        for m in multipliers:
-            test_amt = m * dtarget
-            row_label = f"{m} x T = {round(test_amt, 2)}"
-            row_labels.append(row_label)
-
-            row_scores = []
-            for days_ahead in intervals:
-                future_val = compute_future_ewa(subset, hl, dtarget, test_amt, days_ahead)
-                if dtarget > 0:
-                    score_pct = round((future_val / dtarget) * 100, 1)
-                else:
-                    score_pct = 0.0
-                row_scores.append(score_pct)
-
-            pred_data.append(row_scores)
-
-        pred_df = pd.DataFrame(pred_data, columns=intervals, index=row_labels)
+        # whole multiplier x interval grid from one pass over the history
+        pred_df = predict_score_grid(subset, hl, dtarget, multipliers, intervals).round(1)
+        pred_df.index = [f"{m} x T = {round(m * dtarget, 2)}" for m in multipliers]
         pred_df.index.name = "Daily Amount"
 
         st.dataframe(pred_df.style.format("{:.1f}"))
@@ -222,21 +118,28 @@ def app():
     }
     days_back = days_map[time_choice]
 
+    # Stored daily scores (score_history) cover each type up to its last log,
+    # so only the days around them are computed below
+    history_start = None
+    if days_back < 9999:
+        history_start = (pd.Timestamp.today().normalize() - pd.Timedelta(days=days_back)).date()
+    stored_history = storage.read_score_history(start=history_start)
+    stored_by_type = {wtype: h[["date", "score"]] for wtype, h in stored_history.groupby("workout_type")}
+    # days whose stored scores may predate recent logs (not flushed or refreshed yet) are recomputed
+    stale_from = {wtype: pd.Timestamp(since) for wtype, since in storage.stale_score_dates().items()}
+
     # We'll define a helper to compute daily EWA for each date in the chart range
     def daily_ewa_scores(subset_df: pd.DataFrame, half_life: float, dtarget: float,
-                         future_amt: float = 0.0, future_days: int = 0):
+                         future_amt: float = 0.0, future_days: int = 0, stored: pd.DataFrame = None,
+                         stale_from: pd.Timestamp = None):
         """
         For each day in the chosen range, compute EWA-based Score.
         Also adds future_amt for 'future_days' after the last real log date.
+        Days covered by stored [date, score] history are taken from it as is,
+        except those from stale_from on, which are recomputed.
         Returns DataFrame [date, score, category]
           category can be 'Historical' or 'Future'
         """
-        # if no logs => assume last_date= today-1
-        if subset_df.empty:
-            last_date = pd.Timestamp.today().normalize() - pd.Timedelta(days=1)
-        else:
-            last_date = subset_df["date"].max()
-
         # define chart_start based on days_back
         if days_back < 9999:
             chart_start = pd.Timestamp.today().normalize() - pd.Timedelta(days=days_back)
@@ -249,68 +152,75 @@ def app():
 
         # define chart_end => we add future_days or 0 if not wanted
         chart_end = pd.Timestamp.today().normalize()
-        # we can add a slider if you want to pick how many days in future for the line
-        # for now let's just pick future_days
         chart_end_fut = chart_end + pd.Timedelta(days=future_days)
 
-        # Build new_data for future
-        new_data = subset_df.copy()
-        fut_start_day = last_date + pd.Timedelta(days=1)
-        if fut_start_day <= chart_end_fut:
-            fut_day_range = pd.date_range(fut_start_day, chart_end_fut, freq="D")
-            future_rows = pd.DataFrame({
-                "date": fut_day_range,
-                "amount": future_amt
-            })
-            new_data = pd.concat([new_data, future_rows], ignore_index=True)
-
-        # build day range for chart
-        all_days = pd.date_range(start=chart_start, end=chart_end_fut, freq="D")
-
-        chart_records = []
-        for day in all_days:
-            # compute EWA for 'day'
-            chart_records.append({
-                "date": day,
-                "score": ewa_on_day(new_data, day, half_life, dtarget),
-            })
-
-        # Mark days <= last_date as 'Historical', beyond that as 'Future'
-        df_chart = pd.DataFrame(chart_records)
-        df_chart["category"] = np.where(df_chart["date"] <= last_date, "Historical", "Projected")
-        return df_chart
-
-    def ewa_on_day(full_df: pd.DataFrame, the_day: pd.Timestamp, half_life: float, target: float) -> float:
-        """
-        Compute EWA-based Score on 'the_day' using 2*HL back.
-        Uses extra-credit transform.
-        """
-        range_days = int(np.ceil(2.0 * half_life))
-        earliest = the_day - pd.Timedelta(days=range_days)
-
-        sub = full_df[(full_df["date"] >= earliest) & (full_df["date"] <= the_day)].copy()
-        # reindex
-        day_range = pd.date_range(earliest, the_day, freq="D")
-        sub = sub.set_index("date").reindex(day_range, fill_value=0.0).rename_axis("date").reset_index()
-        sub["eff_amount"] = sub["amount"].apply(lambda x: apply_extra_credit(x, target))
-
-        delta_days = (the_day - sub["date"]).dt.days
-        w = np.power(2.0, -delta_days / half_life)
-        wsum = (sub["eff_amount"] * w).sum()
-        wtot = w.sum()
-        if wtot == 0:
-            return 0.0
-        ewa_val = wsum / wtot
-        if target > 0:
-            return (ewa_val / target)*100
-        return 0.0
+        if stored is not None:
+            stored = stored[stored["date"] >= chart_start]
+            if stale_from is not None:
+                stored = stored[stored["date"] < stale_from]
+        if stored is None or stored.empty:
+            # whole series (historical + projected) in one pass
+            return score_series(subset_df, half_life, dtarget, chart_start, chart_end_fut, future_amt=future_amt)
+
+        parts = []
+        stored_first, stored_last = stored["date"].min(), stored["date"].max()
+        if stored_first > chart_start:  # days before the first log
+            parts.append(score_series(subset_df, half_life, dtarget, chart_start, stored_first - pd.Timedelta(days=1)))
+        parts.append(stored.assign(category="Historical"))
+        # days after the stored ones (stale or unflushed logs, then the projection)
+        parts.append(score_series(subset_df, half_life, dtarget, stored_last + pd.Timedelta(days=1),
+                                  chart_end_fut, future_amt=future_amt))
+        return pd.concat([part for part in parts if not part.empty], ignore_index=True)
 
     st.write("Select a future daily amount multiplier for the chart projection.")
     chart_mult = st.selectbox("Chart Future Multiplier", [0.0, 0.25, 0.5, 1.0, 1.5, 2.0], index=3)
     future_days_for_chart = st.number_input("Days of future projection in chart", min_value=0, max_value=60, value=30)
 
-    # We'll also define thresholds for A/B/C/D lines
+    # Threshold lines for A/B/C/D are constant, so each is a single rule rather than a point per day
     thr_values = [("A", 90), ("B", 80), ("C", 70), ("D", 60)]
+    thr_df = pd.DataFrame({
+        "score": [val for _, val in thr_values],
+        "category": [f"Threshold {grade}" for grade, _ in thr_values],
+    })
+    line_color = alt.Color(
+        "category:N",
+        # The domain must match your category labels exactly (case, spelling, etc.)
+        scale=alt.Scale(
+            domain=[
+                "Historical",
+                "Projected",
+                "Threshold A",
+                "Threshold B",
+                "Threshold C",
+                "Threshold D",
+            ],
+            range=[
+                "#1f77b4",  # "Historical" => a default blue
+                "#2ca02c",  # "Projected"  => a default green
+                "#c8f7c5",  # "Threshold A" => pastel green
+                "#f9f7c8",  # "Threshold B" => pastel yellow
+                "#ffe8cc",  # "Threshold C" => pastel orange
+                "#ffd6d6",  # "Threshold D" => light red
+            ],
+        ),
+        legend=alt.Legend(title="Line Type"),  # optional legend title
+    )
+    threshold_rules = alt.Chart(thr_df).mark_rule().encode(
+        y="score:Q",
+        color=line_color,
+        tooltip=["category:N", "score:Q"],
+    )
+
+    # With many types, one faceted chart over a shared dataset renders much faster than a chart per type
+    chart_layout = st.radio("Chart layout", ["One chart per type", "All types in one chart"], horizontal=True)
+    one_chart_per_type = chart_layout == "One chart per type"
+    score_encoding = {
+        "x": alt.X("date:T", title="Date"),
+        "y": alt.Y("score:Q", title="Score (%)", scale=alt.Scale(domain=[0, 110])),
+        "color": line_color,
+        "tooltip": ["date:T", "score:Q", "category:N"],
+    }
+    long_frames = []
 
     # Now build a chart for each workout type in wtypes_df
     for _, wt_row in wtypes_df.iterrows():
@@ -318,65 +228,24 @@ def app():
         hl = wt_row["half_life_days"]
         dtarget = wt_row["daily_target"]
 
-        st.write(f"## {wtype} Chart - {time_choice} Range")
+        if one_chart_per_type:
+            st.write(f"## {wtype} Chart - {time_choice} Range")
 
         # slice from grouped => daily sums
-        sub = grouped[grouped["workout_type"] == wtype][["date","amount"]].copy()
-        if sub.empty:
+        sub = subsets.get(wtype, empty_subset)
+        if sub.empty and one_chart_per_type:
             st.write("No logs => entire chart is 0 until future.")
-        sub_chart = daily_ewa_scores(sub, hl, dtarget, future_amt=chart_mult*dtarget, future_days=future_days_for_chart)
-
-        # build threshold df for the same date range
-        if not sub_chart.empty:
-            chart_start_dt = sub_chart["date"].min()
-            chart_end_dt = sub_chart["date"].max()
-        else:
-            # fallback
-            chart_start_dt = pd.Timestamp.today() - pd.Timedelta(days=7)
-            chart_end_dt = pd.Timestamp.today()
-
-        threshold_rows = []
-        rng = pd.date_range(chart_start_dt, chart_end_dt, freq="D")
-        for dt_ in rng:
-            for (grade, val) in thr_values:
-                threshold_rows.append({
-                    "date": dt_,
-                    "score": val,  # e.g. 90 for A
-                    "category": f"Threshold {grade}"
-                })
-        thr_df = pd.DataFrame(threshold_rows)
-
-        chart_df = pd.concat([sub_chart, thr_df], ignore_index=True)
+        sub_chart = daily_ewa_scores(sub, hl, dtarget, future_amt=chart_mult*dtarget, future_days=future_days_for_chart,
+                                     stored=stored_by_type.get(wtype), stale_from=stale_from.get(wtype))
+        # long ranges ("Year"/"All") are thinned to a few hundred points that keep the line's shape
+        sub_chart = downsample_series(sub_chart)
+        if not one_chart_per_type:
+            long_frames.append(sub_chart.assign(workout_type=wtype))
+            continue
 
         # Build altair chart
-        chart = alt.Chart(chart_df).mark_line().encode(
-            x=alt.X("date:T", title="Date"),
-            y=alt.Y("score:Q", title="Score (%)", scale=alt.Scale(domain=[0, 110])),
-            color=alt.Color(
-                "category:N",
-                # The domain must match your category labels exactly (case, spelling, etc.)
-                scale=alt.Scale(
-                    domain=[
-                        "Historical",
-                        "Projected",
-                        "Threshold A",
-                        "Threshold B",
-                        "Threshold C",
-                        "Threshold D",
-                    ],
-                    range=[
-                        "#1f77b4",  # "Historical" => a default blue
-                        "#2ca02c",  # "Projected"  => a default green
-                        "#c8f7c5",  # "Threshold A" => pastel green
-                        "#f9f7c8",  # "Threshold B" => pastel yellow
-                        "#ffe8cc",  # "Threshold C" => pastel orange
-                        "#ffd6d6",  # "Threshold D" => light red
-                    ],
-                ),
-                legend=alt.Legend(title="Line Type"),  # optional legend title
-            ),
-            tooltip=["date:T", "score:Q", "category:N"]
-        ).properties(
+        scores_line = alt.Chart(sub_chart).mark_line().encode(**score_encoding)
+        chart = alt.layer(scores_line, threshold_rules).properties(
             width=700,
             height=400
         ).interactive()
@@ -386,5 +255,37 @@ def app():
         st.write(f"**half_life** = {hl}, daily_target={dtarget}, multiplier={chart_mult}, future_days={future_days_for_chart}")
         st.write("Historical vs. Projected lines with threshold lines for A/B/C/D.")
 
+    if long_frames:
+        st.write(f"## All Types - {time_choice} Range")
+        # One long-format dataset [workout_type, date, score, category] shared by every panel;
+        # the threshold rows (no date) are included once per type and drawn as rules
+        type_names = list(wtypes_df["workout_type"].drop_duplicates())
+        thresholds = pd.DataFrame({"workout_type": type_names}).merge(thr_df, how="cross")
+        long_df = pd.concat(long_frames + [thresholds], ignore_index=True).astype(
+            {"workout_type": "category", "category": "category"}  # dictionary-encoded when shipped as Arrow
+        )
+
+        scores_line = alt.Chart().mark_line().encode(**score_encoding).transform_filter(
+            alt.FieldOneOfPredicate(field="category", oneOf=["Historical", "Projected"])
+        ).interactive()
+        rules = alt.Chart().mark_rule().encode(
+            y="score:Q",
+            color=line_color,
+            tooltip=["category:N", "score:Q"],
+        ).transform_filter(
+            alt.FieldOneOfPredicate(field="category", oneOf=list(thr_df["category"]))
+        )
+        chart = alt.layer(scores_line, rules, data=long_df).properties(
+            width=320,
+            height=200
+        ).facet(
+            facet=alt.Facet("workout_type:N", title=None, sort=type_names),
+            columns=2,
+        )
+
+        st.altair_chart(chart)
+        st.write(f"multiplier={chart_mult}, future_days={future_days_for_chart}")
+        st.write("Historical vs. Projected lines with threshold lines for A/B/C/D.")
 
-app()
\ No newline at end of file
+with page_label("Workout_Scores"):
+    app()
\ No newline at end of file
@@ -0,0 +1,261 @@
+"""
+Headless batch scoring: current scores and daily score histories for many
+users' ledgers at once, spread over a process pool.
+
+    python -m scoring.batch_scoring --output-dir scores/ --write-back
+    python -m scoring.batch_scoring --ledger ledgers.parquet --workout-types types.parquet --output-dir scores/
+
+Without --ledger, the single ledger of the configured storage backend is
+scored, and --write-back also stores the daily scores in its score_history
+in bulk (see write_back). A ledger (or workout types) file with a user_id
+column holds several users; workout types without user_id apply to every
+user. Their results are only written to Parquet: the storage backends hold
+one user's scores.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from scoring.score_engine import WorkoutTypes, _workout_types_frame, compute_current_scores, daily_score_history
+
+# Set up a logger
+logger = logging.getLogger(__name__)
+
+# Column that tells users apart in multi-user ledgers and workout types
+USER_COLUMN = "user_id"
+# user_id given to rows of a ledger without a user column
+DEFAULT_USER = "default"
+
+# Partitions handed to each worker process (more than one per worker evens out uneven users)
+PARTITIONS_PER_WORKER = 4
+
+# Output columns of the current scores and the daily history
+CURRENT_COLUMNS = [USER_COLUMN, "workout_type", "ewa", "score_pct", "grade"]
+HISTORY_COLUMNS = [USER_COLUMN, "workout_type", "date", "ewa", "score_pct", "grade"]
+
+CURRENT_SCORES_FILE = "current_scores.parquet"
+SCORE_HISTORY_FILE = "score_history.parquet"
+
+
+def partition_by_user(ledger: pd.DataFrame, workout_types: WorkoutTypes) -> list:
+    """
+    Sums the ledger into daily totals per (user, workout_type, date) and splits
+    it per user. Returns [(user_id, workout types as a list of dicts, daily totals
+    DataFrame [workout_type, date, amount])], one entry per user with logs or types.
+    """
+    if USER_COLUMN not in ledger.columns:
+        ledger = ledger.assign(**{USER_COLUMN: DEFAULT_USER})
+    wtypes_df = _workout_types_frame(workout_types)
+    if USER_COLUMN not in wtypes_df.columns:
+        wtypes_df = wtypes_df.assign(**{USER_COLUMN: None})
+    shared_types = wtypes_df[wtypes_df[USER_COLUMN].isna()].drop(columns=USER_COLUMN)
+    wtypes_df = wtypes_df[wtypes_df[USER_COLUMN].notna()]
+
+    if not ledger.empty and not pd.api.types.is_datetime64_any_dtype(ledger["date"]):
+        ledger = ledger.assign(date=pd.to_datetime(ledger["date"]))
+    daily = ledger.groupby([USER_COLUMN, "workout_type", "date"], as_index=False, sort=False)["amount"].sum()
+    daily_by_user = {user: df.drop(columns=USER_COLUMN) for user, df in daily.groupby(USER_COLUMN, sort=False)}
+    types_by_user = {user: df.drop(columns=USER_COLUMN) for user, df in wtypes_df.groupby(USER_COLUMN, sort=False)}
+    empty_daily = daily.iloc[0:0].drop(columns=USER_COLUMN)
+
+    users = sorted(set(daily_by_user) | set(types_by_user), key=str)
+    return [
+        (
+            user,
+            pd.concat([shared_types, types_by_user.get(user, shared_types.iloc[0:0])]).to_dict("records"),
+            daily_by_user.get(user, empty_daily),
+        )
+        for user in users
+    ]
+
+
+def score_user(
+    user_id,
+    workout_types: list,
+    daily: pd.DataFrame,
+    as_of: pd.Timestamp,
+    history_start: Optional[pd.Timestamp] = None,
+) -> tuple:
+    """
+    Scores one user's daily totals.
+    Returns (current scores [user_id, workout_type, ewa, score_pct, grade],
+             history [user_id, workout_type, date, ewa, score_pct, grade] for every
+             day from history_start (default: the type's first log) through as_of).
+    """
+    current = compute_current_scores(daily, workout_types)
+    current.insert(0, USER_COLUMN, user_id)
+
+    subsets = {wtype: sub for wtype, sub in daily.groupby("workout_type", sort=False)}
+    history = []
+    for wt in workout_types:
+        subset = subsets.get(wt["workout_type"], daily.iloc[0:0])
+        start = history_start
+        if start is None:
+            start = subset["date"].min() if not subset.empty else as_of
+        scores = daily_score_history(subset, wt["half_life_days"], wt["daily_target"], start, as_of)
+        history.append(scores.rename(columns={"score": "score_pct"}).assign(**{
+            USER_COLUMN: user_id,
+            "workout_type": wt["workout_type"],
+        }))
+    return current, _concat(history, HISTORY_COLUMNS)
+
+
+def score_partition(partition: Sequence[tuple], as_of: pd.Timestamp, history_start: Optional[pd.Timestamp]) -> tuple:
+    """
+    Worker entry point: scores every user of one partition (see partition_by_user).
+    Returns (current scores, history) for the partition.
+    """
+    results = [score_user(user, wtypes, daily, as_of, history_start) for user, wtypes, daily in partition]
+    return (
+        _concat([current for current, _ in results], CURRENT_COLUMNS),
+        _concat([history for _, history in results], HISTORY_COLUMNS),
+    )
+
+
+def batch_score(
+    ledger: pd.DataFrame,
+    workout_types: WorkoutTypes,
+    as_of: Optional[date] = None,
+    history_days: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> tuple:
+    """
+    Current scores and daily score histories for every user and workout type.
+
+    ledger: raw ledger rows or daily totals [workout_type, date, amount], with an
+        optional user_id column.
+    workout_types: [workout_type, daily_target, half_life_days] with an optional
+        user_id column (types without one apply to every user).
+    as_of: last day of the histories (default: yesterday, the last complete day).
+    history_days: how many days of history to compute (default: since each type's first log).
+    workers: worker processes (default: one per CPU); 1 scores in this process.
+
+    Users are split into partitions of similar size, which the workers score
+    independently. Returns (current scores, history) DataFrames as in score_user.
+    """
+    started = time.monotonic()
+    if as_of is None:
+        as_of = date.today() - timedelta(days=1)
+    as_of = pd.Timestamp(as_of).normalize()
+    history_start = as_of - pd.Timedelta(days=history_days - 1) if history_days is not None else None
+    workers = workers or os.cpu_count() or 1
+
+    users = partition_by_user(ledger, workout_types)
+    partitions = _balanced_partitions(users, workers * PARTITIONS_PER_WORKER if workers > 1 else 1)
+    if workers > 1 and len(partitions) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(
+                score_partition, partitions, [as_of] * len(partitions), [history_start] * len(partitions)
+            ))
+    else:
+        results = [score_partition(partition, as_of, history_start) for partition in partitions]
+
+    current = _concat([c for c, _ in results], CURRENT_COLUMNS)
+    history = _concat([h for _, h in results], HISTORY_COLUMNS)
+    logger.info(
+        f"Scored {len(users)} users ({len(current)} workout types, {len(history)} history rows) "
+        f"in {time.monotonic() - started:.1f}s with {workers} workers."
+    )
+    return current, history
+
+
+def write_results(current: pd.DataFrame, history: pd.DataFrame, output_dir: str) -> list:
+    """
+    Writes both result frames to Parquet files in output_dir; returns their paths.
+    See write_back for storing a single-user history in the storage backend.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for df, name in ((current, CURRENT_SCORES_FILE), (history, SCORE_HISTORY_FILE)):
+        path = os.path.join(output_dir, name)
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path)
+        paths.append(path)
+    return paths
+
+
+def write_back(history: pd.DataFrame, daily: pd.DataFrame, storage) -> int:
+    """
+    Stores the history of a single-user ledger in the storage backend's score_history
+    with one bulk write (StorageBackend.write_score_history); returns the rows written.
+    Like refresh_score_history, each type keeps only the days from its first through
+    its last log in daily [workout_type, date, amount], whatever history_days was.
+    """
+    users = set(history[USER_COLUMN])
+    if users - {DEFAULT_USER}:
+        raise ValueError(f"Only a single-user history can be written back, got users {sorted(users, key=str)}")
+    logged_days = pd.to_datetime(daily["date"]).groupby(daily["workout_type"])
+    first_days = history["workout_type"].map(logged_days.min())
+    last_days = history["workout_type"].map(logged_days.max())
+    history = history[(history["date"] >= first_days) & (history["date"] <= last_days)]
+    rows = history.rename(columns={"score_pct": "score"})[["workout_type", "date", "ewa", "score", "grade"]]
+    return storage.write_score_history(rows)
+
+
+def _balanced_partitions(users: list, n_partitions: int) -> list:
+    """Splits users into up to n_partitions lists with similar total row counts (largest first)."""
+    n_partitions = max(min(n_partitions, len(users)), 1)
+    partitions = [[] for _ in range(n_partitions)]
+    loads = [0] * n_partitions
+    for user in sorted(users, key=lambda u: len(u[2]), reverse=True):
+        lightest = loads.index(min(loads))
+        partitions[lightest].append(user)
+        loads[lightest] += len(user[2]) + 1
+    return [partition for partition in partitions if partition]
+
+
+def _concat(frames: list, columns: list) -> pd.DataFrame:
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)[columns]
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ledger", help="Parquet/CSV ledger [user_id, workout_type, date, amount]")
+    parser.add_argument("--workout-types", help="Parquet/CSV workout types [user_id, workout_type, daily_target, half_life_days]")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--as-of", type=date.fromisoformat, help="last day to score (default: yesterday)")
+    parser.add_argument("--history-days", type=int, help="days of history per type (default: all)")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--write-back", action="store_true",
+                        help="also store the daily scores in the storage backend (without --ledger only)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if (args.ledger is None) != (args.workout_types is None):
+        parser.error("--ledger and --workout-types must be given together")
+    if args.write_back and args.ledger is not None:
+        parser.error("--write-back stores the scores of the storage backend's own ledger, so it excludes --ledger")
+    if args.ledger is not None:
+        ledger, workout_types = _read_frame(args.ledger), _read_frame(args.workout_types)
+    else:
+        from dao.storage import fetch_concurrently, get_storage_backend
+        storage = get_storage_backend()
+        fetched = fetch_concurrently(ledger=storage.read_daily_totals, workout_types=storage.read_workout_types)
+        ledger, workout_types = fetched["ledger"], fetched["workout_types"]
+
+    current, history = batch_score(ledger, workout_types, args.as_of, args.history_days, args.workers)
+    for path in write_results(current, history, args.output_dir):
+        print(path)
+    if args.write_back:
+        written = write_back(history, ledger, storage)
+        logger.info(f"Wrote {written} daily scores back to the storage backend.")
+    return 0
+
+
+def _read_frame(path: str) -> pd.DataFrame:
+    return pd.read_csv(path) if path.endswith(".csv") else pd.read_parquet(path)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+# Default point budget for one chart line: about one point per two pixels of a 700px-wide chart
+DEFAULT_MAX_POINTS = 300
+
+
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: picks n_out of the points (x, y) that keep
+    the visual shape of the line (peaks and dips survive, flat runs thin out).
+    x must be increasing. The first and last points are always kept.
+    Returns the picked indices in order (all of them if n_out >= len(x)).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:max(n_out, 0)]
+
+    # n_out - 2 buckets over the interior points; each contributes one point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    picked = np.empty(n_out, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # the triangle's third corner: the next bucket's average (the last point after the last bucket)
+        if i + 2 < len(edges):
+            next_x = x[hi:edges[i + 2]].mean()
+            next_y = y[hi:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs(
+            (x[previous] - next_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (next_y - y[previous])
+        )
+        previous = lo + int(np.argmax(areas))
+        picked[i + 1] = previous
+    return picked
+
+
+def downsample_series(
+    df: pd.DataFrame,
+    max_points: int = DEFAULT_MAX_POINTS,
+    x: str = "date",
+    y: str = "score",
+    by: str = "category",
+) -> pd.DataFrame:
+    """
+    LTTB-downsamples a chart frame to about max_points rows. Each `by` group
+    (e.g. Historical / Projected) is thinned separately, with a share of the
+    budget proportional to its length, so the lines still meet where they did.
+    Frames within the budget are returned unchanged.
+    """
+    if len(df) <= max_points:
+        return df
+    parts = []
+    for _, part in df.groupby(by, sort=False):
+        n_out = max(max_points * len(part) // len(df), 3)
+        xs = part[x].to_numpy()
+        if np.issubdtype(xs.dtype, np.datetime64):
+            xs = xs.astype("datetime64[ns]").astype(np.int64)
+        parts.append(part.iloc[lttb_indices(xs, part[y].to_numpy(), n_out)])
+    return pd.concat(parts, ignore_index=True)
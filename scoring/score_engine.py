@@ -0,0 +1,491 @@
+import logging
+from typing import Iterable, Sequence, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Set up a logger
+logger = logging.getLogger(__name__)
+
+# Letter grades and the minimum score (%) needed for each, best first.
+GRADE_THRESHOLDS = (("A", 90.0), ("B", 80.0), ("C", 70.0), ("D", 60.0))
+FAILING_GRADE = "F"
+
+WORKOUT_TYPE_COLUMNS = ["workout_type", "unit", "is_int", "daily_target", "half_life_days"]
+
+# Compact ledger frames (see compact_ledger): categorical type, int32 days since epoch, float32 amount
+COMPACT_LEDGER_COLUMNS = ["workout_type", "day", "amount"]
+# Compact daily totals are summed on a dense (type, day) grid when it has at most this many
+# slots (or 4 per ledger row); sparser ledgers fall back to a hash groupby
+DENSE_GROUPING_MIN_KEYS = 1 << 20
+
+WorkoutTypes = Union[pd.DataFrame, Iterable[dict]]
+
+
+def get_grade(score_pct: float) -> str:
+    """
+    Returns the letter grade for a single score percentage.
+    """
+    for letter, minimum in GRADE_THRESHOLDS:
+        if score_pct >= minimum:
+            return letter
+    return FAILING_GRADE
+
+
+def get_grades(score_pcts) -> np.ndarray:
+    """
+    Vectorized get_grade: returns an array of letter grades.
+    """
+    scores = np.asarray(score_pcts, dtype=float)
+    conditions = [scores >= minimum for _, minimum in GRADE_THRESHOLDS]
+    letters = [letter for letter, _ in GRADE_THRESHOLDS]
+    return np.select(conditions, letters, default=FAILING_GRADE)
+
+
+def apply_extra_credit(amounts, targets):
+    """
+    If daily target = T and actual = A:
+      - Everything up to T is full credit
+      - Above T is half credit
+      => effective = min(A, T) + 0.5 * max(A - T, 0)
+    A target <= 0 leaves the amount unchanged.
+    Works element-wise on scalars or arrays (broadcasting targets).
+    """
+    a = np.asarray(amounts, dtype=float)
+    t = np.asarray(targets, dtype=float)
+    effective = np.minimum(a, t) + 0.5 * np.maximum(a - t, 0.0)
+    result = np.where(t <= 0, a, effective)
+    return result if result.ndim else float(result)
+
+
+def window_days(half_life_days):
+    """
+    Number of days looked back from the scoring day: ceil(2 * half_life).
+    The window is inclusive, so it spans window_days + 1 calendar days.
+    """
+    return np.ceil(2.0 * np.asarray(half_life_days, dtype=float)).astype(np.int64)
+
+
+def decay_kernel(half_life_days: float) -> np.ndarray:
+    """
+    Half-life weights for offsets 0..window_days (offset 0 = the scoring day).
+    """
+    offsets = np.arange(int(window_days(half_life_days)) + 1)
+    return np.power(2.0, -offsets / half_life_days)
+
+
+def window_total_weight(half_life_days):
+    """
+    Sum of decay_kernel(half_life) for one or many half lives (closed form).
+    """
+    hl = np.asarray(half_life_days, dtype=float)
+    ratio = np.power(2.0, -1.0 / hl)
+    return (1.0 - np.power(ratio, window_days(hl) + 1)) / (1.0 - ratio)
+
+
+def to_day_ordinals(dates) -> np.ndarray:
+    """
+    Converts dates (datetime64, dbdate or datetime.date objects) to int64 days since epoch.
+    """
+    dates = pd.Series(dates)
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates)
+    return dates.to_numpy(dtype="datetime64[D]").astype(np.int64)
+
+
+def compact_ledger(ledger) -> pd.DataFrame:
+    """
+    The compact in-memory form of ledger rows: a DataFrame [workout_type, day, amount]
+    with a categorical workout_type, int32 day ordinals (days since epoch) and float32
+    amounts, without the unit (it lives in workout_types). About a fifth of the memory
+    of a read_workouts frame, and groupbys run on integer codes.
+
+    ledger: a [workout_type, date, amount(, unit)] DataFrame, or an Arrow table or
+    iterable of record batches of ledger rows (converted batch by batch).
+    Every function here that takes ledger rows or daily totals also takes this form.
+    """
+    if isinstance(ledger, pd.DataFrame):
+        if _is_compact(ledger):
+            return ledger
+        return pd.DataFrame({
+            "workout_type": ledger["workout_type"].astype("category"),
+            "day": to_day_ordinals(ledger["date"]).astype(np.int32),
+            "amount": ledger["amount"].to_numpy(dtype=np.float32),
+        })
+    if isinstance(ledger, pa.Table):
+        ledger = ledger.to_batches()
+    schema = pa.schema([
+        pa.field("workout_type", pa.dictionary(pa.int32(), pa.string())),
+        pa.field("day", pa.int32()),
+        pa.field("amount", pa.float32()),
+    ])
+    batches = [
+        pa.record_batch([
+            batch["workout_type"].dictionary_encode(),
+            batch["date"].cast(pa.date32()).cast(pa.int32()),  # date32 is stored as int32 days since epoch
+            batch["amount"].cast(pa.float32()),
+        ], schema=schema)
+        for batch in ledger
+        if batch.num_rows
+    ]
+    table = pa.Table.from_batches(batches, schema=schema).unify_dictionaries()
+    return table.to_pandas()
+
+
+def _is_compact(df: pd.DataFrame) -> bool:
+    return "day" in df.columns
+
+
+def _day_ordinals(df: pd.DataFrame) -> np.ndarray:
+    """int64 days since epoch of a ledger/daily totals frame, compact or not."""
+    if _is_compact(df):
+        return df["day"].to_numpy(dtype=np.int64)
+    return to_day_ordinals(df["date"])
+
+
+def daily_totals(ledger_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Groups raw ledger rows once into daily sums.
+    Returns a DataFrame [workout_type, date, amount] with datetime64 dates,
+    or for a compact ledger a compact [workout_type, day, amount] frame
+    (amounts summed as float64).
+    """
+    if _is_compact(ledger_df):
+        return _compact_daily_totals(ledger_df)
+    if ledger_df.empty:
+        return pd.DataFrame({
+            "workout_type": pd.Series(dtype=object),
+            "date": pd.Series(dtype="datetime64[ns]"),
+            "amount": pd.Series(dtype=float),
+        })
+    df = ledger_df[["workout_type", "date", "amount"]]
+    if not pd.api.types.is_datetime64_any_dtype(df["date"]):
+        df = df.assign(date=pd.to_datetime(df["date"]))
+    return df.groupby(["workout_type", "date"], as_index=False)["amount"].sum()
+
+
+def _compact_daily_totals(ledger_df: pd.DataFrame) -> pd.DataFrame:
+    """daily_totals of a compact ledger, ordered by type code then day."""
+    workout_types = ledger_df["workout_type"]
+    if not isinstance(workout_types.dtype, pd.CategoricalDtype):
+        workout_types = workout_types.astype("category")
+    codes = workout_types.cat.codes.to_numpy()
+    days = ledger_df["day"].to_numpy()
+    amounts = ledger_df["amount"].to_numpy(dtype=np.float64)
+    known = codes >= 0
+    codes, days, amounts = codes[known].astype(np.int64), days[known].astype(np.int64), amounts[known]
+
+    first_day = days.min() if len(days) else 0
+    span = int(days.max() - first_day + 1) if len(days) else 1
+    n_keys = len(workout_types.cat.categories) * span
+    if n_keys <= max(4 * len(days), DENSE_GROUPING_MIN_KEYS):
+        # one slot per (type, day) of the covered range: two bincounts instead of a hash groupby
+        keys = codes * span + (days - first_day)
+        counts = np.bincount(keys, minlength=n_keys)
+        sums = np.bincount(keys, weights=amounts, minlength=n_keys)
+        present = np.flatnonzero(counts)
+        out_codes, out_days, out_amounts = present // span, present % span + first_day, sums[present]
+    else:
+        grouped = pd.DataFrame({"code": codes, "day": days, "amount": amounts}).groupby(
+            ["code", "day"], sort=True
+        )["amount"].sum()
+        out_codes = grouped.index.get_level_values(0).to_numpy()
+        out_days = grouped.index.get_level_values(1).to_numpy()
+        out_amounts = grouped.to_numpy()
+    return pd.DataFrame({
+        "workout_type": pd.Categorical.from_codes(out_codes, dtype=workout_types.dtype),
+        "day": out_days.astype(np.int32),
+        "amount": out_amounts,
+    })
+
+
+def daily_totals_from_batches(batches: Iterable[pa.RecordBatch]) -> pd.DataFrame:
+    """
+    Streaming daily_totals: sums Arrow record batches of ledger rows one batch
+    at a time, so memory is bounded by the number of (workout_type, date)
+    pairs rather than by the number of ledger rows.
+    Returns a DataFrame [workout_type, date, amount] with datetime64 dates.
+    """
+    totals = None
+    partials = []
+    partial_rows = 0
+    for batch in batches:
+        if not batch.num_rows:
+            continue
+        partial = _sum_by_day(pa.Table.from_batches([batch.select(["workout_type", "date", "amount"])]))
+        partials.append(partial)
+        partial_rows += partial.num_rows
+        # Fold the per-batch sums into the totals once they outgrow them: amortized
+        # linear work, and never more than about twice the totals held at once.
+        if totals is None or partial_rows >= totals.num_rows:
+            totals = _sum_by_day(pa.concat_tables(([totals] if totals is not None else []) + partials))
+            partials = []
+            partial_rows = 0
+    if totals is None:
+        return daily_totals(pd.DataFrame())
+    if partials:
+        totals = _sum_by_day(pa.concat_tables([totals] + partials))
+    df = totals.to_pandas(date_as_object=False)
+    return df.assign(date=df["date"].astype("datetime64[ns]"))
+
+
+def _sum_by_day(table: pa.Table) -> pa.Table:
+    # grouping on dictionary codes is several times faster than hashing the type strings
+    if not pa.types.is_dictionary(table.schema.field("workout_type").type):
+        table = table.set_column(0, "workout_type", table["workout_type"].dictionary_encode())
+    grouped = table.group_by(["workout_type", "date"]).aggregate([("amount", "sum")])
+    return grouped.rename_columns(["workout_type", "date", "amount"]).cast(pa.schema([
+        pa.field("workout_type", pa.string()),
+        pa.field("date", table.schema.field("date").type),
+        pa.field("amount", pa.float64()),
+    ]))
+
+
+def _workout_types_frame(workout_types: WorkoutTypes) -> pd.DataFrame:
+    if isinstance(workout_types, pd.DataFrame):
+        df = workout_types
+    else:
+        df = pd.DataFrame(list(workout_types))
+    if df.empty:
+        return pd.DataFrame(columns=WORKOUT_TYPE_COLUMNS)
+    return df
+
+
+def _type_codes(workout_types: pd.Series, names) -> np.ndarray:
+    """Position of each row's workout_type in names (-1 if absent); categoricals map their categories only."""
+    index = pd.Index(names)
+    if isinstance(workout_types.dtype, pd.CategoricalDtype):
+        category_codes = np.append(index.get_indexer(workout_types.cat.categories), -1)
+        return category_codes[workout_types.cat.codes.to_numpy()]  # code -1 (missing) maps to -1
+    return index.get_indexer(workout_types)
+
+
+def compute_current_scores(ledger_df: pd.DataFrame, workout_types: WorkoutTypes) -> pd.DataFrame:
+    """
+    Scores every workout type in one vectorized pass over the ledger.
+
+    For each type the EWA is taken on that type's last logged day, over the
+    previous ceil(2 * half_life) days (missing days count as 0), using the
+    extra-credit effective amounts and half-life weights.
+
+    ledger_df: raw ledger rows or daily totals, [workout_type, date, amount],
+        as a DataFrame (or a compact one, see compact_ledger) or as an iterable
+        of Arrow record batches (summed incrementally, see daily_totals_from_batches).
+    workout_types: list of dicts or DataFrame with
+        [workout_type, daily_target, half_life_days].
+
+    Returns a DataFrame [workout_type, ewa, score_pct, grade], one row per
+    workout type, in the order given.
+    """
+    if not isinstance(ledger_df, pd.DataFrame):
+        ledger_df = daily_totals_from_batches(ledger_df)
+    wtypes_df = _workout_types_frame(workout_types)
+    names = wtypes_df["workout_type"].to_numpy()
+    # A name may appear more than once; score each distinct name once.
+    row_codes, uniques = pd.factorize(names)
+    first_rows = np.unique(row_codes, return_index=True)[1]
+    half_life = wtypes_df["half_life_days"].to_numpy(dtype=float)[first_rows]
+    target = wtypes_df["daily_target"].to_numpy(dtype=float)[first_rows]
+    n_types = len(uniques)
+
+    ewa = np.zeros(n_types)
+    if n_types and not ledger_df.empty:
+        daily = daily_totals(ledger_df)
+        codes = _type_codes(daily["workout_type"], uniques)
+        known = codes >= 0
+        codes = codes[known]
+        days = _day_ordinals(daily)[known]
+        amounts = daily["amount"].to_numpy(dtype=float)[known]
+
+        logged = np.bincount(codes, minlength=n_types) > 0
+        last_day = np.full(n_types, np.iinfo(np.int64).min)
+        np.maximum.at(last_day, codes, days)
+
+        offsets = last_day[codes] - days
+        in_window = offsets <= window_days(half_life)[codes]
+        codes, offsets, amounts = codes[in_window], offsets[in_window], amounts[in_window]
+
+        effective = apply_extra_credit(amounts, target[codes])
+        weights = np.power(2.0, -offsets / half_life[codes])
+        weighted_sum = np.bincount(codes, weights=effective * weights, minlength=n_types)
+        ewa = np.where(logged, weighted_sum / window_total_weight(half_life), 0.0)
+
+    score_pct = np.divide(ewa * 100.0, target, out=np.zeros(n_types), where=target > 0)
+    logger.info(f"Computed current scores for {n_types} workout types.")
+    return pd.DataFrame({
+        "workout_type": names,
+        "ewa": ewa[row_codes],
+        "score_pct": score_pct[row_codes],
+        "grade": get_grades(score_pct)[row_codes],
+    })
+
+
+def score_series(
+    type_df: pd.DataFrame,
+    half_life_days: float,
+    daily_target: float,
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    future_amt: float = 0.0,
+    last_date: pd.Timestamp = None,
+) -> pd.DataFrame:
+    """
+    Computes the daily Score (%) for every day in [start, end] in one pass.
+
+    Each day's score uses the same truncated window as the current score
+    (that day and the ceil(2 * half_life) days before it, missing days = 0).
+    Days after last_date (default: the last logged day) are filled with
+    future_amt, so the series continues as a projection.
+
+    type_df: [date, amount] (or compact [day, amount]) rows for a single workout type.
+    Returns a DataFrame [date, score, category], category being
+    'Historical' (date <= last_date) or 'Projected'.
+    """
+    start = pd.Timestamp(start).normalize()
+    end = pd.Timestamp(end).normalize()
+    if last_date is None:
+        last_date = _last_logged_day(type_df)
+    ewa = ewa_series(type_df, half_life_days, daily_target, start, end, future_amt, last_date)
+    if len(ewa) == 0:
+        return pd.DataFrame({
+            "date": pd.Series(dtype="datetime64[ns]"),
+            "score": pd.Series(dtype=float),
+            "category": pd.Series(dtype=object),
+        })
+    scores = ewa / daily_target * 100 if daily_target > 0 else np.zeros(len(ewa))
+
+    dates = pd.date_range(start, periods=len(ewa), freq="D")
+    return pd.DataFrame({
+        "date": dates,
+        "score": scores,
+        "category": np.where(dates <= last_date, "Historical", "Projected"),
+    })
+
+
+def ewa_series(
+    type_df: pd.DataFrame,
+    half_life_days: float,
+    daily_target: float,
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    future_amt: float = 0.0,
+    last_date: pd.Timestamp = None,
+) -> np.ndarray:
+    """
+    The EWA behind score_series: one value per day in [start, end].
+
+    The effective amounts are laid out on a dense day grid once and convolved
+    with the half-life kernel, instead of re-windowing the data for every day.
+    """
+    start = pd.Timestamp(start).normalize()
+    end = pd.Timestamp(end).normalize()
+    if last_date is None:
+        last_date = _last_logged_day(type_df)
+    n_days = (end - start).days + 1
+    if n_days <= 0:
+        return np.zeros(0)
+
+    kernel = decay_kernel(half_life_days)
+    lookback = len(kernel) - 1
+    grid_start = start - pd.Timedelta(days=lookback)
+    amounts = np.zeros(n_days + lookback)
+
+    if not type_df.empty:
+        idx = _day_ordinals(type_df) - to_day_ordinals([grid_start])[0]
+        in_grid = (idx >= 0) & (idx < len(amounts))
+        np.add.at(amounts, idx[in_grid], type_df["amount"].to_numpy(dtype=float)[in_grid])
+
+    # Everything after the last real log date is projected at future_amt.
+    future_from = max((last_date - grid_start).days + 1, 0)
+    amounts[future_from:] = future_amt
+
+    effective = apply_extra_credit(amounts, daily_target)
+    return np.convolve(effective, kernel)[lookback:lookback + n_days] / kernel.sum()
+
+
+def daily_score_history(
+    type_df: pd.DataFrame,
+    half_life_days: float,
+    daily_target: float,
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+) -> pd.DataFrame:
+    """
+    The stored form of score_series: EWA, Score (%) and grade for every day in
+    [start, end], all of them scored from the logs alone (no projection).
+    Returns a DataFrame [date, ewa, score, grade].
+    """
+    start = pd.Timestamp(start).normalize()
+    ewa = ewa_series(type_df, half_life_days, daily_target, start, end, last_date=pd.Timestamp(end).normalize())
+    score = ewa * 100.0 / daily_target if daily_target > 0 else np.zeros(len(ewa))
+    return pd.DataFrame({
+        "date": pd.date_range(start, periods=len(ewa), freq="D"),
+        "ewa": ewa,
+        "score": score,
+        "grade": get_grades(score),
+    })
+
+
+def _last_logged_day(type_df: pd.DataFrame) -> pd.Timestamp:
+    """The last logged day, or yesterday if there are no logs."""
+    if type_df.empty:
+        return pd.Timestamp.today().normalize() - pd.Timedelta(days=1)
+    if _is_compact(type_df):
+        return pd.Timestamp(int(type_df["day"].max()), unit="D")
+    return pd.Timestamp(type_df["date"].max())
+
+
+def predict_score_grid(
+    type_df: pd.DataFrame,
+    half_life_days: float,
+    daily_target: float,
+    multipliers: Sequence[float],
+    intervals: Sequence[int],
+    last_date: pd.Timestamp = None,
+) -> pd.DataFrame:
+    """
+    Projected Score (%) if (multiplier * daily_target) is done every day for
+    the next N days, for every multiplier x interval combination at once.
+
+    Matches recomputing the EWA with the future days appended, but uses a
+    single pass over the history window: with constant future amounts the
+    score after N days is
+        (r^N * H[R - N] + eff(amount) * (1 - r^min(N, R + 1)) / (1 - r)) / W
+    where r is the daily decay, R the window length, W the window weight and
+    H[m] the decayed sum of the last m + 1 historical days.
+
+    type_df: [date, amount] (or compact [day, amount]) rows for a single workout type.
+    last_date: day the projection starts after (default: last logged day, or today).
+    Returns a DataFrame indexed by multiplier with one column per interval.
+    """
+    mults = np.asarray(multipliers, dtype=float)
+    days_ahead = np.asarray(intervals, dtype=np.int64)
+    lookback = int(window_days(half_life_days))
+    ratio = 2.0 ** (-1.0 / half_life_days)
+
+    # Decayed prefix sums of the history, newest day first.
+    history = np.zeros(lookback + 1)
+    if not type_df.empty:
+        if last_date is None:
+            last_date = _last_logged_day(type_df)
+        ages = to_day_ordinals([last_date])[0] - _day_ordinals(type_df)
+        in_window = (ages >= 0) & (ages <= lookback)
+        np.add.at(history, ages[in_window], type_df["amount"].to_numpy(dtype=float)[in_window])
+    history = apply_extra_credit(history, daily_target)
+    decayed_prefix = np.cumsum(history * np.power(ratio, np.arange(lookback + 1)))
+
+    past_part = np.where(
+        days_ahead <= lookback,
+        np.power(ratio, days_ahead) * decayed_prefix[np.clip(lookback - days_ahead, 0, lookback)],
+        0.0,
+    )
+    future_weight = (1.0 - np.power(ratio, np.minimum(days_ahead, lookback + 1))) / (1.0 - ratio)
+    future_eff = apply_extra_credit(mults * daily_target, daily_target)
+
+    ewa = (past_part[None, :] + np.outer(future_eff, future_weight)) / window_total_weight(half_life_days)
+    if daily_target > 0:
+        scores = ewa / daily_target * 100
+    else:
+        scores = np.zeros_like(ewa)
+    return pd.DataFrame(scores, index=list(multipliers), columns=list(intervals))
@@ -0,0 +1,121 @@
+import json
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from scoring.score_engine import (
+    _day_ordinals,
+    apply_extra_credit,
+    get_grade,
+    window_days,
+    window_total_weight,
+)
+
+
+class ScoreState:
+    """
+    The current score of one workout type, kept up to date one log at a time.
+
+    Holds the daily amounts of the scoring window (the last logged day and the
+    ceil(2 * half_life) days before it) in a ring buffer indexed by day ordinal,
+    plus their extra-credit, half-life weighted sum. A log on the last day or a
+    backdated log inside the window costs O(1); a log on a later day slides the
+    window forward in O(days skipped), never more than the window length.
+    Matches compute_current_scores for the same logs.
+    """
+
+    def __init__(self, half_life_days: float, daily_target: float):
+        self.half_life_days = float(half_life_days)
+        self.daily_target = float(daily_target)
+        self.window = int(window_days(self.half_life_days)) + 1
+        self.ratio = 2.0 ** (-1.0 / self.half_life_days)
+        self.last_day: Optional[int] = None  # days since epoch
+        self.amounts = np.zeros(self.window)  # amounts[day % window]
+        self.weighted_sum = 0.0
+
+    @classmethod
+    def from_daily_totals(cls, type_df: pd.DataFrame, half_life_days: float, daily_target: float) -> "ScoreState":
+        """State for one type's [date, amount] (or compact [day, amount]) rows."""
+        state = cls(half_life_days, daily_target)
+        if not type_df.empty:
+            days = _day_ordinals(type_df)
+            last_day = int(days.max())
+            in_window = days > last_day - state.window
+            state.last_day = last_day
+            np.add.at(state.amounts, days[in_window] % state.window, type_df["amount"].to_numpy(dtype=float)[in_window])
+            state._recompute()
+        return state
+
+    def add(self, day: int, amount: float) -> None:
+        """Applies one log of `amount` on `day` (days since epoch)."""
+        day = int(day)
+        if self.last_day is None:
+            self.last_day = day
+        if day > self.last_day:
+            self._advance(day)
+        offset = self.last_day - day
+        if offset >= self.window:
+            return  # too old to count towards the current score
+        slot = day % self.window
+        before = self._effective(self.amounts[slot])
+        self.amounts[slot] += amount
+        self.weighted_sum += (self._effective(self.amounts[slot]) - before) * self.ratio ** offset
+
+    @property
+    def ewa(self) -> float:
+        if self.last_day is None:
+            return 0.0
+        return float(self.weighted_sum / window_total_weight(self.half_life_days))
+
+    @property
+    def score_pct(self) -> float:
+        return self.ewa * 100.0 / self.daily_target if self.daily_target > 0 else 0.0
+
+    @property
+    def grade(self) -> str:
+        return get_grade(self.score_pct)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "half_life_days": self.half_life_days,
+            "daily_target": self.daily_target,
+            "last_day": self.last_day,
+            "amounts": self.amounts.tolist(),
+        })
+
+    @classmethod
+    def from_json(cls, text: str) -> "ScoreState":
+        data = json.loads(text)
+        state = cls(data["half_life_days"], data["daily_target"])
+        state.last_day = data["last_day"]
+        state.amounts = np.asarray(data["amounts"], dtype=float)
+        state._recompute()  # also clears any rounding drift from the incremental updates
+        return state
+
+    def _advance(self, day: int) -> None:
+        """Moves the window so it ends on `day`, dropping the days that fall out of it."""
+        skipped = day - self.last_day
+        if skipped >= self.window:
+            self.amounts[:] = 0.0
+            self.weighted_sum = 0.0
+        else:
+            # the days leaving the window share their slots with the days entering it
+            leaving = np.arange(self.last_day + 1, day + 1) - self.window
+            slots = leaving % self.window
+            ages = self.last_day - leaving
+            self.weighted_sum -= float(np.sum(self._effective(self.amounts[slots]) * self.ratio ** ages))
+            self.amounts[slots] = 0.0
+            self.weighted_sum *= self.ratio ** skipped
+        self.last_day = day
+
+    def _recompute(self) -> None:
+        if self.last_day is None:
+            self.weighted_sum = 0.0
+            return
+        # slot s holds the day in the window with day % window == s
+        ages = (self.last_day - np.arange(self.window)) % self.window
+        self.weighted_sum = float(np.sum(self._effective(self.amounts) * self.ratio ** ages))
+
+    def _effective(self, amounts):
+        return apply_extra_credit(amounts, self.daily_target)
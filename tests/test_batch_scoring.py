@@ -0,0 +1,127 @@
+# tests/test_batch_scoring.py
+import os
+import sqlite3
+import tempfile
+import unittest
+from contextlib import closing
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+
+from benchmarks.synthetic_ledger import synthetic_ledger, synthetic_workout_types
+from dao.sqlite_backend import SQLiteBackend
+from dao.storage import SQLITE_PATH_ENV, STORAGE_BACKEND_ENV, get_storage_backend
+from scoring.batch_scoring import DEFAULT_USER, batch_score, main, partition_by_user, write_back
+from scoring.score_engine import compute_current_scores, daily_totals, score_series
+
+AS_OF = pd.Timestamp("2025-01-01")
+
+
+def multi_user_ledger(n_users: int, workout_types: list) -> pd.DataFrame:
+    return pd.concat([
+        synthetic_ledger(workout_types, years=0.5, logs_per_day=1.0, seed=user).assign(user_id=f"user_{user}")
+        for user in range(n_users)
+    ], ignore_index=True)
+
+
+class TestBatchScoring(unittest.TestCase):
+    def setUp(self) -> None:
+        self.workout_types = synthetic_workout_types(3)
+        self.ledger = multi_user_ledger(3, self.workout_types)
+
+    def test_matches_single_user_scoring(self) -> None:
+        current, history = batch_score(self.ledger, self.workout_types, as_of=AS_OF, workers=1)
+
+        self.assertEqual(len(current), 3 * 3)
+        user_ledger = self.ledger[self.ledger["user_id"] == "user_1"].drop(columns="user_id")
+        expected = compute_current_scores(user_ledger, self.workout_types)
+        got = current[current["user_id"] == "user_1"].reset_index(drop=True)
+        pd.testing.assert_series_equal(got["score_pct"], expected["score_pct"])
+
+        wt = self.workout_types[2]
+        subset = daily_totals(user_ledger)
+        subset = subset[subset["workout_type"] == wt["workout_type"]]
+        expected_series = score_series(
+            subset, wt["half_life_days"], wt["daily_target"], subset["date"].min(), AS_OF, last_date=AS_OF
+        )
+        got_series = history[(history["user_id"] == "user_1") & (history["workout_type"] == wt["workout_type"])]
+        self.assertEqual(list(got_series["date"]), list(expected_series["date"]))
+        self.assertEqual(got_series["date"].max(), AS_OF)
+        for got_score, expected_score in zip(got_series["score_pct"], expected_series["score"]):
+            self.assertAlmostEqual(got_score, expected_score, places=9)
+
+    def test_process_pool_gives_the_same_result(self) -> None:
+        serial = batch_score(self.ledger, self.workout_types, as_of=AS_OF, history_days=30, workers=1)
+        parallel = batch_score(self.ledger, self.workout_types, as_of=AS_OF, history_days=30, workers=2)
+
+        for serial_df, parallel_df in zip(serial, parallel):
+            key = [c for c in ("user_id", "workout_type", "date") if c in serial_df.columns]
+            pd.testing.assert_frame_equal(
+                serial_df.sort_values(key, ignore_index=True), parallel_df.sort_values(key, ignore_index=True)
+            )
+        self.assertEqual(len(serial[1]), 3 * 3 * 30)
+
+    def test_shared_and_per_user_workout_types(self) -> None:
+        ledger = self.ledger.drop(columns="user_id")
+        partitions = partition_by_user(ledger, self.workout_types)
+        self.assertEqual([user for user, _, _ in partitions], [DEFAULT_USER])
+
+        extra = {**self.workout_types[0], "workout_type": "yoga", "user_id": "user_2"}
+        types = pd.DataFrame(self.workout_types + [extra])
+        partitions = {user: wtypes for user, wtypes, _ in partition_by_user(self.ledger, types)}
+        self.assertEqual(len(partitions["user_0"]), 3)
+        self.assertEqual([wt["workout_type"] for wt in partitions["user_2"]][-1], "yoga")
+
+    def test_main_writes_parquet_results(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            ledger_path = os.path.join(tmpdir, "ledger.parquet")
+            types_path = os.path.join(tmpdir, "types.csv")
+            self.ledger.to_parquet(ledger_path)
+            pd.DataFrame(self.workout_types).to_csv(types_path, index=False)
+            output_dir = os.path.join(tmpdir, "scores")
+
+            main(["--ledger", ledger_path, "--workout-types", types_path, "--output-dir", output_dir,
+                  "--as-of", "2025-01-01", "--history-days", "7", "--workers", "1"])
+
+            self.assertEqual(len(pd.read_parquet(os.path.join(output_dir, "current_scores.parquet"))), 9)
+            self.assertEqual(len(pd.read_parquet(os.path.join(output_dir, "score_history.parquet"))), 9 * 7)
+
+    def test_main_writes_back_to_storage(self) -> None:
+        self._assert_write_back_matches_refresh()
+
+    def test_write_back_skips_days_before_first_log(self) -> None:
+        # history reaching back before the first log scores days refresh_score_history never stores
+        span = (self.ledger["date"].max() - self.ledger["date"].min()).days
+        self._assert_write_back_matches_refresh("--history-days", str(span + 30))
+
+    def _assert_write_back_matches_refresh(self, *args: str) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "fitness.sqlite")
+            backend = SQLiteBackend(path)
+            backend.bootstrap()
+            backend.create_workout_types(self.workout_types)
+            ledger = self.ledger[self.ledger["user_id"] == "user_0"].drop(columns="user_id")
+            backend.log_workouts(ledger.assign(date=ledger["date"].dt.date).to_dict("records"))
+            expected = backend.read_score_history()
+            with closing(sqlite3.connect(path)) as conn, conn:
+                conn.execute("DELETE FROM score_history")
+
+            get_storage_backend.cache_clear()
+            try:
+                with patch.dict(os.environ, {STORAGE_BACKEND_ENV: "sqlite", SQLITE_PATH_ENV: path}):
+                    main(["--output-dir", os.path.join(tmpdir, "scores"), "--write-back",
+                          "--as-of", ledger["date"].max().date().isoformat(), "--workers", "1", *args])
+            finally:
+                get_storage_backend.cache_clear()
+
+            # the same rows refresh_score_history stores: each type's first through last logged day
+            pd.testing.assert_frame_equal(backend.read_score_history(), expected)
+
+    def test_write_back_is_single_user(self) -> None:
+        _, history = batch_score(self.ledger, self.workout_types, as_of=AS_OF, history_days=7, workers=1)
+        with self.assertRaises(ValueError):
+            write_back(history, self.ledger, MagicMock())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+# tests/test_benchmarks.py
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+
+import pandas as pd
+
+from benchmarks.bench_scoring import compare, main
+from benchmarks.synthetic_ledger import DEFAULT_END_DATE, synthetic_ledger, synthetic_workout_types
+
+
+class TestSyntheticLedger(unittest.TestCase):
+    def test_workout_types_cycle_half_lives(self) -> None:
+        types = synthetic_workout_types(5, half_lives=(3.0, 14.0))
+        self.assertEqual([wt["workout_type"] for wt in types], ["type_00", "type_01", "type_02", "type_03", "type_04"])
+        self.assertEqual([wt["half_life_days"] for wt in types], [3.0, 14.0, 3.0, 14.0, 3.0])
+
+    def test_ledger_is_deterministic(self) -> None:
+        types = synthetic_workout_types(3)
+        ledger = synthetic_ledger(types, years=1, logs_per_day=2.0)
+
+        pd.testing.assert_frame_equal(ledger, synthetic_ledger(types, years=1, logs_per_day=2.0))
+        self.assertFalse(ledger.equals(synthetic_ledger(types, years=1, logs_per_day=2.0, seed=1)))
+        self.assertEqual(list(ledger.columns), ["workout_type", "date", "amount", "unit"])
+        self.assertEqual(ledger["date"].max(), pd.Timestamp(DEFAULT_END_DATE))
+        self.assertAlmostEqual(len(ledger) / (3 * 365), 2.0, delta=0.2)
+        # a day's total averages the daily target
+        daily = ledger.groupby(["workout_type", "date"])["amount"].sum().groupby("workout_type").sum() / 365
+        targets = {wt["workout_type"]: wt["daily_target"] for wt in types}
+        for wtype, mean_total in daily.items():
+            self.assertAlmostEqual(mean_total / targets[wtype], 1.0, delta=0.15)
+
+
+class TestBenchScoring(unittest.TestCase):
+    def test_main_writes_report_and_compares_to_baseline(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output = os.path.join(tmpdir, "bench.json")
+            args = ["--types", "2", "--years", "0.5", "--logs-per-day", "1", "--repeat", "1",
+                    "--benchmarks", "current_scores", "--output", output]
+            with redirect_stdout(StringIO()):
+                self.assertEqual(main(args), 0)
+            with open(output) as f:
+                report = json.load(f)
+
+        [result] = report["results"]
+        self.assertEqual((result["size"], result["benchmark"], result["n_types"]), ("custom", "current_scores", 2))
+        self.assertGreater(result["median_seconds"], 0.0)
+
+        slower = {"results": [dict(result, median_seconds=result["median_seconds"] * 2)]}
+        with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+            self.assertEqual(compare(slower, report, tolerance=1.25), [("custom", "current_scores", 2.0)])
+            self.assertEqual(compare(report, slower, tolerance=1.25), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+# tests/test_downsample.py
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from scoring.downsample import downsample_series, lttb_indices
+
+
+class TestDownsample(unittest.TestCase):
+    def test_lttb_keeps_endpoints_and_peaks(self) -> None:
+        x = np.arange(1000)
+        y = np.zeros(1000)
+        y[337] = 100.0  # a lone spike must survive
+        y[712] = -50.0  # and a lone dip
+
+        picked = lttb_indices(x, y, 50)
+
+        self.assertEqual(len(picked), 50)
+        self.assertEqual(picked[0], 0)
+        self.assertEqual(picked[-1], 999)
+        self.assertTrue(np.all(np.diff(picked) > 0))
+        self.assertIn(337, picked)
+        self.assertIn(712, picked)
+
+    def test_lttb_short_input_unchanged(self) -> None:
+        np.testing.assert_array_equal(lttb_indices([1, 2, 3], [4, 5, 6], 10), [0, 1, 2])
+
+    def test_downsample_series_per_category(self) -> None:
+        dates = pd.date_range("2020-01-01", periods=2000, freq="D")
+        df = pd.DataFrame({
+            "date": dates,
+            "score": np.sin(np.arange(2000) / 50.0) * 40 + 50,
+            "category": ["Historical"] * 1970 + ["Projected"] * 30,
+        })
+
+        small = downsample_series(df, max_points=200)
+
+        self.assertLessEqual(len(small), 200)
+        self.assertEqual(small["date"].iloc[0], dates[0])
+        self.assertEqual(small["date"].iloc[-1], dates[-1])
+        # both lines keep their ends, so they still meet
+        projected = small[small["category"] == "Projected"]
+        self.assertEqual(projected["date"].iloc[0], dates[1970])
+        self.assertEqual(small[small["category"] == "Historical"]["date"].iloc[-1], dates[1969])
+
+    def test_downsample_series_within_budget_is_unchanged(self) -> None:
+        df = pd.DataFrame({"date": pd.date_range("2025-01-01", periods=10), "score": range(10), "category": "Historical"})
+        self.assertIs(downsample_series(df, max_points=10), df)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,268 @@
+# tests/test_ledger_mirror.py
+import os
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import patch, MagicMock
+
+import pyarrow as pa
+
+import dao.workout_dao
+from dao.refresh_queue import RefreshQueue
+from dao.ledger_mirror import LedgerMirror, LEDGER_ARROW_SCHEMA, LEDGER_TABLE_ARROW_SCHEMA, MAX_SEGMENTS
+
+# workout_types as read_workout_types returns them, for the DAO tests
+WTYPES = [
+    {"workout_type_id": 1, "workout_type": "pushups", "unit": "reps"},
+    {"workout_type_id": 2, "workout_type": "running", "unit": "miles"},
+]
+
+
+def ledger_table(rows: list) -> pa.Table:
+    return pa.Table.from_pylist(rows, schema=LEDGER_ARROW_SCHEMA)
+
+
+def ledger_batches(rows: list) -> list:
+    """Query result (id-keyed ledger rows) as streamed pages of at most two rows."""
+    ids = {wt["workout_type"]: wt["workout_type_id"] for wt in WTYPES}
+    table_rows = [{"workout_type_id": ids[r["workout_type"]], "date": r["date"], "amount": r["amount"]} for r in rows]
+    return pa.Table.from_pylist(table_rows, schema=LEDGER_TABLE_ARROW_SCHEMA).to_batches(max_chunksize=2)
+
+
+class FakeLedger:
+    """In-memory stand-in for the BigQuery ledger; records each 'since' it was queried with."""
+
+    def __init__(self, rows: list):
+        self.rows = list(rows)
+        self.calls = []
+
+    def fetch(self, since):
+        self.calls.append(since)
+        return ledger_table([r for r in self.rows if since is None or r["date"] >= since])
+
+
+def row(workout_type: str, day: date, amount: float) -> dict:
+    return {"workout_type": workout_type, "date": day, "amount": amount, "unit": "reps"}
+
+
+class TestLedgerMirror(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "mirror", "ledger")
+        dao.workout_dao._ledger_cache.invalidate()
+        # no background refresh of derived tables
+        patcher = patch("dao.workout_dao.get_refresh_queue", return_value=RefreshQueue())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_cold_start_fetches_everything(self) -> None:
+        ledger = FakeLedger([row("pushups", date(2025, 4, 1), 10.0), row("pushups", date(2025, 4, 3), 5.0)])
+        mirror = LedgerMirror(self.path)
+
+        self.assertTrue(mirror.sync(ledger.fetch))
+
+        self.assertEqual(ledger.calls, [None])
+        self.assertEqual(mirror.read().num_rows, 2)
+        self.assertEqual(mirror.watermark(), date(2025, 4, 3))
+
+    def test_incremental_sync_only_fetches_from_watermark(self) -> None:
+        ledger = FakeLedger([row("pushups", date(2025, 4, 1), 10.0), row("pushups", date(2025, 4, 3), 5.0)])
+        LedgerMirror(self.path).sync(ledger.fetch)
+
+        # Same-day append plus a newer day
+        ledger.rows += [row("pushups", date(2025, 4, 3), 7.0), row("running", date(2025, 4, 4), 2.0)]
+        mirror = LedgerMirror(self.path)  # fresh process: watermark comes from the files
+        mirror.sync(ledger.fetch)
+        table = mirror.read()
+
+        self.assertEqual(ledger.calls, [None, date(2025, 4, 3)])
+        self.assertEqual(table.num_rows, 4)
+        self.assertEqual(sorted(table["amount"].to_pylist()), [2.0, 5.0, 7.0, 10.0])
+        self.assertEqual(mirror.watermark(), date(2025, 4, 4))
+
+    def test_backdated_write_lowers_next_sync(self) -> None:
+        ledger = FakeLedger([row("pushups", date(2025, 4, 1), 10.0), row("pushups", date(2025, 4, 3), 5.0)])
+        mirror = LedgerMirror(self.path)
+        mirror.sync(ledger.fetch)
+
+        ledger.rows.append(row("pushups", date(2025, 4, 2), 3.0))
+        mirror.note_write(date(2025, 4, 2))
+        mirror.sync(ledger.fetch)
+
+        self.assertEqual(ledger.calls[-1], date(2025, 4, 2))
+        self.assertEqual(sorted(mirror.read()["amount"].to_pylist()), [3.0, 5.0, 10.0])
+
+    def test_sync_streams_fetched_batches(self) -> None:
+        ledger = FakeLedger([row("pushups", date(2025, 4, d), float(d)) for d in range(1, 8)])
+        mirror = LedgerMirror(self.path)
+        mirror.sync(lambda since: ledger.fetch(since).to_batches(max_chunksize=3))
+
+        ledger.rows.append(row("running", date(2025, 4, 9), 2.0))
+        mirror.sync(lambda since: iter(ledger.fetch(since).to_batches(max_chunksize=3)))
+
+        self.assertEqual(ledger.calls, [None, date(2025, 4, 7)])
+        self.assertEqual(sum(batch.num_rows for batch in mirror.iter_batches(batch_size=4)), 8)
+        self.assertEqual(mirror.watermark(), date(2025, 4, 9))
+
+    def test_read_before_sync_is_empty(self) -> None:
+        mirror = LedgerMirror(self.path)
+        self.assertEqual(mirror.read().num_rows, 0)
+        self.assertIsNone(mirror.watermark())
+
+    def test_sync_appends_a_segment_and_keeps_the_rest(self) -> None:
+        ledger = FakeLedger([row("pushups", date(2025, 4, d), float(d)) for d in range(1, 8)])
+        mirror = LedgerMirror(self.path)
+        mirror.sync(ledger.fetch)
+        first = os.path.join(self.path, "segment-00000000.parquet")
+        written = os.stat(first).st_mtime_ns
+
+        ledger.rows.append(row("pushups", date(2025, 4, 7), 1.0))
+        mirror.sync(ledger.fetch)
+
+        # the first segment's 04-07 row is superseded by the new segment's, not rewritten
+        self.assertEqual(os.stat(first).st_mtime_ns, written)
+        self.assertEqual(sorted(os.listdir(self.path)), ["segment-00000000.parquet", "segment-00000001.parquet"])
+        self.assertEqual(sorted(mirror.read()["amount"].to_pylist()), [1.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0])
+
+        # a later sync from the same day replaces the second segment
+        mirror.sync(ledger.fetch)
+        self.assertEqual(sorted(os.listdir(self.path)), ["segment-00000000.parquet", "segment-00000002.parquet"])
+        self.assertEqual(mirror.read().num_rows, 8)
+
+    def test_empty_fetch_writes_nothing(self) -> None:
+        ledger = FakeLedger([row("pushups", date(2025, 4, 1), 10.0)])
+        mirror = LedgerMirror(self.path)
+        mirror.sync(ledger.fetch)
+
+        self.assertFalse(mirror.sync(lambda since: ledger_table([])))
+        self.assertEqual(os.listdir(self.path), ["segment-00000000.parquet"])
+        self.assertEqual(mirror.read().num_rows, 1)
+
+    def test_segments_are_compacted(self) -> None:
+        ledger = FakeLedger([])
+        mirror = LedgerMirror(self.path)
+        for day in range(1, MAX_SEGMENTS + 3):
+            ledger.rows.append(row("pushups", date(2025, 4, day), float(day)))
+            mirror.sync(ledger.fetch)
+
+        self.assertLessEqual(len(os.listdir(self.path)), MAX_SEGMENTS)
+        self.assertEqual(sorted(mirror.read()["amount"].to_pylist()), [float(d) for d in range(1, MAX_SEGMENTS + 3)])
+        self.assertEqual(mirror.watermark(), date(2025, 4, MAX_SEGMENTS + 2))
+
+    def test_sync_throttled_by_ttl_and_fingerprint(self) -> None:
+        ledger = FakeLedger([row("pushups", date(2025, 4, 1), 10.0)])
+        fingerprint = MagicMock(return_value="v1")
+        mirror = LedgerMirror(self.path, ttl_seconds=60)
+        mirror.sync(ledger.fetch, fingerprint=fingerprint)
+
+        mirror.sync(ledger.fetch, fingerprint=fingerprint)  # within the TTL: not even the fingerprint
+        self.assertEqual(fingerprint.call_count, 1)
+
+        mirror.ttl_seconds = 0
+        mirror.sync(ledger.fetch, fingerprint=fingerprint)  # expired, but the table is unchanged
+        self.assertEqual(ledger.calls, [None])
+
+        fingerprint.return_value = "v2"
+        mirror.sync(ledger.fetch, fingerprint=fingerprint)
+        self.assertEqual(ledger.calls, [None, date(2025, 4, 1)])
+
+        mirror.ttl_seconds = 60
+        mirror.note_write(date(2025, 3, 30))  # our own write always syncs
+        mirror.sync(ledger.fetch, fingerprint=fingerprint)
+        self.assertEqual(ledger.calls[-1], date(2025, 3, 30))
+
+    def test_single_file_mirror_replaced(self) -> None:
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "wb") as f:
+            f.write(b"an older version's mirror file")
+        mirror = LedgerMirror(self.path)
+        self.assertIsNone(mirror.watermark())
+
+        mirror.sync(FakeLedger([row("pushups", date(2025, 4, 1), 10.0)]).fetch)
+        self.assertEqual(mirror.read().num_rows, 1)
+
+    def test_file_with_other_schema_resyncs_in_full(self) -> None:
+        LedgerMirror(self.path).sync(lambda since: [ledger_table([row("pushups", date(2025, 4, 1), 10.0)]).to_batches()[0]])
+
+        mirror = LedgerMirror(self.path, schema=LEDGER_TABLE_ARROW_SCHEMA)
+        self.assertIsNone(mirror.watermark())  # the old file's rows can't be trusted as a base
+        mirror.sync(lambda since: ledger_batches([row("running", date(2025, 4, 3), 2.0)]))
+        self.assertEqual(mirror.read().to_pylist(), [{"workout_type_id": 2, "date": date(2025, 4, 3), "amount": 2.0}])
+
+    def test_new_ledger_generation_resyncs_in_full(self) -> None:
+        ledger = FakeLedger([row("pushups", date(2025, 4, 1), 10.0), row("pushups", date(2025, 4, 5), 5.0)])
+        generation = MagicMock(return_value="1")
+        mirror = LedgerMirror(self.path)
+        mirror.sync(ledger.fetch, generation=generation)
+        mirror.sync(ledger.fetch, generation=generation)
+        self.assertEqual(ledger.calls, [None, date(2025, 4, 5)])
+
+        # a backfill made a row before the watermark visible
+        ledger.rows.append(row("running", date(2025, 4, 2), 2.0))
+        generation.return_value = "2"
+        mirror.sync(ledger.fetch, generation=generation)
+        self.assertEqual(ledger.calls[-1], None)
+        self.assertEqual(mirror.read().num_rows, 3)
+        self.assertEqual(mirror.watermark("2"), date(2025, 4, 5))
+
+        # segments of a version that did not record a generation are not trusted either
+        legacy = LedgerMirror(os.path.join(self.tmpdir.name, "legacy"))
+        legacy.sync(ledger.fetch)
+        self.assertIsNone(legacy.watermark("2"))
+
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_ledger_mirror")
+    @patch("dao.workout_dao.get_bq_client")
+    def test_read_workouts_served_from_mirror(self, mock_get_client: MagicMock, mock_get_mirror: MagicMock, _types: MagicMock) -> None:
+        from dao.workout_dao import read_workouts
+
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.query.return_value.result.return_value.to_arrow_iterable.return_value = ledger_batches([
+            row("pushups", date(2025, 4, 1), 10.0),
+            row("running", date(2025, 4, 3), 2.0),
+        ])
+        mock_get_mirror.return_value = LedgerMirror(self.path, schema=LEDGER_TABLE_ARROW_SCHEMA)
+
+        df = read_workouts("pushups")
+
+        self.assertEqual(len(df), 1)
+        self.assertEqual(df.loc[0, "amount"], 10.0)
+        self.assertEqual(df.loc[0, "unit"], "reps")
+        mock_client.query.return_value.to_dataframe.assert_not_called()
+
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_ledger_mirror")
+    @patch("dao.workout_dao.get_bq_client")
+    def test_read_daily_totals_served_from_mirror(self, mock_get_client: MagicMock, mock_get_mirror: MagicMock, _types: MagicMock) -> None:
+        from dao.workout_dao import read_daily_totals
+
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.query.return_value.result.return_value.to_arrow_iterable.return_value = ledger_batches([
+            row("pushups", date(2025, 4, 1), 10.0),
+            row("pushups", date(2025, 4, 1), 15.0),
+            row("pushups", date(2025, 4, 2), 5.0),
+            row("running", date(2025, 4, 3), 2.0),
+        ])
+        mock_get_mirror.return_value = LedgerMirror(self.path, schema=LEDGER_TABLE_ARROW_SCHEMA)
+
+        df = read_daily_totals(types=["pushups"], end=date(2025, 4, 1))
+
+        self.assertEqual(len(df), 1)
+        self.assertEqual(df.loc[0, "amount"], 25.0)
+        self.assertEqual(str(df["date"].dtype), "datetime64[ns]")
+
+        # a page of the same range comes from the shared cache: no sync, no query
+        mock_get_mirror.return_value = MagicMock()
+        page = read_daily_totals(types=["pushups"], end=date(2025, 4, 1), limit=1)
+        self.assertEqual(page.loc[0, "amount"], 25.0)
+        self.assertEqual(mock_client.query.call_count, 1)
+        mock_get_mirror.return_value.sync.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+# tests/test_query_metrics.py
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+
+import pandas as pd
+
+import dao.query_metrics
+from dao.refresh_queue import RefreshQueue
+from dao.query_metrics import (
+    RingBufferSink,
+    get_metrics_sink,
+    instrumented,
+    page_label,
+    set_metrics_sink,
+)
+from dao.storage import fetch_concurrently
+
+
+class TestQueryMetrics(unittest.TestCase):
+    def setUp(self) -> None:
+        self.previous_sink = get_metrics_sink()
+        self.sink = RingBufferSink(capacity=3)
+        set_metrics_sink(self.sink)
+        # no background refresh of derived tables
+        patcher = patch("dao.workout_dao.get_refresh_queue", return_value=RefreshQueue())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        set_metrics_sink(self.previous_sink)
+
+    def test_instrumented_records_job_statistics(self) -> None:
+        job = MagicMock(total_bytes_processed=2048, slot_millis=150, cache_hit=False, job_id="job_1")
+        with page_label("Workout_Scores"):
+            with instrumented("read_daily_totals") as measurement:
+                measurement.record_job(job, rows=12)
+
+        [metric] = self.sink.records()
+        self.assertEqual(metric["operation"], "read_daily_totals")
+        self.assertEqual(metric["page"], "Workout_Scores")
+        self.assertEqual(
+            (metric["rows"], metric["bytes_processed"], metric["slot_millis"], metric["cache_hit"], metric["job_id"]),
+            (12, 2048, 150, False, "job_1"),
+        )
+        self.assertGreaterEqual(metric["wall_seconds"], 0.0)
+        self.assertIsNone(metric["error"])
+
+    def test_instrumented_records_failures(self) -> None:
+        with self.assertRaises(ValueError):
+            with instrumented("log_workouts"):
+                raise ValueError("boom")
+
+        [metric] = self.sink.records()
+        self.assertEqual(metric["page"], dao.query_metrics.NO_PAGE)
+        self.assertIn("boom", metric["error"])
+        self.assertIsNone(metric["bytes_processed"])
+
+    def test_ring_buffer_keeps_recent_records_and_all_totals(self) -> None:
+        for rows in range(5):
+            with instrumented("read_workouts") as measurement:
+                measurement.rows = rows
+
+        self.assertEqual([m["rows"] for m in self.sink.records()], [2, 3, 4])
+        totals = self.sink.totals()[("read_workouts", dao.query_metrics.NO_PAGE)]
+        self.assertEqual((totals["calls"], totals["rows"]), (5, 10))
+        self.assertEqual(len(json.loads(self.sink.to_json())), 3)
+        self.assertIn(
+            'fitness_dao_calls_total{operation="read_workouts",page="background"} 5',
+            self.sink.to_prometheus(),
+        )
+
+    def test_page_label_follows_fetch_concurrently(self) -> None:
+        def read() -> int:
+            with instrumented("read_workout_types"):
+                return 1
+
+        with page_label("Log_Workout"):
+            fetch_concurrently(a=read, b=read)
+
+        self.assertEqual([m["page"] for m in self.sink.records()], ["Log_Workout", "Log_Workout"])
+
+    @patch("dao.workout_dao.get_bq_client")
+    def test_dao_queries_are_instrumented(self, mock_get_client: MagicMock) -> None:
+        from dao.workout_dao import read_daily_totals
+
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_job = mock_client.query.return_value
+        mock_job.total_bytes_processed = 10_485_760
+        mock_job.slot_millis = 42
+        mock_job.cache_hit = True
+        mock_job.to_dataframe.return_value = pd.DataFrame(
+            [{"workout_type": "pushups", "date": "2025-04-07", "amount": 40}]
+        )
+
+        read_daily_totals()
+
+        [metric] = self.sink.records()
+        self.assertEqual(metric["operation"], "read_daily_totals")
+        self.assertEqual((metric["rows"], metric["bytes_processed"], metric["cache_hit"]), (1, 10_485_760, True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+# tests/test_refresh_queue.py
+import threading
+import unittest
+from datetime import date
+from unittest.mock import MagicMock
+
+from dao.refresh_queue import RefreshQueue
+
+
+class TestRefreshQueue(unittest.TestCase):
+    def test_flush_coalesces_marks(self) -> None:
+        queue = RefreshQueue()
+        queue.mark([1], date(2025, 4, 7), date(2025, 4, 7))
+        queue.mark([1, 2], date(2025, 4, 5), date(2025, 4, 6))
+        refresh = MagicMock()
+
+        self.assertEqual(queue.flush(refresh), 2)
+
+        refresh.assert_called_once_with({
+            1: (date(2025, 4, 5), date(2025, 4, 7)),
+            2: (date(2025, 4, 5), date(2025, 4, 6)),
+        })
+        self.assertEqual(queue.stale_since(), {})
+        self.assertEqual(queue.flush(refresh), 0)
+        refresh.assert_called_once()
+
+    def test_failed_refresh_stays_marked(self) -> None:
+        queue = RefreshQueue()
+        queue.mark([1], date(2025, 4, 7), date(2025, 4, 7))
+
+        def refresh(ranges: dict) -> None:
+            # marks arriving during a refresh are kept too
+            queue.mark([1], date(2025, 4, 3), date(2025, 4, 3))
+            self.assertEqual(queue.stale_since(), {1: date(2025, 4, 3)})
+            raise RuntimeError("MERGE failed")
+
+        with self.assertRaises(RuntimeError):
+            queue.flush(refresh)
+        self.assertEqual(queue.stale_since(), {1: date(2025, 4, 3)})
+
+    def test_worker_refreshes_in_background(self) -> None:
+        queue = RefreshQueue()
+        refreshed = threading.Event()
+        attempts = []
+
+        def refresh(ranges: dict) -> None:
+            attempts.append(ranges)
+            if len(attempts) == 1:
+                raise RuntimeError("transient")
+            refreshed.set()
+
+        queue.start_worker(refresh, interval_seconds=0.01)
+        try:
+            queue.mark([1], date(2025, 4, 7), date(2025, 4, 7))
+            self.assertTrue(refreshed.wait(5))
+        finally:
+            queue.stop_worker()
+        self.assertEqual(attempts[-1], {1: (date(2025, 4, 7), date(2025, 4, 7))})
+        self.assertEqual(queue.stale_since(), {})
+
+    def test_worker_catches_up_on_lost_marks(self) -> None:
+        queue = RefreshQueue()
+        refreshed = threading.Event()
+        refreshes = []
+        catch_ups = []
+
+        def catch_up() -> dict:
+            catch_ups.append(None)
+            if len(catch_ups) == 1:
+                raise RuntimeError("query failed")
+            return {2: (date(2025, 4, 1), date(2025, 4, 2))}
+
+        def refresh(ranges: dict) -> None:
+            refreshes.append(ranges)
+            refreshed.set()
+
+        queue.start_worker(refresh, interval_seconds=0.01, catch_up=catch_up, catch_up_interval_seconds=0.05)
+        try:
+            self.assertTrue(refreshed.wait(5))
+        finally:
+            queue.stop_worker()
+        self.assertGreaterEqual(len(catch_ups), 2)
+        self.assertEqual(refreshes[0], {2: (date(2025, 4, 1), date(2025, 4, 2))})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,215 @@
+# tests/test_score_engine.py
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from scoring.score_engine import (
+    apply_extra_credit,
+    compact_ledger,
+    compute_current_scores,
+    daily_totals,
+    daily_totals_from_batches,
+    get_grade,
+    get_grades,
+    predict_score_grid,
+    score_series,
+)
+
+
+def reference_ewa(type_df: pd.DataFrame, half_life_days: float, dtarget: float) -> float:
+    """
+    Straightforward per-type EWA, as originally computed in pages/Workout_Scores.py.
+    """
+    if type_df.empty:
+        return 0.0
+    last_date = type_df["date"].max()
+    range_days = int(np.ceil(2.0 * half_life_days))
+    earliest_date = last_date - timedelta(days=range_days)
+    type_df = type_df[type_df["date"] >= earliest_date]
+    all_days = pd.date_range(start=earliest_date, end=last_date, freq="D")
+    type_df = type_df.set_index("date").reindex(all_days, fill_value=0.0)
+    type_df = type_df.rename_axis("date").reset_index()
+    eff = type_df["amount"].apply(
+        lambda a: a if dtarget <= 0 else min(a, dtarget) + 0.5 * max(a - dtarget, 0)
+    )
+    weights = np.power(2.0, -(last_date - type_df["date"]).dt.days / half_life_days)
+    return (eff * weights).sum() / weights.sum()
+
+
+def reference_score_on_day(full_df: pd.DataFrame, the_day: pd.Timestamp, half_life: float, target: float) -> float:
+    """
+    Per-day score, as originally computed by ewa_on_day in pages/Workout_Scores.py.
+    """
+    range_days = int(np.ceil(2.0 * half_life))
+    earliest = the_day - pd.Timedelta(days=range_days)
+    sub = full_df[(full_df["date"] >= earliest) & (full_df["date"] <= the_day)]
+    day_range = pd.date_range(earliest, the_day, freq="D")
+    sub = sub.set_index("date").reindex(day_range, fill_value=0.0).rename_axis("date").reset_index()
+    eff = apply_extra_credit(sub["amount"], target)
+    w = np.power(2.0, -(the_day - sub["date"]).dt.days / half_life)
+    return (eff * w).sum() / w.sum() / target * 100 if target > 0 else 0.0
+
+
+def sample_ledger() -> pd.DataFrame:
+    rows = []
+    start = date(2025, 1, 1)
+    for i in range(120):
+        if i % 3:
+            rows.append({"workout_type": "pushups", "date": start + timedelta(days=i), "amount": 20.0 + i % 7, "unit": "reps"})
+            rows.append({"workout_type": "pushups", "date": start + timedelta(days=i), "amount": 15.0, "unit": "reps"})
+        if i % 5 == 0:
+            rows.append({"workout_type": "running", "date": start + timedelta(days=i), "amount": 3.5, "unit": "miles"})
+    rows.append({"workout_type": "unknown", "date": start, "amount": 1.0, "unit": "x"})
+    return pd.DataFrame(rows)
+
+
+WORKOUT_TYPES = [
+    {"workout_type": "running", "unit": "miles", "is_int": False, "daily_target": 2.0, "half_life_days": 10.5},
+    {"workout_type": "pushups", "unit": "reps", "is_int": True, "daily_target": 30.0, "half_life_days": 14.0},
+    {"workout_type": "yoga", "unit": "minutes", "is_int": True, "daily_target": 20.0, "half_life_days": 7.0},
+]
+
+
+class TestScoreEngine(unittest.TestCase):
+    def test_get_grade(self) -> None:
+        self.assertEqual(get_grade(95.0), "A")
+        self.assertEqual(get_grade(80.0), "B")
+        self.assertEqual(get_grade(70.1), "C")
+        self.assertEqual(get_grade(60.0), "D")
+        self.assertEqual(get_grade(59.9), "F")
+        self.assertEqual(list(get_grades([95.0, 80.0, 70.1, 60.0, 59.9])), ["A", "B", "C", "D", "F"])
+
+    def test_apply_extra_credit(self) -> None:
+        self.assertEqual(apply_extra_credit(10.0, 20.0), 10.0)
+        self.assertEqual(apply_extra_credit(30.0, 20.0), 25.0)
+        self.assertEqual(apply_extra_credit(30.0, 0.0), 30.0)
+        np.testing.assert_allclose(apply_extra_credit([10.0, 30.0], 20.0), [10.0, 25.0])
+
+    def test_compute_current_scores_matches_reference(self) -> None:
+        ledger = sample_ledger()
+        grouped = daily_totals(ledger)
+        scores = compute_current_scores(ledger, WORKOUT_TYPES)
+
+        self.assertEqual(list(scores["workout_type"]), ["running", "pushups", "yoga"])
+        for wt, (_, row) in zip(WORKOUT_TYPES, scores.iterrows()):
+            subset = grouped[grouped["workout_type"] == wt["workout_type"]][["date", "amount"]]
+            expected = reference_ewa(subset, wt["half_life_days"], wt["daily_target"])
+            self.assertAlmostEqual(row["ewa"], expected, places=9)
+            self.assertAlmostEqual(row["score_pct"], expected / wt["daily_target"] * 100, places=7)
+            self.assertEqual(row["grade"], get_grade(row["score_pct"]))
+
+    def test_compute_current_scores_from_batches(self) -> None:
+        ledger = sample_ledger()
+        batches = pa.Table.from_pandas(ledger, preserve_index=False).to_batches(max_chunksize=16)
+        streamed = daily_totals_from_batches(iter(batches))
+
+        expected = daily_totals(ledger)
+        pd.testing.assert_frame_equal(
+            streamed.sort_values(["workout_type", "date"], ignore_index=True),
+            expected.sort_values(["workout_type", "date"], ignore_index=True),
+            check_dtype=False,
+        )
+        pd.testing.assert_frame_equal(
+            compute_current_scores(iter(batches), WORKOUT_TYPES),
+            compute_current_scores(ledger, WORKOUT_TYPES),
+        )
+        self.assertTrue(daily_totals_from_batches([]).empty)
+
+    def test_compact_ledger_scores_like_the_full_frame(self) -> None:
+        ledger = sample_ledger()
+        compact = compact_ledger(ledger)
+        batches = pa.Table.from_pandas(ledger, preserve_index=False).to_batches(max_chunksize=16)
+
+        self.assertEqual(list(compact.columns), ["workout_type", "day", "amount"])
+        self.assertIsInstance(compact["workout_type"].dtype, pd.CategoricalDtype)
+        self.assertEqual(compact["day"].dtype, np.int32)
+        self.assertEqual(compact["amount"].dtype, np.float32)
+        self.assertEqual(compact.loc[0, "day"], (date(2025, 1, 1) - date(1970, 1, 1)).days)
+        pd.testing.assert_frame_equal(compact_ledger(batches), compact, check_categorical=False)
+
+        totals = daily_totals(compact)
+        expected = daily_totals(ledger).sort_values(["workout_type", "date"], ignore_index=True)
+        self.assertEqual(list(totals["workout_type"].astype(str)), list(expected["workout_type"]))
+        self.assertEqual(list(pd.to_datetime(totals["day"].astype("int64"), unit="D")), list(expected["date"]))
+        np.testing.assert_allclose(totals["amount"], expected["amount"])
+
+        pd.testing.assert_frame_equal(
+            compute_current_scores(compact, WORKOUT_TYPES), compute_current_scores(ledger, WORKOUT_TYPES)
+        )
+        pushups = totals[totals["workout_type"] == "pushups"]
+        subset = expected[expected["workout_type"] == "pushups"]
+        start, end = pd.Timestamp("2025-02-01"), pd.Timestamp("2025-06-01")
+        pd.testing.assert_frame_equal(
+            score_series(pushups, 14.0, 30.0, start, end, future_amt=30.0),
+            score_series(subset, 14.0, 30.0, start, end, future_amt=30.0),
+        )
+
+    def test_compute_current_scores_type_without_logs(self) -> None:
+        scores = compute_current_scores(sample_ledger(), WORKOUT_TYPES)
+        yoga = scores[scores["workout_type"] == "yoga"].iloc[0]
+        self.assertEqual(yoga["ewa"], 0.0)
+        self.assertEqual(yoga["grade"], "F")
+
+    def test_compute_current_scores_empty_inputs(self) -> None:
+        self.assertTrue(compute_current_scores(sample_ledger(), []).empty)
+        scores = compute_current_scores(pd.DataFrame(columns=["workout_type", "date", "amount"]), WORKOUT_TYPES)
+        self.assertEqual(list(scores["ewa"]), [0.0, 0.0, 0.0])
+
+    def test_score_series_matches_reference(self) -> None:
+        grouped = daily_totals(sample_ledger())
+        subset = grouped[grouped["workout_type"] == "pushups"][["date", "amount"]]
+        last_date = subset["date"].max()
+        start = subset["date"].min() - pd.Timedelta(days=5)
+        end = last_date + pd.Timedelta(days=12)
+
+        series = score_series(subset, 14.0, 30.0, start, end, future_amt=45.0)
+
+        future_days = pd.date_range(last_date + pd.Timedelta(days=1), end, freq="D")
+        with_future = pd.concat([subset, pd.DataFrame({"date": future_days, "amount": 45.0})], ignore_index=True)
+        expected = [reference_score_on_day(with_future, day, 14.0, 30.0) for day in series["date"]]
+        np.testing.assert_allclose(series["score"], expected, rtol=1e-12, atol=1e-9)
+        self.assertEqual(len(series), (end - start).days + 1)
+        self.assertTrue((series.loc[series["date"] <= last_date, "category"] == "Historical").all())
+        self.assertTrue((series.loc[series["date"] > last_date, "category"] == "Projected").all())
+
+    def test_score_series_without_logs_is_projection(self) -> None:
+        today = pd.Timestamp.today().normalize()
+        empty = pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), "amount": pd.Series(dtype=float)})
+        series = score_series(empty, 7.0, 20.0, today - pd.Timedelta(days=3), today + pd.Timedelta(days=3), 20.0)
+        # no logs => everything up to yesterday is a zero history, projection starts today
+        self.assertEqual(list(series["category"]), ["Historical"] * 3 + ["Projected"] * 4)
+        self.assertEqual(list(series["score"][:3]), [0.0] * 3)
+        self.assertTrue((np.diff(series["score"][3:]) > 0).all())
+
+    def test_predict_score_grid_matches_reference(self) -> None:
+        grouped = daily_totals(sample_ledger())
+        subset = grouped[grouped["workout_type"] == "running"][["date", "amount"]]
+        multipliers = [0.0, 0.5, 1.0, 2.5]
+        intervals = [0, 1, 5, 21, 22, 40]
+
+        grid = predict_score_grid(subset, 10.5, 2.0, multipliers, intervals)
+
+        self.assertEqual(grid.shape, (4, 6))
+        last_date = subset["date"].max()
+        for m in multipliers:
+            for days_ahead in intervals:
+                future_days = pd.date_range(last_date + pd.Timedelta(days=1), periods=days_ahead, freq="D")
+                with_future = pd.concat(
+                    [subset, pd.DataFrame({"date": future_days, "amount": m * 2.0})], ignore_index=True
+                )
+                expected = reference_ewa(with_future, 10.5, 2.0) / 2.0 * 100
+                self.assertAlmostEqual(grid.loc[m, days_ahead], expected, places=9)
+
+    def test_predict_score_grid_without_logs(self) -> None:
+        empty = pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), "amount": pd.Series(dtype=float)})
+        grid = predict_score_grid(empty, 7.0, 20.0, [1.0], [0, 15, 30])
+        self.assertEqual(grid.loc[1.0, 0], 0.0)
+        self.assertAlmostEqual(grid.loc[1.0, 15], 100.0)
+        self.assertAlmostEqual(grid.loc[1.0, 30], 100.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# tests/test_score_state.py
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from scoring.score_engine import compute_current_scores, daily_totals
+from scoring.score_state import ScoreState
+
+EPOCH = date(1970, 1, 1)
+
+
+def day_ordinal(day: date) -> int:
+    return (day - EPOCH).days
+
+
+class TestScoreState(unittest.TestCase):
+    def assert_matches_current_score(self, state: ScoreState, rows: list) -> None:
+        workout_type = {"workout_type": "pushups", "daily_target": state.daily_target, "half_life_days": state.half_life_days}
+        expected = compute_current_scores(pd.DataFrame(rows), [workout_type]).iloc[0]
+        self.assertAlmostEqual(state.ewa, expected["ewa"], places=9)
+        self.assertAlmostEqual(state.score_pct, expected["score_pct"], places=7)
+        self.assertEqual(state.grade, expected["grade"])
+
+    def test_incremental_updates_match_compute_current_scores(self) -> None:
+        rng = np.random.default_rng(7)
+        state = ScoreState(half_life_days=3.5, daily_target=30.0)
+        rows = []
+        day = date(2025, 1, 1)
+        for i in range(200):
+            # mostly forward, some same-day and backdated logs, the odd multi-day gap
+            day += timedelta(days=int(rng.choice([0, 1, 1, 2, 9])))
+            log_day = day - timedelta(days=int(rng.integers(0, 12))) if i % 7 == 0 else day
+            amount = float(rng.gamma(2.0, 15.0))
+            state.add(day_ordinal(log_day), amount)
+            rows.append({"workout_type": "pushups", "date": log_day, "amount": amount})
+            if i % 25 == 0:
+                self.assert_matches_current_score(state, rows)
+        self.assert_matches_current_score(state, rows)
+
+        # rebuilt from daily totals, or round-tripped through JSON: same score
+        totals = daily_totals(pd.DataFrame(rows))
+        self.assertAlmostEqual(ScoreState.from_daily_totals(totals, 3.5, 30.0).ewa, state.ewa, places=9)
+        self.assertAlmostEqual(ScoreState.from_json(state.to_json()).ewa, state.ewa, places=12)
+
+    def test_gap_longer_than_window_resets(self) -> None:
+        state = ScoreState(half_life_days=2.0, daily_target=10.0)
+        state.add(day_ordinal(date(2025, 1, 1)), 50.0)
+        state.add(day_ordinal(date(2025, 3, 1)), 10.0)
+        self.assert_matches_current_score(state, [
+            {"workout_type": "pushups", "date": date(2025, 1, 1), "amount": 50.0},
+            {"workout_type": "pushups", "date": date(2025, 3, 1), "amount": 10.0},
+        ])
+
+    def test_empty_state(self) -> None:
+        state = ScoreState(half_life_days=7.0, daily_target=20.0)
+        self.assertEqual((state.ewa, state.score_pct, state.grade), (0.0, 0.0, "F"))
+        self.assertEqual(ScoreState.from_json(state.to_json()).ewa, 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
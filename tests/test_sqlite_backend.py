@@ -0,0 +1,309 @@
+# tests/test_sqlite_backend.py
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from contextlib import closing
+from datetime import date
+from unittest.mock import call, patch
+
+import pandas as pd
+
+from dao.sqlite_backend import SQLiteBackend
+from scoring.score_engine import compute_current_scores, score_series
+from dao.storage import (
+    BigQueryBackend,
+    fetch_concurrently,
+    get_storage_backend,
+    STORAGE_BACKEND_ENV,
+    SQLITE_PATH_ENV,
+)
+
+
+class TestSQLiteBackend(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.backend = SQLiteBackend(os.path.join(self.tmpdir.name, "data", "fitness.sqlite"))
+        self.assertTrue(self.backend.bootstrap()["ready"])
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def create_types(self, *names: str) -> None:
+        self.backend.create_workout_types([
+            {"workout_type": name, "unit": "x", "is_int": False, "daily_target": 10.0, "half_life_days": 7.0}
+            for name in names
+        ])
+
+    def test_workout_type_lifecycle(self) -> None:
+        self.backend.create_workout_type("yoga", "minutes", True, 20.0, 7.0)
+        self.backend.create_workout_type("pushups", "reps", True, 50.0, 14.0)
+        self.backend.create_workout_type("running", "miles", False, 2.0, 10.0)
+
+        types = self.backend.read_workout_types()
+        self.assertEqual([wt["workout_type"] for wt in types], ["running", "pushups", "yoga"])
+        self.assertIs(types[0]["is_int"], False)
+
+        self.backend.update_workout_type("yoga", "stretching", "minutes", True, 15.0, 5.0)
+        self.backend.delete_workout_type("pushups")
+        types = self.backend.read_workout_types()
+        self.assertEqual([wt["workout_type"] for wt in types], ["running", "stretching"])
+        self.assertEqual(types[1]["daily_target"], 15.0)
+
+    def test_log_and_read(self) -> None:
+        self.create_types("pushups", "running")
+        self.backend.log_workout("pushups", date(2025, 4, 7), 25.0, "reps")
+        errors = self.backend.log_workouts([
+            {"workout_type": "pushups", "date": "2025-04-07", "amount": 10, "unit": "reps"},
+            {"workout_type": "running", "date": date(2025, 4, 8), "amount": 2.5, "unit": "miles"},
+            {"workout_type": "running", "date": "not a date", "amount": 1, "unit": "miles"},
+            {"workout_type": "unknown", "date": "2025-04-08", "amount": 1, "unit": "x"},
+        ])
+        self.assertEqual([e["index"] for e in errors], [2, 3])
+
+        workouts = self.backend.read_workouts()
+        self.assertEqual(len(workouts), 3)
+        self.assertEqual(workouts.loc[0, "date"], date(2025, 4, 8))
+        self.assertEqual(workouts.loc[0, "unit"], "x")  # the type's unit
+        self.assertEqual(len(self.backend.read_workouts("pushups", start=date(2025, 4, 7))), 2)
+
+        totals = self.backend.read_daily_totals()
+        self.assertEqual(list(totals["amount"]), [2.5, 35.0])
+        self.assertEqual(str(totals["date"].dtype), "datetime64[ns]")
+        only_pushups = self.backend.read_daily_totals(types=["pushups"], end=pd.Timestamp("2025-04-07"))
+        self.assertEqual(list(only_pushups["workout_type"]), ["pushups"])
+
+    def test_read_daily_totals_pages(self) -> None:
+        self.create_types("pushups", "running")
+        self.backend.log_workouts([
+            {"workout_type": t, "date": date(2025, 4, d), "amount": 1, "unit": "x"}
+            for d in range(1, 6) for t in ("pushups", "running")
+        ])
+        first = self.backend.read_daily_totals(limit=3)
+        self.assertEqual(
+            list(zip(first["date"].dt.day, first["workout_type"])),
+            [(5, "pushups"), (5, "running"), (4, "pushups")],
+        )
+        last = first.iloc[-1]
+        older = self.backend.read_daily_totals(before_key=(last["date"], last["workout_type"]), limit=3)
+        self.assertEqual(
+            list(zip(older["date"].dt.day, older["workout_type"])),
+            [(4, "running"), (3, "pushups"), (3, "running")],
+        )
+        rest = self.backend.read_daily_totals(types=["running"], before_key=(date(2025, 4, 3), "pushups"))
+        self.assertEqual(list(rest["date"].dt.day), [3, 2, 1])
+
+    def test_iter_ledger_batches(self) -> None:
+        self.create_types("pushups", "running")
+        self.backend.log_workouts([
+            {"workout_type": t, "date": date(2025, 4, d), "amount": d, "unit": "x"}
+            for d in range(1, 11) for t in ("pushups", "running")
+        ])
+        with patch("dao.sqlite_backend.STREAM_BATCH_SIZE", 3):
+            batches = list(self.backend.iter_ledger_batches(types=["pushups"], start=date(2025, 4, 3)))
+        self.assertEqual([batch.num_rows for batch in batches], [3, 3, 2])
+        self.assertEqual(sum(sum(batch["amount"].to_pylist()) for batch in batches), sum(range(3, 11)))
+
+    def assert_current_scores_match_ledger(self) -> None:
+        expected = compute_current_scores(self.backend.read_daily_totals(), self.backend.read_workout_types())
+        pd.testing.assert_frame_equal(self.backend.read_current_scores(), expected, check_exact=False)
+
+    def test_current_scores_from_score_state(self) -> None:
+        self.backend.create_workout_type("pushups", "reps", True, 30.0, 3.0)
+        self.backend.create_workout_type("yoga", "minutes", True, 20.0, 7.0)
+        self.assert_current_scores_match_ledger()
+
+        self.backend.log_workouts([
+            {"workout_type": "pushups", "date": date(2025, 4, d), "amount": 5.0 * d, "unit": "reps"}
+            for d in range(1, 10)
+        ], row_ids=[f"r{d}" for d in range(1, 10)])
+        self.assert_current_scores_match_ledger()
+
+        # a retried batch (same row ids) must not be counted twice, a backdated log is
+        self.backend.log_workouts([{"workout_type": "pushups", "date": "2025-04-09", "amount": 45.0, "unit": "reps"}],
+                                  row_ids=["r9"])
+        self.backend.log_workout("pushups", date(2025, 4, 8), 12.0, "reps")
+        self.assert_current_scores_match_ledger()
+
+        self.backend.update_workout_type("pushups", "pushups", "reps", True, 60.0, 10.0)
+        self.assert_current_scores_match_ledger()
+        self.backend.delete_workout_type("yoga")
+        self.assertEqual(list(self.backend.read_current_scores()["workout_type"]), ["pushups"])
+
+    def test_bootstrap_backfills_derived_tables(self) -> None:
+        self.backend.create_workout_type("pushups", "reps", True, 30.0, 3.0)
+        self.backend.log_workout("pushups", date(2025, 4, 7), 25.0, "reps")
+        with closing(sqlite3.connect(self.backend.path)) as conn, conn:
+            conn.execute("DROP TABLE score_state")
+            conn.execute("DROP TABLE score_history")
+
+        self.backend.bootstrap()
+
+        self.assert_current_scores_match_ledger()
+        self.assertEqual(len(self.backend.read_score_history()), 1)
+
+    def test_read_ledger_compact(self) -> None:
+        self.create_types("pushups", "running")
+        self.backend.log_workouts([
+            {"workout_type": "pushups", "date": date(2025, 4, 7), "amount": 25.0, "unit": "reps"},
+            {"workout_type": "running", "date": date(2025, 4, 8), "amount": 2.5, "unit": "miles"},
+        ])
+        compact = self.backend.read_ledger_compact(types=["running"])
+        self.assertEqual(list(compact.columns), ["workout_type", "day", "amount"])
+        self.assertEqual(list(compact["workout_type"].astype(str)), ["running"])
+        self.assertEqual(compact.loc[0, "day"], (date(2025, 4, 8) - date(1970, 1, 1)).days)
+        self.assertTrue(self.backend.read_ledger_compact(start=date(2026, 1, 1)).empty)
+
+    def test_log_workouts_deduplicates_row_ids(self) -> None:
+        self.create_types("pushups")
+        rows = [{"workout_type": "pushups", "date": "2025-04-07", "amount": 10, "unit": "reps"}]
+        self.backend.log_workouts(rows, row_ids=["abc"])
+        self.backend.log_workouts(rows, row_ids=["abc"])  # retried flush
+        self.assertEqual(len(self.backend.read_workouts()), 1)
+
+    def test_rename_keeps_logs_and_scores(self) -> None:
+        self.backend.create_workout_type("pushups", "reps", True, 30.0, 3.0)
+        self.backend.log_workout("pushups", date(2025, 4, 7), 25.0, "reps")
+        history = self.backend.read_score_history()
+
+        self.backend.update_workout_type("pushups", "press-ups", "reps", True, 30.0, 3.0)
+
+        self.assertEqual(list(self.backend.read_workouts()["workout_type"]), ["press-ups"])
+        self.assertEqual(list(self.backend.read_daily_totals()["amount"]), [25.0])
+        renamed = self.backend.read_score_history()
+        self.assertEqual(list(renamed["workout_type"]), ["press-ups"])
+        self.assertEqual(list(renamed["score"]), list(history["score"]))
+        self.assert_current_scores_match_ledger()
+
+        # a type re-created under a deleted name starts without the old logs
+        self.backend.delete_workout_type("press-ups")
+        self.backend.create_workout_type("press-ups", "reps", True, 30.0, 3.0)
+        self.assertTrue(self.backend.read_workouts().empty)
+
+    def test_bootstrap_migrates_name_keyed_database(self) -> None:
+        path = os.path.join(self.tmpdir.name, "v1.sqlite")
+        with closing(sqlite3.connect(path)) as conn, conn:
+            conn.executescript("""
+                CREATE TABLE workout_types (workout_type TEXT NOT NULL, unit TEXT NOT NULL, is_int INTEGER NOT NULL,
+                                            daily_target REAL NOT NULL, half_life_days REAL NOT NULL);
+                CREATE TABLE ledger (workout_type TEXT NOT NULL, date TEXT NOT NULL, amount REAL NOT NULL,
+                                     unit TEXT NOT NULL, insert_id TEXT UNIQUE);
+                CREATE INDEX ledger_type_date ON ledger (workout_type, date);
+                CREATE TABLE score_state (workout_type TEXT PRIMARY KEY, state TEXT NOT NULL);
+                INSERT INTO workout_types VALUES ('pushups', 'reps', 1, 30.0, 3.0), ('running', 'miles', 0, 2.0, 7.0);
+                INSERT INTO ledger VALUES ('pushups', '2025-04-07', 25.0, 'reps', 'a'),
+                                          ('running', '2025-04-08', 2.5, 'miles', NULL),
+                                          ('deleted', '2025-04-08', 1.0, 'x', NULL);
+            """)
+        backend = SQLiteBackend(path)
+
+        backend.bootstrap()
+        backend.bootstrap()  # already migrated: a no-op
+
+        self.assertEqual(len(backend.read_workouts()), 2)
+        self.assertEqual(list(backend.read_daily_totals()["workout_type"]), ["running", "pushups"])
+        self.assertEqual(len(backend.read_score_history()), 2)
+        backend.log_workouts([{"workout_type": "pushups", "date": "2025-04-07", "amount": 25.0, "unit": "reps"}],
+                             row_ids=["a"])  # insert ids survive the migration
+        self.assertEqual(len(backend.read_workouts("pushups")), 1)
+        with closing(sqlite3.connect(path)) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM ledger").fetchone()[0], 3)  # nothing lost
+        expected = compute_current_scores(backend.read_daily_totals(), backend.read_workout_types())
+        pd.testing.assert_frame_equal(backend.read_current_scores(), expected, check_exact=False)
+
+    def assert_history_matches_score_series(self, workout_type: str, half_life_days: float, daily_target: float) -> None:
+        history = self.backend.read_score_history(types=[workout_type])
+        totals = self.backend.read_daily_totals(types=[workout_type])
+        expected = score_series(totals, half_life_days, daily_target, totals["date"].min(), totals["date"].max())
+        self.assertEqual(list(history["date"]), list(expected["date"]))
+        for stored, computed in zip(history["score"], expected["score"]):
+            self.assertAlmostEqual(stored, computed)
+
+    def test_score_history_kept_current(self) -> None:
+        self.backend.create_workout_type("pushups", "reps", True, 50.0, 3.0)
+        self.backend.log_workouts([
+            {"workout_type": "pushups", "date": date(2025, 4, d), "amount": 10.0 * d, "unit": "reps"}
+            for d in (1, 2, 5, 9)
+        ])
+        self.assert_history_matches_score_series("pushups", 3.0, 50.0)
+        self.assertEqual(len(self.backend.read_score_history(start=date(2025, 4, 3), end=date(2025, 4, 4))), 2)
+
+        # a backdated log rescores the days after it
+        self.backend.log_workout("pushups", date(2025, 4, 3), 80.0, "reps")
+        self.assert_history_matches_score_series("pushups", 3.0, 50.0)
+
+        # a new half-life and target rescore the whole history
+        self.backend.update_workout_type("pushups", "pushups", "reps", True, 40.0, 7.0)
+        self.assert_history_matches_score_series("pushups", 7.0, 40.0)
+        self.assertEqual(self.backend.read_score_history().loc[0, "grade"], "F")
+
+        self.backend.delete_workout_type("pushups")
+        self.assertTrue(self.backend.read_score_history().empty)
+
+    def test_score_history_refresh_reads_only_the_window(self) -> None:
+        self.backend.create_workout_type("pushups", "reps", True, 50.0, 3.0)
+        self.backend.log_workouts([
+            {"workout_type": "pushups", "date": date(2025, 3, d), "amount": 5.0 * d, "unit": "reps"}
+            for d in range(1, 31, 3)
+        ])
+        daily_totals_by_id = self.backend._daily_totals_by_id
+        with patch.object(self.backend, "_daily_totals_by_id", wraps=daily_totals_by_id) as read_totals:
+            self.backend.log_workout("pushups", date(2025, 3, 26), 80.0, "reps")
+
+        # window_days(3.0) == 6 days before the write are enough to rescore from it
+        self.assertIn(call([1], date(2025, 3, 20)), read_totals.call_args_list)
+        self.assert_history_matches_score_series("pushups", 3.0, 50.0)
+
+    def test_get_storage_backend_selection(self) -> None:
+        path = os.path.join(self.tmpdir.name, "selected.sqlite")
+        get_storage_backend.cache_clear()
+        try:
+            with patch.dict(os.environ, {STORAGE_BACKEND_ENV: "sqlite", SQLITE_PATH_ENV: path}):
+                backend = get_storage_backend()
+                self.assertIsInstance(backend, SQLiteBackend)
+                self.assertEqual(backend.path, path)
+            get_storage_backend.cache_clear()
+            with patch.dict(os.environ, {STORAGE_BACKEND_ENV: "bigquery"}):
+                self.assertIsInstance(get_storage_backend(), BigQueryBackend)
+        finally:
+            get_storage_backend.cache_clear()
+
+    def test_does_not_import_bigquery(self) -> None:
+        # a fresh interpreter, since other tests have already imported the BigQuery DAO
+        code = (
+            "import sys, dao.sqlite_backend, dao.storage; "
+            "sys.exit(any(m == 'dao.workout_dao' or m.startswith('google.cloud') for m in sys.modules))"
+        )
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(subprocess.run([sys.executable, "-c", code], cwd=repo_root).returncode, 0)
+
+    def test_fetch_concurrently(self) -> None:
+        self.backend.create_workout_type("pushups", "reps", True, 50.0, 14.0)
+        self.backend.log_workout("pushups", date(2025, 4, 7), 25.0, "reps")
+        # both calls must be in flight at once to get past the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        def read_types():
+            barrier.wait()
+            return self.backend.read_workout_types()
+
+        def read_totals():
+            barrier.wait()
+            return self.backend.read_daily_totals()
+
+        results = fetch_concurrently(types=read_types, totals=read_totals)
+        self.assertEqual(results["types"][0]["workout_type"], "pushups")
+        self.assertEqual(list(results["totals"]["amount"]), [25.0])
+
+        def fail():
+            raise RuntimeError("query failed")
+
+        with self.assertRaises(RuntimeError):
+            fetch_concurrently(ok=self.backend.read_workout_types, bad=fail)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# tests/test_table_cache.py
+import threading
+import time
+import unittest
+
+import pandas as pd
+
+from dao.table_cache import LRUTableCache, frame_nbytes
+
+
+class TestLRUTableCache(unittest.TestCase):
+    def test_entries_are_kept_per_key(self) -> None:
+        cache = LRUTableCache("test", ttl_seconds=60, max_bytes=1000, sizeof=lambda value: 1)
+        loads = []
+
+        def load(value):
+            loads.append(value)
+            return value
+
+        self.assertEqual(cache.get("a", lambda: load(1), lambda: 0), 1)
+        self.assertEqual(cache.get("b", lambda: load(2), lambda: 0), 2)
+        self.assertEqual(cache.get("a", lambda: load(3), lambda: 0), 1)
+        self.assertEqual(loads, [1, 2])
+
+        cache.invalidate()
+        self.assertEqual(cache.get("a", lambda: load(4), lambda: 0), 4)
+        self.assertEqual(len(cache), 1)
+
+    def test_expired_entry_revalidated_by_fingerprint(self) -> None:
+        cache = LRUTableCache("test", ttl_seconds=0, max_bytes=1000, sizeof=lambda value: 1)
+        cache.get("a", lambda: "v1", lambda: "modified-1")
+
+        self.assertEqual(cache.get("a", lambda: "v2", lambda: "modified-1"), "v1")
+        self.assertEqual(cache.get("a", lambda: "v3", lambda: "modified-2"), "v3")
+
+    def test_least_recently_used_evicted_over_cap(self) -> None:
+        cache = LRUTableCache("test", ttl_seconds=60, max_bytes=25, sizeof=lambda value: 10)
+        cache.get("a", lambda: "a", lambda: 0)
+        cache.get("b", lambda: "b", lambda: 0)
+        cache.get("a", lambda: "unused", lambda: 0)  # "b" is now least recently used
+        cache.get("c", lambda: "c", lambda: 0)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.nbytes, 20)
+        self.assertEqual(cache.get("a", lambda: "reloaded", lambda: 0), "a")
+        self.assertEqual(cache.get("b", lambda: "reloaded", lambda: 0), "reloaded")
+
+    def test_value_over_cap_is_not_cached(self) -> None:
+        cache = LRUTableCache("test", ttl_seconds=60, max_bytes=5, sizeof=lambda value: 10)
+        self.assertEqual(cache.get("a", lambda: "big", lambda: 0), "big")
+        self.assertEqual(len(cache), 0)
+
+    def test_load_racing_invalidate_is_not_stored(self) -> None:
+        cache = LRUTableCache("test", ttl_seconds=60, max_bytes=1000, sizeof=lambda value: 1)
+
+        def load():
+            cache.invalidate()  # a write lands while the query runs
+            return "stale"
+
+        self.assertEqual(cache.get("a", load, lambda: 0), "stale")
+        self.assertEqual(cache.get("a", lambda: "fresh", lambda: 0), "fresh")
+
+    def test_concurrent_readers_share_one_load(self) -> None:
+        cache = LRUTableCache("test", ttl_seconds=60, max_bytes=1000, sizeof=lambda value: 1)
+        loads = []
+
+        def load():
+            loads.append(1)
+            time.sleep(0.05)
+            return "value"
+
+        threads = [threading.Thread(target=cache.get, args=("a", load, lambda: 0)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(loads), 1)
+
+    def test_frame_nbytes_counts_strings(self) -> None:
+        df = pd.DataFrame({"workout_type": ["pushups"] * 100, "amount": [1.0] * 100})
+        self.assertGreater(frame_nbytes(df), df["amount"].nbytes + 100 * len("pushups"))
+
+
+if __name__ == "__main__":
+    unittest.main()
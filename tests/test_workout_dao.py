@@ -1,12 +1,16 @@
 # tests/test_workout_dao.py
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import call, patch, MagicMock
 from datetime import date
 
 import pandas as pd
-from google.api_core.exceptions import NotFound
+import pyarrow as pa
+from google.api_core.exceptions import BadRequest, NotFound
+from google.cloud import bigquery
 
 # Import your DAO functions
+import dao.workout_dao
+from dao.refresh_queue import RefreshQueue
 from dao.workout_dao import (
     ensure_dataset_and_tables,
     create_workout_type,
@@ -14,13 +18,59 @@ from dao.workout_dao import (
     update_workout_type,
     delete_workout_type,
     log_workout,
+    log_workouts,
+    create_workout_types,
     read_workouts,
+    read_daily_totals,
+    iter_ledger_batches,
+    refresh_daily_totals,
+    refresh_score_history,
+    read_score_history,
+    read_current_scores,
+    bootstrap_schema,
+    bootstrap_status,
+    SCHEMA_VERSION,
+    SCHEMA_VERSION_LABEL,
+    migrate_to_partitioned_tables,
     WORKOUT_TYPES_TABLE_ID,
-    LEDGER_TABLE_ID, create_table_if_not_exists
+    DAILY_TOTALS_TABLE_ID,
+    SCORE_HISTORY_TABLE_ID,
+    LEDGER_TABLE_ID, create_table_if_not_exists,
+    LEDGER_STREAM_PAGE_SIZE,
+    migrate_to_workout_type_ids,
+    stale_score_dates,
+    write_score_history,
+    SCORE_HISTORY_STAGING_TABLE_ID,
+    LEDGER_GENERATION_LABEL,
+    repair_workout_type_ids,
 )
 
+# What read_workout_types returns in tests that resolve names to workout_type_ids
+WTYPES = [
+    {"workout_type_id": 1, "workout_type": "pushups", "unit": "reps", "is_int": True,
+     "daily_target": 30.0, "half_life_days": 14.0},
+    {"workout_type_id": 2, "workout_type": "running", "unit": "miles", "is_int": False,
+     "daily_target": 2.0, "half_life_days": 7.0},
+]
+
+
+def bq_table(*columns: str, clustering_fields=None) -> MagicMock:
+    """A get_table result with the given (STRING, REQUIRED) columns."""
+    schema = [bigquery.SchemaField(name, "STRING", mode="REQUIRED") for name in columns]
+    return MagicMock(schema=schema, clustering_fields=clustering_fields)
+
 
 class TestWorkoutDAO(unittest.TestCase):
+    def setUp(self) -> None:
+        # process-wide caches must not leak between tests
+        dao.workout_dao._workout_types_cache.invalidate()
+        dao.workout_dao._ledger_cache.invalidate()
+        # a queue without its worker, so tests decide when derived tables are refreshed
+        self.refresh_queue = RefreshQueue()
+        patcher = patch("dao.workout_dao.get_refresh_queue", return_value=self.refresh_queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     @patch("dao.workout_dao.get_bq_client")
     def test_ensure_dataset_and_tables_dataset_exists(self, mock_get_client: MagicMock) -> None:
         """
@@ -31,16 +81,19 @@ class TestWorkoutDAO(unittest.TestCase):
         mock_get_client.return_value = mock_client
 
         # We expect 'get_table' calls to check the tables
-        # We'll mock them so they appear to already exist
-        mock_client.get_table.side_effect = [MagicMock(), MagicMock()]
+        # We'll mock them so they appear to already exist (and already have workout_type_id)
+        mock_client.get_table.return_value = bq_table("workout_type_id")
 
         ensure_dataset_and_tables()
 
         # Verify calls
         mock_client.get_dataset.assert_called_once()
-        self.assertEqual(mock_client.get_table.call_count, 2)
+        # the existence checks, then the migration's schema checks
+        self.assertEqual(mock_client.get_table.call_count, 8)
         mock_client.create_dataset.assert_not_called()  # dataset already exists, so no creation
         mock_client.create_table.assert_not_called()  # tables already exist
+        mock_client.update_table.assert_not_called()  # nothing to migrate
+        mock_client.query.assert_not_called()
 
     @patch("dao.workout_dao.get_bq_client")
     def test_ensure_dataset_and_tables_dataset_not_exists(self, mock_get_client: MagicMock) -> None:
@@ -58,8 +111,19 @@ class TestWorkoutDAO(unittest.TestCase):
 
         # check that create_dataset was called
         mock_client.create_dataset.assert_called_once()
-        # for the two tables
-        self.assertEqual(mock_client.create_table.call_count, 2)
+        # for the four tables
+        self.assertEqual(mock_client.create_table.call_count, 4)
+        # ledger-shaped tables are partitioned on date and clustered by type
+        ledger_table = mock_client.create_table.call_args_list[1][0][0]
+        self.assertEqual(ledger_table.time_partitioning.field, "date")
+        self.assertEqual(ledger_table.clustering_fields, ["workout_type_id"])
+        self.assertEqual([field.name for field in ledger_table.schema], ["workout_type_id", "date", "amount"])
+        self.assertIsNone(mock_client.create_table.call_args_list[0][0][0].time_partitioning)
+        # the new derived tables are backfilled: daily_totals from the ledger, then score_history
+        queries = [c[0][0] for c in mock_client.query.call_args_list]
+        self.assertEqual(len(queries), 2)
+        self.assertIn(f"MERGE `{DAILY_TOTALS_TABLE_ID}`", queries[0])
+        self.assertIn(f"MERGE `{SCORE_HISTORY_TABLE_ID}`", queries[1])
 
     @patch("dao.workout_dao.get_bq_client")
     def test_create_table_if_not_exists_already_exists(self, mock_get_client: MagicMock) -> None:
@@ -110,6 +174,9 @@ class TestWorkoutDAO(unittest.TestCase):
         row = args[1][0]
         self.assertEqual(row["daily_target"], 50.0)
         self.assertEqual(row["half_life_days"], 14.0)
+        self.assertIsInstance(row["workout_type_id"], int)
+        # a new id has no logs yet: nothing to rescore
+        mock_client.query.assert_not_called()
 
     @patch("dao.workout_dao.get_bq_client")
     def test_create_workout_type_error(self, mock_get_client: MagicMock) -> None:
@@ -144,35 +211,64 @@ class TestWorkoutDAO(unittest.TestCase):
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0]["half_life_days"], 14.0)
 
+    @patch("dao.workout_dao.read_workout_types")
     @patch("dao.workout_dao.get_bq_client")
-    def test_update_workout_type(self, mock_get_client: MagicMock) -> None:
+    def test_update_workout_type(self, mock_get_client: MagicMock, mock_read_types: MagicMock) -> None:
         """
         Test updating a workout type.
         """
         # We'll just check that client.query() was called with the correct query
         mock_client = MagicMock()
         mock_get_client.return_value = mock_client
+        mock_read_types.side_effect = [WTYPES, [dict(WTYPES[0], workout_type="situps"), WTYPES[1]]]
         update_workout_type("pushups", "situps", "reps", True, 50.0, 0.9)
-        mock_client.query.assert_called_once()
+        self.assertEqual(mock_client.query.call_count, 2)
 
-        called_query = mock_client.query.call_args[0][0]
+        called_query = mock_client.query.call_args_list[0][0][0]
         self.assertIn("UPDATE", called_query)
         self.assertIn("workout_type = @old_workout_type", called_query)
 
+        # a new target and half-life rescore the type's whole history, by id
+        called_query = mock_client.query.call_args[0][0]
+        self.assertIn(f"MERGE `{SCORE_HISTORY_TABLE_ID}`", called_query)
+        params = {p.name: p for p in mock_client.query.call_args[1]["job_config"].query_parameters}
+        self.assertEqual(params["type_ids"].values, [1])
+        self.assertNotIn("start", params)
+
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
     @patch("dao.workout_dao.get_bq_client")
-    def test_delete_workout_type(self, mock_get_client: MagicMock) -> None:
+    def test_rename_workout_type_touches_only_workout_types(self, mock_get_client: MagicMock, _types: MagicMock) -> None:
+        """Test that a rename (same target and half-life) is a single UPDATE of workout_types."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+
+        update_workout_type("pushups", "press-ups", "reps", True, 30.0, 14.0)
+
+        mock_client.query.assert_called_once()
+        self.assertIn(f"UPDATE `{WORKOUT_TYPES_TABLE_ID}`", mock_client.query.call_args[0][0])
+
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_bq_client")
+    def test_delete_workout_type(self, mock_get_client: MagicMock, _types: MagicMock) -> None:
         """
         Test deleting a workout type.
         """
         mock_client = MagicMock()
         mock_get_client.return_value = mock_client
         delete_workout_type("pushups")
-        mock_client.query.assert_called_once()
-        called_query = mock_client.query.call_args[0][0]
+        self.assertEqual(mock_client.query.call_count, 2)
+        called_query = mock_client.query.call_args_list[0][0][0]
         self.assertIn("DELETE FROM", called_query)
+        # the type's stored scores are dropped by the refresh
+        self.assertIn(
+            "WHEN NOT MATCHED BY SOURCE AND T.workout_type_id IN UNNEST(@type_ids) THEN", mock_client.query.call_args[0][0]
+        )
+        params = {p.name: p for p in mock_client.query.call_args[1]["job_config"].query_parameters}
+        self.assertEqual(params["type_ids"].values, [1])
 
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
     @patch("dao.workout_dao.get_bq_client")
-    def test_log_workout(self, mock_get_client: MagicMock) -> None:
+    def test_log_workout(self, mock_get_client: MagicMock, _types: MagicMock) -> None:
         """
         Test logging a workout to the ledger.
         """
@@ -184,13 +280,128 @@ class TestWorkoutDAO(unittest.TestCase):
         mock_client.insert_rows_json.assert_called_once()
         args, _ = mock_client.insert_rows_json.call_args
         self.assertEqual(args[0], LEDGER_TABLE_ID)
-        self.assertEqual(args[1][0]["workout_type"], "pushups")
-        self.assertEqual(args[1][0]["date"], "2025-04-07")
-        self.assertEqual(args[1][0]["amount"], 25.0)
-        self.assertEqual(args[1][0]["unit"], "reps")
+        # the name and unit live in workout_types
+        self.assertEqual(args[1][0], {"workout_type_id": 1, "date": "2025-04-07", "amount": 25.0})
+
+        # the write does not wait for the derived tables: it marks them stale
+        mock_client.query.assert_not_called()
+        self.assertEqual(self.refresh_queue.stale_since(), {1: date(2025, 4, 7)})
+        self.assertEqual(self.refresh_queue.flush(dao.workout_dao._refresh_derived_tables), 1)
+        self.assertEqual(self.refresh_queue.stale_since(), {})
+
+        # one transaction brings daily_totals up to date for that (type, day) only
+        (script,), kwargs = mock_client.query.call_args
+        mock_client.query.assert_called_once()
+        self.assertLess(script.index("BEGIN TRANSACTION"), script.index(f"MERGE `{DAILY_TOTALS_TABLE_ID}`"))
+        params = {p.name: p for p in kwargs["job_config"].query_parameters}
+        self.assertEqual(params["type_ids"].values, [1])
+        self.assertEqual(params["start"].value, date(2025, 4, 7))
+        self.assertEqual(params["end"].value, date(2025, 4, 7))
+
+        # and score_history for that type from that day on
+        history = script[script.index(f"MERGE `{SCORE_HISTORY_TABLE_ID}`"):script.index("COMMIT TRANSACTION")]
+        self.assertIn("GENERATE_DATE_ARRAY(GREATEST(b.first_day, @start), b.last_day)", history)
+        self.assertIn("T.date >= @start", history)
+        self.assertNotIn("@end", history)
 
     @patch("dao.workout_dao.get_bq_client")
-    def test_log_workout_error(self, mock_get_client: MagicMock) -> None:
+    def test_stale_derived_ranges(self, mock_get_client: MagicMock) -> None:
+        """Test finding the ranges a lost refresh left stale, for the refresh worker's catch-up."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.query.return_value.result.return_value = [
+            {"workout_type_id": 1, "start": date(2025, 4, 3), "end": date(2025, 4, 7)},
+        ]
+
+        ranges = dao.workout_dao._stale_derived_ranges()
+
+        self.assertEqual(ranges, {1: (date(2025, 4, 3), date(2025, 4, 7))})
+        (query,), _ = mock_client.query.call_args
+        self.assertIn(f"FROM `{LEDGER_TABLE_ID}`", query)
+        self.assertIn(f"LEFT JOIN `{DAILY_TOTALS_TABLE_ID}` d", query)
+        self.assertIn("d.amount IS NULL", query)
+
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_bq_client")
+    def test_log_workout_marks_stale_before_insert(self, mock_get_client: MagicMock, _types: MagicMock) -> None:
+        """Test that the days are marked stale while the insert is in flight, so readers see the new rows."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        stale_during_insert = []
+
+        def insert_rows_json(*args, **kwargs) -> list:
+            stale_during_insert.append(self.refresh_queue.stale_since())
+            # a refresh running meanwhile does not see the rows yet
+            self.refresh_queue.flush(MagicMock())
+            return []
+
+        mock_client.insert_rows_json.side_effect = insert_rows_json
+
+        log_workout("pushups", date(2025, 4, 7), 25.0, "reps")
+
+        self.assertEqual(stale_during_insert, [{1: date(2025, 4, 7)}])
+        self.assertEqual(self.refresh_queue.stale_since(), {1: date(2025, 4, 7)})
+
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_bq_client")
+    def test_log_workout_refresh_failure(self, mock_get_client: MagicMock, _types: MagicMock) -> None:
+        """Test that a failed refresh of the derived tables keeps them stale instead of failing the write."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.insert_rows_json.return_value = []
+        mock_client.query.side_effect = RuntimeError("MERGE quota exceeded")
+
+        log_workout("pushups", date(2025, 4, 7), 25.0, "reps")
+        mock_client.insert_rows_json.assert_called_once()
+
+        with self.assertRaises(RuntimeError):
+            self.refresh_queue.flush(dao.workout_dao._refresh_derived_tables)
+        self.assertEqual(self.refresh_queue.stale_since(), {1: date(2025, 4, 7)})
+        self.assertEqual(stale_score_dates(), {"pushups": date(2025, 4, 7)})
+
+    @patch("dao.workout_dao.get_bqstorage_client", return_value=None)
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_bq_client")
+    def test_read_daily_totals_stale_days_from_ledger(
+        self, mock_get_client: MagicMock, _types: MagicMock, _storage: MagicMock
+    ) -> None:
+        """Test that days not refreshed yet since a write are summed from the ledger."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.query.return_value.to_dataframe.return_value = pd.DataFrame([
+            {"workout_type": "pushups", "date": date(2025, 4, 6), "amount": 30},
+            {"workout_type": "pushups", "date": date(2025, 4, 7), "amount": 40},
+            {"workout_type": "running", "date": date(2025, 4, 7), "amount": 2},
+        ])
+        mock_client.query.return_value.result.return_value.to_arrow_iterable.return_value = [
+            pa.RecordBatch.from_pydict(
+                {"workout_type_id": [1, 1, 1], "date": [date(2025, 4, 7), date(2025, 4, 7), date(2025, 4, 8)],
+                 "amount": [40.0, 25.0, 5.0]},
+                schema=dao.workout_dao.LEDGER_TABLE_ARROW_SCHEMA,
+            )
+        ]
+        self.refresh_queue.mark([1], date(2025, 4, 7), date(2025, 4, 8))
+
+        results = read_daily_totals()
+
+        ledger_query, ledger_kwargs = mock_client.query.call_args
+        self.assertIn(f"FROM `{LEDGER_TABLE_ID}`", ledger_query[0])
+        params = {p.name: p for p in ledger_kwargs["job_config"].query_parameters}
+        self.assertEqual(params["type_ids"].values, [1])
+        self.assertEqual(params["start"].value, date(2025, 4, 7))
+        self.assertEqual(
+            list(zip(results["workout_type"], results["date"].dt.date, results["amount"])),
+            [
+                ("pushups", date(2025, 4, 8), 5.0),
+                ("pushups", date(2025, 4, 7), 65.0),
+                ("running", date(2025, 4, 7), 2.0),
+                ("pushups", date(2025, 4, 6), 30.0),
+            ],
+        )
+
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_bq_client")
+    def test_log_workout_error(self, mock_get_client: MagicMock, _types: MagicMock) -> None:
         """
         Test log_workout if there's an insertion error.
         """
@@ -201,6 +412,25 @@ class TestWorkoutDAO(unittest.TestCase):
             log_workout("pushups", date.today(), 25.0, "reps")
         self.assertIn("Error inserting ledger entry", str(context.exception))
 
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_bq_client")
+    def test_log_workouts_rejects_unknown_types(self, mock_get_client: MagicMock, mock_read_types: MagicMock) -> None:
+        """Test that rows of unknown workout types are row errors, after one re-read of workout_types."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.insert_rows_json.return_value = []
+
+        errors = log_workouts([
+            {"workout_type": "yoga", "date": "2025-04-07", "amount": 20, "unit": "minutes"},
+            {"workout_type": "running", "date": "2025-04-07", "amount": 2, "unit": "miles"},
+        ])
+
+        self.assertEqual([e["index"] for e in errors], [0])
+        self.assertIn("unknown workout type 'yoga'", errors[0]["errors"][0]["message"])
+        self.assertEqual(mock_client.insert_rows_json.call_args[0][1], [
+            {"workout_type_id": 2, "date": "2025-04-07", "amount": 2.0},
+        ])
+
     @patch("dao.workout_dao.get_bq_client")
     def test_read_workouts_no_filter(self, mock_get_client: MagicMock) -> None:
         """Test reading workouts with no filter, returning a DataFrame."""
@@ -226,8 +456,9 @@ class TestWorkoutDAO(unittest.TestCase):
         self.assertEqual(results.loc[0, "workout_type"], "pushups")
         self.assertEqual(results.loc[1, "workout_type"], "running")
 
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
     @patch("dao.workout_dao.get_bq_client")
-    def test_read_workouts_filter(self, mock_get_client: MagicMock) -> None:
+    def test_read_workouts_filter(self, mock_get_client: MagicMock, _types: MagicMock) -> None:
         """Test reading workouts with a specific workout_type filter."""
         mock_client = MagicMock()
         mock_get_client.return_value = mock_client
@@ -243,9 +474,627 @@ class TestWorkoutDAO(unittest.TestCase):
         self.assertEqual(len(results), 1)
         self.assertEqual(results.loc[0, "workout_type"], "pushups")
 
-        # confirm that the query was called with the param
+        # confirm that the query filters by id and joins the name and unit back in
         called_query = mock_client.query.call_args[0][0]
-        self.assertIn("WHERE workout_type = @filter_type", called_query)
+        self.assertIn(f"JOIN `{WORKOUT_TYPES_TABLE_ID}` w USING (workout_type_id)", called_query)
+        self.assertIn("WHERE workout_type_id IN UNNEST(@type_ids)", called_query)
+        params = {p.name: p for p in mock_client.query.call_args[1]["job_config"].query_parameters}
+        self.assertEqual(params["type_ids"].values, [1])
+
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_bq_client")
+    def test_read_daily_totals(self, mock_get_client: MagicMock, _types: MagicMock) -> None:
+        """Test that daily totals are read from the daily_totals table with compact dtypes."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_query_job = MagicMock()
+        mock_query_job.to_dataframe.return_value = pd.DataFrame([
+            {"workout_type": "pushups", "date": date(2025, 4, 7), "amount": 40},
+        ])
+        mock_client.query.return_value = mock_query_job
+
+        results = read_daily_totals(types=["pushups"], start=date(2025, 4, 1))
+
+        called_query = mock_client.query.call_args[0][0]
+        self.assertIn(f"FROM `{DAILY_TOTALS_TABLE_ID}`", called_query)
+        self.assertIn("workout_type_id IN UNNEST(@type_ids)", called_query)
+        self.assertIn("date >= @start", called_query)
+        self.assertNotIn("@end", called_query)
+        self.assertEqual(str(results["date"].dtype), "datetime64[ns]")
+        self.assertEqual(str(results["amount"].dtype), "float64")
+        self.assertEqual(results.loc[0, "amount"], 40.0)
+
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_bq_client")
+    def test_read_daily_totals_shared_cache(self, mock_get_client: MagicMock, _types: MagicMock) -> None:
+        """Test that identical reads share one query until the table changes or we write to it."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.query.return_value.to_dataframe.return_value = pd.DataFrame([
+            {"workout_type": "pushups", "date": date(2025, 4, 7), "amount": 40},
+        ])
+        mock_client.get_table.return_value = MagicMock(modified=1, num_rows=1, streaming_buffer=None)
+
+        with patch.object(dao.workout_dao._ledger_cache, "ttl_seconds", 0):
+            first = read_daily_totals(types=["pushups"])
+            first["amount"] = 0.0  # a caller's edits must not reach the cache
+            second = read_daily_totals(types=["pushups"])
+            self.assertEqual(mock_client.query.call_count, 1)
+            self.assertEqual(second.loc[0, "amount"], 40.0)
+            # names come from workout_types, so a rename elsewhere also invalidates
+            checked = [c[0][0] for c in mock_client.get_table.call_args_list]
+            self.assertEqual(checked[:2], [DAILY_TOTALS_TABLE_ID, WORKOUT_TYPES_TABLE_ID])
+
+            # another filter is another entry
+            read_daily_totals(types=["running"])
+            self.assertEqual(mock_client.query.call_count, 2)
+
+            # changed metadata (e.g. another process wrote) forces a reload
+            mock_client.get_table.return_value = MagicMock(modified=2, num_rows=2, streaming_buffer=None)
+            read_daily_totals(types=["pushups"])
+            self.assertEqual(mock_client.query.call_count, 3)
+
+        # our own writes invalidate it even within the TTL
+        mock_client.insert_rows_json.return_value = []
+        read_daily_totals(types=["pushups"])
+        queries = mock_client.query.call_count
+        log_workouts([{"workout_type": "pushups", "date": "2025-04-08", "amount": 10, "unit": "reps"}])
+        self.assertEqual(mock_client.query.call_count, queries)  # the refresh is left to the queue
+        read_daily_totals(types=["pushups"])
+        # the reload, plus the ledger sums of the day not refreshed yet
+        self.assertEqual(mock_client.query.call_count, queries + 2)
+
+    @patch("dao.workout_dao.get_bqstorage_client", return_value=None)
+    @patch("dao.workout_dao.get_bq_client")
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    def test_iter_ledger_batches_streams_pages(self, _types: MagicMock, mock_get_client: MagicMock,
+                                               _mock_bqstorage: MagicMock) -> None:
+        """Test that the ledger is streamed page by page as Arrow record batches, with names and units."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        pages = [pa.record_batch({
+            "workout_type_id": pa.array([1, 99], pa.int64()),  # 99: a deleted type
+            "date": pa.array([date(2025, 4, 1)] * 2, pa.date32()),
+            "amount": [10.0, 5.0],
+        })] * 3
+        mock_rows = mock_client.query.return_value.result.return_value
+        mock_rows.to_arrow_iterable.return_value = iter(pages)
+
+        batches = iter_ledger_batches(types=["pushups"], start=date(2025, 4, 1))
+        mock_client.query.assert_not_called()  # nothing runs until the stream is consumed
+        batches = list(batches)
+        self.assertEqual(len(batches), 3)
+        self.assertEqual(batches[0].to_pylist(), [
+            {"workout_type": "pushups", "date": date(2025, 4, 1), "amount": 10.0, "unit": "reps"},
+        ])
+
+        called_query = mock_client.query.call_args[0][0]
+        self.assertIn("workout_type_id IN UNNEST(@type_ids)", called_query)
+        self.assertIn("date >= @start", called_query)
+        self.assertNotIn("ORDER BY", called_query)
+        mock_client.query.return_value.result.assert_called_once_with(page_size=LEDGER_STREAM_PAGE_SIZE)
+        mock_rows.to_arrow_iterable.assert_called_once_with(bqstorage_client=None)
+        mock_client.query.return_value.to_dataframe.assert_not_called()
+
+    @patch("dao.workout_dao.get_bq_client")
+    def test_read_daily_totals_keyset_page(self, mock_get_client: MagicMock) -> None:
+        """Test that before_key/limit become a keyset condition, a date bound and a LIMIT."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.query.return_value.to_dataframe.return_value = pd.DataFrame(
+            columns=["workout_type", "date", "amount"]
+        )
+
+        read_daily_totals(before_key=(pd.Timestamp("2025-04-07"), "pushups"), limit=100)
+
+        called_query = mock_client.query.call_args[0][0]
+        self.assertIn("(date < @before_date OR (date = @before_date AND w.workout_type > @before_type))", called_query)
+        self.assertIn("date <= @end", called_query)
+        self.assertTrue(called_query.rstrip().endswith("LIMIT 100"))
+        params = {p.name: p.value for p in mock_client.query.call_args[1]["job_config"].query_parameters}
+        self.assertEqual(params["before_date"], date(2025, 4, 7))
+        self.assertEqual(params["before_type"], "pushups")
+
+    @patch("dao.workout_dao.get_bq_client")
+    def test_refresh_daily_totals_full(self, mock_get_client: MagicMock) -> None:
+        """Test that a full refresh merges the whole ledger aggregate into daily_totals."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+
+        refresh_daily_totals()
+
+        called_query = mock_client.query.call_args[0][0]
+        self.assertIn(f"MERGE `{DAILY_TOTALS_TABLE_ID}`", called_query)
+        self.assertIn(f"FROM `{LEDGER_TABLE_ID}`", called_query)
+        self.assertIn("GROUP BY workout_type_id, date", called_query)
+        self.assertIn("WHERE workout_type_id IS NOT NULL\n", called_query)
+        self.assertNotIn("@", called_query)
+        mock_client.query.return_value.result.assert_called_once()
+
+    @patch("dao.workout_dao.get_bq_client")
+    def test_refresh_score_history_full(self, mock_get_client: MagicMock) -> None:
+        """Test that a full refresh rescores every type from daily_totals and deletes orphaned rows."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+
+        refresh_score_history()
+
+        called_query = mock_client.query.call_args[0][0]
+        self.assertIn(f"MERGE `{SCORE_HISTORY_TABLE_ID}`", called_query)
+        self.assertIn(f"FROM `{WORKOUT_TYPES_TABLE_ID}`", called_query)
+        self.assertIn(f"LEFT JOIN `{DAILY_TOTALS_TABLE_ID}` d", called_query)
+        self.assertIn("UNNEST(GENERATE_DATE_ARRAY(b.first_day, b.last_day))", called_query)
+        self.assertIn("WHEN NOT MATCHED BY SOURCE THEN", called_query)
+        self.assertNotIn("@", called_query)
+        self.assertIn("WHEN score >= 90.0 THEN 'A'", called_query)
+
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_bq_client")
+    def test_write_score_history(self, mock_get_client: MagicMock, _types: MagicMock) -> None:
+        """Test that precomputed scores are loaded in bulk and merged into score_history."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        history = pd.DataFrame({
+            "workout_type": ["pushups", "yoga"],
+            "date": pd.to_datetime(["2025-04-07", "2025-04-07"]),
+            "ewa": [10.0, 1.0],
+            "score": [33.3, 5.0],
+            "grade": ["F", "F"],
+        })
+
+        self.assertEqual(write_score_history(history), 1)  # yoga is not a workout type
+
+        args, kwargs = mock_client.load_table_from_file.call_args
+        self.assertEqual(args[1], SCORE_HISTORY_STAGING_TABLE_ID)
+        self.assertEqual(kwargs["job_config"].write_disposition, bigquery.WriteDisposition.WRITE_TRUNCATE)
+        self.assertEqual(
+            args[0].getvalue().decode(),
+            '{"workout_type_id": 1, "date": "2025-04-07", "ewa": 10.0, "score": 33.3, "grade": "F"}',
+        )
+        merge = mock_client.query.call_args[0][0]
+        self.assertIn(f"MERGE `{SCORE_HISTORY_TABLE_ID}` T", merge)
+        self.assertIn(f"USING `{SCORE_HISTORY_STAGING_TABLE_ID}` S", merge)
+        mock_client.delete_table.assert_called_once_with(SCORE_HISTORY_STAGING_TABLE_ID, not_found_ok=True)
+
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_bq_client")
+    def test_read_score_history(self, mock_get_client: MagicMock, _types: MagicMock) -> None:
+        """Test that stored scores are range-scanned in (workout_type, date) order."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.query.return_value.to_dataframe.return_value = pd.DataFrame([
+            {"workout_type": "pushups", "date": date(2025, 4, 7), "ewa": 40, "score": 80, "grade": "B"},
+        ])
+
+        results = read_score_history(types=["pushups"], start=date(2025, 4, 1))
+
+        called_query = mock_client.query.call_args[0][0]
+        self.assertIn(f"FROM `{SCORE_HISTORY_TABLE_ID}`", called_query)
+        self.assertIn(f"JOIN `{WORKOUT_TYPES_TABLE_ID}` w USING (workout_type_id)", called_query)
+        self.assertIn("workout_type_id IN UNNEST(@type_ids) AND date >= @start", called_query)
+        self.assertTrue(called_query.rstrip().endswith("ORDER BY workout_type, date"))
+        self.assertEqual(str(results["date"].dtype), "datetime64[ns]")
+        self.assertEqual(results.loc[0, "score"], 80.0)
+
+    @patch("dao.workout_dao.get_write_journal", return_value=None)
+    @patch("dao.workout_dao.read_workout_types")
+    @patch("dao.workout_dao.get_bq_client")
+    def test_read_current_scores(self, mock_get_client: MagicMock, mock_read_types: MagicMock, _journal: MagicMock) -> None:
+        """Test that current scores come from each type's latest score_history row, in workout type order."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.query.return_value.result.return_value = [
+            {"workout_type_id": 1, "ewa": 27.0, "score": 90.0},
+        ]
+        mock_read_types.return_value = [WTYPES[1], WTYPES[0]]
+
+        scores = read_current_scores()
+
+        called_query = mock_client.query.call_args[0][0]
+        self.assertIn(f"FROM `{SCORE_HISTORY_TABLE_ID}`", called_query)
+        self.assertIn("QUALIFY ROW_NUMBER() OVER (PARTITION BY workout_type_id ORDER BY date DESC) = 1", called_query)
+        self.assertEqual(list(scores["workout_type"]), ["running", "pushups"])
+        self.assertEqual(list(scores["score_pct"]), [0.0, 90.0])
+        self.assertEqual(list(scores["grade"]), ["F", "A"])
+
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_bq_client")
+    def test_read_workouts_date_window(self, mock_get_client: MagicMock, _types: MagicMock) -> None:
+        """Test that a date window becomes partition-pruning predicates."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.query.return_value.to_dataframe.return_value = pd.DataFrame(
+            columns=["workout_type", "date", "amount", "unit"]
+        )
+
+        read_workouts("pushups", start=date(2025, 1, 1), end=date(2025, 3, 31))
+
+        called_query = mock_client.query.call_args[0][0]
+        self.assertIn("WHERE workout_type_id IN UNNEST(@type_ids) AND date >= @start AND date <= @end", called_query)
+
+    @patch("dao.workout_dao.get_bq_client")
+    def test_migrate_to_partitioned_tables(self, mock_get_client: MagicMock) -> None:
+        """Test that only unpartitioned tables are rebuilt, and dropped only once the new table is built."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        unpartitioned = bq_table("workout_type_id", "date", "amount")
+        unpartitioned.time_partitioning = None
+        partitioned = MagicMock()
+        mock_client.get_table.side_effect = [unpartitioned, partitioned]
+
+        migrated = migrate_to_partitioned_tables()
+
+        self.assertEqual(migrated, [LEDGER_TABLE_ID])
+        queries = [c[0][0] for c in mock_client.query.call_args_list]
+        self.assertIn(f"CREATE OR REPLACE TABLE `{LEDGER_TABLE_ID}_unpartitioned_backup`", queries[0])
+        self.assertIn(f"CREATE OR REPLACE TABLE `{LEDGER_TABLE_ID}_partitioned`", queries[1])
+        self.assertIn("PARTITION BY DATE_TRUNC(date, MONTH)", queries[1])
+        self.assertIn("CLUSTER BY workout_type_id", queries[1])
+        # the source is dropped only after its replacement was built
+        names = [name for name, _, _ in mock_client.method_calls if name in ("query", "delete_table")]
+        self.assertEqual(names, ["query", "query", "delete_table", "delete_table"])
+        self.assertEqual(mock_client.delete_table.call_args_list, [
+            call(LEDGER_TABLE_ID, not_found_ok=True),
+            call(f"{LEDGER_TABLE_ID}_partitioned"),
+        ])
+        mock_client.copy_table.assert_called_once_with(f"{LEDGER_TABLE_ID}_partitioned", LEDGER_TABLE_ID)
+
+    @patch("dao.workout_dao.get_bq_client")
+    def test_migrate_to_partitioned_tables_legacy_schema(self, mock_get_client: MagicMock) -> None:
+        """Test that a table from before workout_type_id is clustered by name, and kept if the build fails."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        legacy = bq_table("workout_type", "date", "amount", "unit")
+        legacy.time_partitioning = None
+        mock_client.get_table.return_value = legacy
+
+        def query(sql: str, *args, **kwargs) -> MagicMock:
+            if "CLUSTER BY workout_type_id" in sql:
+                raise BadRequest("Unrecognized name: workout_type_id")
+            return MagicMock()
+
+        mock_client.query.side_effect = query
+
+        self.assertEqual(migrate_to_partitioned_tables(), [LEDGER_TABLE_ID, DAILY_TOTALS_TABLE_ID])
+        build = mock_client.query.call_args_list[1][0][0]
+        self.assertIn("CLUSTER BY workout_type\n", build)
+
+        mock_client.reset_mock()
+        mock_client.query.side_effect = RuntimeError("quota exceeded")
+        with self.assertRaises(RuntimeError):
+            migrate_to_partitioned_tables()
+        mock_client.delete_table.assert_not_called()
+
+    @patch("dao.workout_dao.get_bq_client")
+    def test_migrate_to_partitioned_tables_finishes_swap(self, mock_get_client: MagicMock) -> None:
+        """Test that a run which dropped a table but failed to copy its replacement is finished."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        partitioned = MagicMock()
+        mock_client.get_table.side_effect = [NotFound("ledger"), MagicMock(), partitioned]
+
+        self.assertEqual(migrate_to_partitioned_tables(), [LEDGER_TABLE_ID])
+
+        mock_client.query.assert_not_called()
+        mock_client.copy_table.assert_called_once_with(f"{LEDGER_TABLE_ID}_partitioned", LEDGER_TABLE_ID)
+
+    @patch("dao.workout_dao.get_bq_client")
+    def test_migrate_to_workout_type_ids(self, mock_get_client: MagicMock) -> None:
+        """Test that name-keyed tables get an id column in place, then ids are assigned and backfilled."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        ledger = bq_table("workout_type", "date", "amount", "unit", clustering_fields=["workout_type"])
+        mock_client.get_table.side_effect = [
+            bq_table("workout_type", "unit", "is_int", "daily_target", "half_life_days"),
+            ledger,
+            bq_table("workout_type", "date", "amount", clustering_fields=["workout_type"]),
+            bq_table("workout_type", "date", "ewa", "score", "grade", clustering_fields=["workout_type"]),
+        ]
+        mock_client.query.return_value.result.return_value = [
+            {"workout_types": 2, "ledger": 40, "daily_totals": 20, "score_history": 30}
+        ]
+        mock_client.query.return_value.num_dml_affected_rows = 40
+        mock_client.get_dataset.return_value = MagicMock(labels={})
+
+        self.assertTrue(migrate_to_workout_type_ids())
+
+        self.assertEqual(mock_client.update_table.call_count, 4)
+        # columns are only appended or relaxed (allowed on a live table); clustering moves to the id
+        table, fields = mock_client.update_table.call_args_list[1][0]
+        self.assertIs(table, ledger)
+        self.assertEqual(fields, ["schema", "clustering_fields"])
+        self.assertEqual([(f.name, f.mode) for f in table.schema], [
+            ("workout_type", "NULLABLE"), ("date", "REQUIRED"), ("amount", "REQUIRED"),
+            ("unit", "NULLABLE"), ("workout_type_id", "NULLABLE"),
+        ])
+        self.assertEqual(table.clustering_fields, ["workout_type_id"])
+
+        queries = [c[0][0] for c in mock_client.query.call_args_list]
+        # the steps are gated on what is left to do, counted in one query
+        self.assertIn(f"COUNTIF(workout_type_id IS NULL) FROM `{WORKOUT_TYPES_TABLE_ID}`) AS workout_types", queries[0])
+        self.assertIn(f"FROM `{LEDGER_TABLE_ID}`) AS ledger", queries[0])
+        self.assertIn("SET workout_type_id = FARM_FINGERPRINT(workout_type)", queries[1])
+        self.assertIn(f"UPDATE `{LEDGER_TABLE_ID}` l", queries[2])
+        self.assertIn("WHERE l.workout_type_id IS NULL AND l.workout_type = w.workout_type", queries[2])
+        self.assertIn(f"MERGE `{DAILY_TOTALS_TABLE_ID}`", queries[3])
+        self.assertIn(f"MERGE `{SCORE_HISTORY_TABLE_ID}`", queries[4])
+        self.assertIn(f"DELETE FROM `{DAILY_TOTALS_TABLE_ID}` WHERE workout_type_id IS NULL", queries[5])
+        # the backfill changed ledger rows in place, so ledger mirrors must resync in full
+        dataset, _ = mock_client.update_dataset.call_args[0]
+        self.assertEqual(dataset.labels[LEDGER_GENERATION_LABEL], "1")
+
+    @patch("dao.workout_dao.get_bq_client")
+    def test_migrate_to_workout_type_ids_resumes_from_the_data(self, mock_get_client: MagicMock) -> None:
+        """Test that a rerun only runs the steps whose rows still lack ids."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        # migrated schemas: nullable ids next to the legacy name column
+        migrated = MagicMock(schema=[
+            bigquery.SchemaField("workout_type", "STRING", mode="NULLABLE"),
+            bigquery.SchemaField("workout_type_id", "INT64", mode="NULLABLE"),
+        ])
+        mock_client.get_table.return_value = migrated
+        mock_client.query.return_value.result.return_value = [
+            {"workout_types": 0, "ledger": 0, "daily_totals": 0, "score_history": 0}
+        ]
+
+        self.assertTrue(migrate_to_workout_type_ids())
+        mock_client.update_table.assert_not_called()
+        self.assertEqual(mock_client.query.call_count, 1)  # just the count
+
+        # ledger rows left without an id (e.g. by a failed run) are backfilled, then the derived tables rebuilt
+        mock_client.query.reset_mock()
+        mock_client.query.return_value.result.return_value = [
+            {"workout_types": 0, "ledger": 3, "daily_totals": 0, "score_history": 0}
+        ]
+        mock_client.query.return_value.num_dml_affected_rows = 3
+        self.assertTrue(migrate_to_workout_type_ids())
+        queries = [c[0][0] for c in mock_client.query.call_args_list]
+        self.assertIn(f"UPDATE `{LEDGER_TABLE_ID}` l", queries[1])
+        self.assertIn(f"MERGE `{DAILY_TOTALS_TABLE_ID}`", queries[2])
+        self.assertEqual(len(queries), 5)
+
+    @patch("dao.workout_dao.get_bq_client")
+    def test_repair_workout_type_ids(self, mock_get_client: MagicMock) -> None:
+        """Test that rows written without ids after the migration are repaired and mirrors told to resync."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.get_table.return_value = MagicMock(schema=[
+            bigquery.SchemaField("workout_type", "STRING", mode="NULLABLE"),
+            bigquery.SchemaField("workout_type_id", "INT64", mode="NULLABLE"),
+        ])
+        mock_client.get_dataset.return_value = MagicMock(labels={LEDGER_GENERATION_LABEL: "1"})
+        mock_client.query.return_value.result.return_value = [{"ledger": 0}]
+
+        self.assertEqual(repair_workout_type_ids(), 0)
+        self.assertEqual(mock_client.query.call_count, 1)  # just the count
+        mock_client.update_dataset.assert_not_called()
+
+        mock_client.query.reset_mock()
+        mock_client.query.return_value.result.return_value = [{"ledger": 2}]
+        mock_client.query.return_value.num_dml_affected_rows = 2
+        self.assertEqual(repair_workout_type_ids(), 2)
+        queries = [c[0][0] for c in mock_client.query.call_args_list]
+        self.assertIn(f"UPDATE `{LEDGER_TABLE_ID}` l", queries[1])
+        self.assertIn(f"MERGE `{DAILY_TOTALS_TABLE_ID}`", queries[2])
+        self.assertIn(f"MERGE `{SCORE_HISTORY_TABLE_ID}`", queries[3])
+        dataset, fields = mock_client.update_dataset.call_args[0]
+        self.assertEqual(dataset.labels[LEDGER_GENERATION_LABEL], "2")
+        self.assertEqual(fields, ["labels"])
+
+        # a ledger created with ids has nothing to repair
+        mock_client.query.reset_mock()
+        mock_client.get_table.return_value = bq_table("workout_type_id", "date", "amount")
+        self.assertEqual(repair_workout_type_ids(), 0)
+        mock_client.query.assert_not_called()
+
+    @patch("dao.workout_dao.get_bq_client")
+    def test_migrate_to_workout_type_ids_defers_streaming_buffer_rows(self, mock_get_client: MagicMock) -> None:
+        """Test that a backfill blocked by the streaming buffer leaves the migration incomplete."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.get_table.return_value = bq_table("workout_type", "date", "amount")
+        count_job = MagicMock()
+        count_job.result.return_value = [{"workout_types": 0, "ledger": 3, "daily_totals": 5, "score_history": 0}]
+        backfill_error = BadRequest(
+            f"UPDATE or DELETE statement over table {LEDGER_TABLE_ID} would affect rows in the streaming buffer"
+        )
+
+        def query(statement, **kwargs):
+            if statement.startswith("SELECT"):
+                return count_job
+            if f"UPDATE `{LEDGER_TABLE_ID}`" in statement:
+                raise backfill_error
+            return MagicMock(num_dml_affected_rows=0)
+
+        mock_client.query.side_effect = query
+
+        self.assertFalse(migrate_to_workout_type_ids())
+        # what could be migrated still was
+        queries = [c[0][0] for c in mock_client.query.call_args_list]
+        self.assertIn(f"MERGE `{DAILY_TOTALS_TABLE_ID}`", queries[2])
+
+        # other errors still fail it
+        backfill_error = BadRequest("Syntax error")
+        with self.assertRaises(BadRequest):
+            migrate_to_workout_type_ids()
+
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_bq_client")
+    def test_log_workouts_batches_and_reports_row_errors(self, mock_get_client: MagicMock, _types: MagicMock) -> None:
+        """Test that bulk logging chunks streaming inserts and maps errors back to input rows."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        # second batch: its 3rd row is rejected
+        mock_client.insert_rows_json.side_effect = [[], [{"index": 2, "errors": [{"reason": "invalid"}]}], []]
+        rows = [
+            {"workout_type": "pushups", "date": date(2025, 1, 1) + pd.Timedelta(days=i % 30), "amount": 10, "unit": "reps"}
+            for i in range(1200)
+        ]
+        rows[3]["amount"] = "lots"  # fails client-side validation
+
+        errors = log_workouts(rows)
+
+        self.assertEqual(mock_client.insert_rows_json.call_count, 3)
+        self.assertEqual([len(c[0][1]) for c in mock_client.insert_rows_json.call_args_list], [500, 500, 199])
+        self.assertEqual([e["index"] for e in errors], [3, 503])
+        mock_client.load_table_from_file.assert_not_called()
+        # one MERGE refreshes daily_totals for the whole written range
+        self.assertEqual(self.refresh_queue.flush(dao.workout_dao._refresh_derived_tables), 1)
+        params = {p.name: p for p in mock_client.query.call_args_list[0][1]["job_config"].query_parameters}
+        self.assertEqual(params["start"].value, date(2025, 1, 1))
+        self.assertEqual(params["end"].value, date(2025, 1, 30))
+
+    @patch("dao.workout_dao.LOAD_JOB_THRESHOLD", 10)
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_bq_client")
+    def test_log_workouts_uses_load_job_for_large_batches(self, mock_get_client: MagicMock, _types: MagicMock) -> None:
+        """Test that large backfills go through a newline-delimited JSON load job."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        rows = [{"workout_type": "running", "date": "2025-02-01", "amount": 1.5, "unit": "miles"}] * 11
+
+        errors = log_workouts(rows)
+
+        self.assertEqual(errors, [])
+        mock_client.insert_rows_json.assert_not_called()
+        args, kwargs = mock_client.load_table_from_file.call_args
+        self.assertEqual(args[1], LEDGER_TABLE_ID)
+        self.assertEqual(len(args[0].getvalue().splitlines()), 11)
+        self.assertEqual(kwargs["job_config"].source_format, "NEWLINE_DELIMITED_JSON")
+        mock_client.load_table_from_file.return_value.result.assert_called_once()
+
+    @patch("dao.workout_dao.get_bq_client")
+    def test_create_workout_types(self, mock_get_client: MagicMock) -> None:
+        """Test that bulk workout type creation is a single insert."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.insert_rows_json.return_value = []
+
+        errors = create_workout_types([
+            {"workout_type": "pushups", "unit": "reps", "is_int": True, "daily_target": 50, "half_life_days": 14},
+            {"workout_type": "running", "unit": "miles", "is_int": False, "daily_target": 2, "half_life_days": 10},
+        ])
+
+        self.assertEqual(errors, [])
+        mock_client.insert_rows_json.assert_called_once()
+        self.assertEqual(mock_client.insert_rows_json.call_args[0][0], WORKOUT_TYPES_TABLE_ID)
+        self.assertEqual(len(mock_client.insert_rows_json.call_args[0][1]), 2)
+
+    @patch("dao.workout_dao.get_bq_client")
+    def test_read_workout_types_cached(self, mock_get_client: MagicMock) -> None:
+        """Test that workout types are queried once, then served from the cache until a write."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.query.return_value.result.return_value = [
+            {"workout_type": "pushups", "unit": "reps", "is_int": True, "daily_target": 50.0, "half_life_days": 14.0}
+        ]
+        mock_client.insert_rows_json.return_value = []
+
+        first = read_workout_types()
+        first[0]["unit"] = "mutated by caller"
+        second = read_workout_types()
+        self.assertEqual(mock_client.query.call_count, 1)
+        self.assertEqual(second[0]["unit"], "reps")
+
+        create_workout_type("situps", "reps", True, 20.0, 7.0)
+        read_workout_types()
+        # re-read after the write
+        self.assertEqual(mock_client.query.call_count, 2)
+
+    @patch("dao.workout_dao.get_bq_client")
+    def test_read_workout_types_revalidates_with_table_metadata(self, mock_get_client: MagicMock) -> None:
+        """Test that an expired cache entry is kept if the table's metadata is unchanged."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.query.return_value.result.return_value = []
+        mock_client.get_table.return_value = MagicMock(modified=1, num_rows=3, streaming_buffer=None)
+
+        with patch.object(dao.workout_dao._workout_types_cache, "ttl_seconds", 0):
+            read_workout_types()
+            read_workout_types()
+            self.assertEqual(mock_client.query.call_count, 1)
+
+            mock_client.get_table.return_value = MagicMock(modified=2, num_rows=4, streaming_buffer=None)
+            read_workout_types()
+            self.assertEqual(mock_client.query.call_count, 2)
+        mock_client.get_table.assert_called_with(WORKOUT_TYPES_TABLE_ID)
+
+    @patch.dict(dao.workout_dao._bootstrap_state, {"ready": False})
+    @patch("dao.workout_dao.get_bq_client")
+    def test_bootstrap_schema_runs_once_per_process(self, mock_get_client: MagicMock) -> None:
+        """Test that an outdated schema label triggers the table checks only on the first call."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.get_dataset.return_value = MagicMock(labels={})
+        mock_client.get_table.return_value = bq_table("workout_type_id")
+
+        status = bootstrap_schema()
+        bootstrap_schema()
+
+        self.assertTrue(status["ready"])
+        self.assertEqual(mock_client.get_table.call_count, 8)
+        dataset, fields = mock_client.update_dataset.call_args[0]
+        self.assertEqual(dataset.labels[SCHEMA_VERSION_LABEL], SCHEMA_VERSION)
+        self.assertEqual(fields, ["labels"])
+        self.assertTrue(bootstrap_status()["ready"])
+
+    @patch.dict(dao.workout_dao._bootstrap_state, {"ready": False, "migration_pending": False})
+    @patch("dao.workout_dao.ensure_dataset_and_tables")
+    @patch("dao.workout_dao.get_bq_client")
+    def test_bootstrap_schema_retries_deferred_migration(self, mock_get_client: MagicMock, mock_ensure: MagicMock) -> None:
+        """Test that the schema version is only recorded once the migration is complete."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.get_dataset.return_value = MagicMock(labels={SCHEMA_VERSION_LABEL: "2"})
+        mock_ensure.return_value = False  # rows still in the streaming buffer
+
+        status = bootstrap_schema()
+        self.assertTrue(status["ready"])
+        self.assertTrue(status["migration_pending"])
+        self.assertEqual(status["schema_version"], "2")
+        mock_client.update_dataset.assert_not_called()
+
+        bootstrap_schema()  # within MIGRATION_RETRY_SECONDS
+        mock_ensure.assert_called_once()
+
+        mock_ensure.return_value = True
+        with patch("dao.workout_dao.MIGRATION_RETRY_SECONDS", 0):
+            status = bootstrap_schema()
+        self.assertEqual(mock_ensure.call_count, 2)
+        self.assertFalse(status["migration_pending"])
+        self.assertEqual(status["schema_version"], SCHEMA_VERSION)
+        dataset, _ = mock_client.update_dataset.call_args[0]
+        self.assertEqual(dataset.labels[SCHEMA_VERSION_LABEL], SCHEMA_VERSION)
+
+    @patch.dict(dao.workout_dao._bootstrap_state, {"ready": False})
+    @patch("dao.workout_dao.get_bq_client")
+    def test_bootstrap_schema_skips_checks_when_version_matches(self, mock_get_client: MagicMock) -> None:
+        """Test that a deployment already at SCHEMA_VERSION costs a single get_dataset."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.get_dataset.return_value = MagicMock(labels={SCHEMA_VERSION_LABEL: SCHEMA_VERSION})
+
+        bootstrap_schema()
+
+        mock_client.get_dataset.assert_called_once()
+        mock_client.get_table.assert_not_called()
+        mock_client.update_dataset.assert_not_called()
+
+    @patch.dict(dao.workout_dao._bootstrap_state, {"ready": False})
+    @patch("dao.workout_dao.get_bq_client")
+    def test_bootstrap_schema_failure_is_reported(self, mock_get_client: MagicMock) -> None:
+        """Test that a failed bootstrap is visible through the readiness hook."""
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.get_dataset.side_effect = RuntimeError("permission denied")
+
+        with self.assertRaises(RuntimeError):
+            bootstrap_schema()
+
+        status = bootstrap_status()
+        self.assertFalse(status["ready"])
+        self.assertIn("permission denied", status["error"])
 
 
 if __name__ == "__main__":
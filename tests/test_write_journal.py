@@ -0,0 +1,200 @@
+# tests/test_write_journal.py
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from contextlib import closing
+from datetime import date
+from unittest.mock import patch, MagicMock
+
+import pandas as pd
+
+from dao.refresh_queue import RefreshQueue
+from dao.write_journal import WriteJournal, MAX_ATTEMPTS
+
+
+# What read_workout_types returns in tests that log through the DAO
+WTYPES = [
+    {"workout_type_id": 1, "workout_type": "pushups", "unit": "reps", "is_int": True,
+     "daily_target": 30.0, "half_life_days": 14.0},
+]
+
+
+def row(workout_type: str, day: str, amount: float) -> dict:
+    return {"workout_type": workout_type, "date": day, "amount": amount, "unit": "reps"}
+
+
+class TestWriteJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "journal", "ledger.sqlite")
+        # no background refresh of derived tables
+        patcher = patch("dao.workout_dao.get_refresh_queue", return_value=RefreshQueue())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_append_is_durable(self) -> None:
+        WriteJournal(self.path).append(row("pushups", "2025-04-07", 25.0))
+        # a new instance (e.g. after a restart) still sees the row
+        self.assertEqual(WriteJournal(self.path).pending_rows(), [row("pushups", "2025-04-07", 25.0)])
+
+    def test_flush_in_batches_with_insert_ids(self) -> None:
+        journal = WriteJournal(self.path, batch_size=2)
+        ids = [journal.append(row("pushups", "2025-04-07", float(i))) for i in range(5)]
+        calls = []
+
+        def write(rows, row_ids):
+            calls.append((list(rows), list(row_ids)))
+            return []
+
+        self.assertEqual(journal.flush(write), 5)
+        self.assertEqual([len(rows) for rows, _ in calls], [2, 2, 1])
+        self.assertEqual([i for _, row_ids in calls for i in row_ids], ids)
+        self.assertEqual(journal.pending_rows(), [])
+
+    def test_failed_rows_stay_pending_until_parked(self) -> None:
+        journal = WriteJournal(self.path)
+        journal.append(row("pushups", "2025-04-07", 1.0))
+        journal.append(row("pushups", "2025-04-08", 2.0))
+
+        flushed = journal.flush(lambda rows, row_ids: [{"index": 1, "errors": ["bad"]}])
+
+        self.assertEqual(flushed, 1)
+        self.assertEqual(journal.pending_rows(), [row("pushups", "2025-04-08", 2.0)])
+        for _ in range(MAX_ATTEMPTS - 1):
+            journal.flush(lambda rows, row_ids: [{"index": 0, "errors": ["bad"]}])
+        self.assertEqual(journal.pending_rows(), [])
+
+    def test_exception_keeps_rows(self) -> None:
+        journal = WriteJournal(self.path)
+        journal.append(row("pushups", "2025-04-07", 1.0))
+
+        def write(rows, row_ids):
+            raise ConnectionError("BigQuery unavailable")
+
+        with self.assertRaises(ConnectionError):
+            journal.flush(write)
+        self.assertEqual(len(journal.pending_rows()), 1)
+
+    def test_rows_being_written_are_not_pending(self) -> None:
+        journal = WriteJournal(self.path)
+        journal.append(row("pushups", "2025-04-07", 1.0))
+        seen_during_write = []
+
+        def write(rows, row_ids):
+            # they may already be in BigQuery, so a merged read must not count them again
+            seen_during_write.append(journal.pending_rows())
+            return []
+
+        journal.flush(write)
+        self.assertEqual(seen_during_write, [[]])
+        self.assertEqual(journal.pending_rows(), [])
+
+    def test_abandoned_claims_are_taken_over(self) -> None:
+        journal = WriteJournal(self.path)
+        insert_id = journal.append(row("pushups", "2025-04-07", 1.0))
+        # a flush claimed the row, then its process died
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute("UPDATE pending_ledger SET claimed_at = ?", (time.time(),))
+        write = MagicMock(return_value=[])
+
+        self.assertEqual(journal.flush(write), 0)  # still claimed
+        with patch("dao.write_journal.CLAIM_TIMEOUT_SECONDS", 0.0):
+            self.assertEqual(journal.flush(write), 1)
+        write.assert_called_once_with([row("pushups", "2025-04-07", 1.0)], [insert_id])
+
+    def test_parked_rows_are_logged_and_listed(self) -> None:
+        journal = WriteJournal(self.path)
+        insert_id = journal.append(row("pushups", "2025-04-07", 1.0))
+
+        with self.assertLogs("dao.write_journal", level="ERROR") as logs:
+            for _ in range(MAX_ATTEMPTS):
+                journal.flush(lambda rows, row_ids: [{"index": 0, "errors": ["bad"]}])
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn(insert_id, logs.output[0])
+        [parked] = journal.parked_rows()
+        self.assertEqual((parked["insert_id"], parked["attempts"]), (insert_id, MAX_ATTEMPTS))
+        self.assertEqual(parked["last_error"], repr(["bad"]))
+        self.assertEqual(journal.pending_rows(), [])
+
+    def test_journal_of_older_version_is_upgraded(self) -> None:
+        os.makedirs(os.path.dirname(self.path))
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE pending_ledger (insert_id TEXT PRIMARY KEY, workout_type TEXT NOT NULL,"
+                " date TEXT NOT NULL, amount REAL NOT NULL, unit TEXT NOT NULL, created_at REAL NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT)"
+            )
+            conn.execute("INSERT INTO pending_ledger VALUES ('a', 'pushups', '2025-04-07', 1.0, 'reps', 0, 0, NULL)")
+
+        journal = WriteJournal(self.path)
+
+        self.assertEqual(journal.pending_rows(), [row("pushups", "2025-04-07", 1.0)])
+        self.assertEqual(journal.flush(MagicMock(return_value=[])), 1)
+
+    def test_append_rejects_unknown_types(self) -> None:
+        journal = WriteJournal(self.path)
+        with self.assertRaises(ValueError):
+            journal.append(row("situps", "2025-04-07", 1.0), known_types={"pushups"})
+        journal.append(row("pushups", "2025-04-07", 1.0), known_types={"pushups"})
+        self.assertEqual(len(journal.pending_rows()), 1)
+
+    def test_worker_flushes_in_background(self) -> None:
+        journal = WriteJournal(self.path)
+        write = MagicMock(return_value=[])
+        journal.start_worker(write, interval_seconds=0.01)
+        try:
+            journal.append(row("pushups", "2025-04-07", 1.0))
+            deadline = time.time() + 5
+            while journal.pending_rows() and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            journal.stop_worker()
+        self.assertEqual(journal.pending_rows(), [])
+        write.assert_called()
+
+    @patch("dao.workout_dao.get_write_journal")
+    @patch("dao.workout_dao.read_workout_types", return_value=WTYPES)
+    @patch("dao.workout_dao.get_bq_client")
+    def test_log_workout_write_behind(
+        self, mock_get_client: MagicMock, _types: MagicMock, mock_get_journal: MagicMock
+    ) -> None:
+        from dao.workout_dao import log_workout, read_daily_totals
+
+        mock_client = MagicMock()
+        mock_get_client.return_value = mock_client
+        mock_client.query.return_value.to_dataframe.return_value = pd.DataFrame([
+            {"workout_type": "pushups", "date": date(2025, 4, 7), "amount": 10.0},
+        ])
+        mock_get_journal.return_value = WriteJournal(self.path)
+
+        log_workout("pushups", date(2025, 4, 7), 25.0, "reps")
+        log_workout("pushups", date(2025, 4, 8), 5.0, "reps")
+
+        with self.assertRaises(ValueError):
+            log_workout("situps", date(2025, 4, 8), 5.0, "reps")
+
+        mock_client.insert_rows_json.assert_not_called()
+        totals = read_daily_totals()
+        self.assertEqual(list(totals["amount"]), [5.0, 35.0])
+
+    @patch("dao.workout_dao.get_write_journal")
+    def test_journaled_days_are_stale(self, mock_get_journal: MagicMock) -> None:
+        from dao.workout_dao import stale_score_dates
+
+        journal = WriteJournal(self.path)
+        journal.append(row("pushups", "2025-04-08", 5.0))
+        journal.append(row("pushups", "2025-04-06", 5.0))
+        mock_get_journal.return_value = journal
+
+        # stored scores from the earliest journaled day on are not current
+        self.assertEqual(stale_score_dates(), {"pushups": date(2025, 4, 6)})
+
+
+if __name__ == "__main__":
+    unittest.main()